@@ -13,55 +13,89 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI', 'sqlite:////app/instance/movie_selector.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_BUSY_TIMEOUT'] = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 30))
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:///'):
+        # One pooled connection per busy thread; waits for write locks instead of failing
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': 10,
+            'connect_args': {'timeout': app.config['SQLITE_BUSY_TIMEOUT'], 'check_same_thread': False},
+        }
     app.config['PLEX_SERVER_URL'] = os.environ.get('PLEX_SERVER_URL', 'http://localhost:32400')
+    app.config['PLEX_SERVERS'] = os.environ.get('PLEX_SERVERS', '')
+    app.config['PLEX_TOKEN'] = os.environ.get('PLEX_TOKEN', '').strip()
+    app.config['PLEX_SERVER_DEADLINE'] = float(os.environ.get('PLEX_SERVER_DEADLINE', 5))
+    app.config['PLEX_CONNECTION_TTL'] = int(os.environ.get('PLEX_CONNECTION_TTL', 300))
+    app.config['LIBRARY_CACHE_TTL'] = int(os.environ.get('LIBRARY_CACHE_TTL', 300))
+    app.config['LIBRARY_STORE'] = os.environ.get('LIBRARY_STORE', 'True').lower() == 'true'
+    app.config['LIBRARY_STORE_DIR'] = os.environ.get('LIBRARY_STORE_DIR')
+    app.config['LIBRARY_REFRESH_INTERVAL'] = int(os.environ.get('LIBRARY_REFRESH_INTERVAL', 300))
+    app.config['LIBRARY_REFRESH_JITTER'] = float(os.environ.get('LIBRARY_REFRESH_JITTER', 0.1))
+    app.config['ADMIN_USERS'] = [name.strip() for name in os.environ.get('ADMIN_USERS', '').split(',') if name.strip()]
+    app.config['WATCHED_CACHE_TTL'] = int(os.environ.get('WATCHED_CACHE_TTL', 60))
+    app.config['PLAYBACK_WARM_TTL'] = int(os.environ.get('PLAYBACK_WARM_TTL', 120))
+    app.config['PLAYBACK_WORKERS'] = int(os.environ.get('PLAYBACK_WORKERS', 4))
+    app.config['PLAYBACK_MAX_PENDING'] = int(os.environ.get('PLAYBACK_MAX_PENDING', 32))
+    app.config['POSTER_CACHE_DIR'] = os.environ.get('POSTER_CACHE_DIR', '')
+    app.config['POSTER_CACHE_SIZE'] = int(os.environ.get('POSTER_CACHE_SIZE', 200))
+    app.config['COMPRESSION_LEVEL'] = int(os.environ.get('COMPRESSION_LEVEL', 6))
+    app.config['STATIC_COMPRESSED_DIR'] = os.environ.get('STATIC_COMPRESSED_DIR', '')
+    app.config['SIMILAR_TOP_K'] = int(os.environ.get('SIMILAR_TOP_K', 50))
+    app.config['MEMORY_BUDGET_MB'] = int(os.environ.get('MEMORY_BUDGET_MB', 256))
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 60))
+    app.config['LOGIN_CACHE_TTL'] = int(os.environ.get('LOGIN_CACHE_TTL', 900))
+    app.config['TOKEN_CACHE_TTL'] = int(os.environ.get('TOKEN_CACHE_TTL', 3600))
+    app.config['RATE_LIMIT_RECOMMEND'] = int(os.environ.get('RATE_LIMIT_RECOMMEND', 30))
+    app.config['RATE_LIMIT_PLAY'] = int(os.environ.get('RATE_LIMIT_PLAY', 12))
+    app.config['RATE_LIMIT_CLIENTS'] = int(os.environ.get('RATE_LIMIT_CLIENTS', 20))
+    app.config['RATE_LIMIT_BURST'] = int(os.environ.get('RATE_LIMIT_BURST', 5))
+    app.config['RATE_LIMIT_WAIT'] = float(os.environ.get('RATE_LIMIT_WAIT', 2))
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'text').lower()
+    app.config['PLEX_CONCURRENCY'] = int(os.environ.get('PLEX_CONCURRENCY', 8))
+
+    # Logging first, so everything below logs through it
+    from app import logs
+    logs.init_app(app)
 
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'login'
 
-    # Register routes
+    from app.cache_registry import cache_registry
+    from app.snapshot_store import snapshot_store
+    from app.library_cache import library_cache
+    from app.server_pool import server_pool
+    from app.playback import playback_warmer, playback_jobs
+    from app.posters import poster_cache
+    from app.http_cache import compression
+    from app.user_cache import user_cache
+    from app.auth_cache import login_cache
+    from app.rate_limit import rate_limiter
+    cache_registry.init_app(app)
+    snapshot_store.init_app(app)
+    library_cache.init_app(app)
+    server_pool.init_app(app)
+    playback_warmer.init_app(app)
+    playback_jobs.init_app(app)
+    poster_cache.init_app(app)
+    compression.init_app(app)
+    user_cache.init_app(app)
+    login_cache.init_app(app)
+    rate_limiter.init_app(app)
+
+    # Register routes and command line tasks
     from app.routes import register_routes
+    from app import cli
     register_routes(app)
+    cli.init_app(app)
 
-    # Create database tables
+    # Tune SQLite and bring the schema up to date
+    from app.migrations import configure_sqlite, upgrade_database
     with app.app_context():
-        db.create_all()
-
-        # Run migrations
-        migrate_database()
+        configure_sqlite(db.engine, app.config['SQLITE_BUSY_TIMEOUT'], app.config['SQLITE_SYNCHRONOUS'])
+        upgrade_database(db.engine)
 
     return app
-
-def migrate_database():
-    """Run database migrations to add new columns"""
-    try:
-        # Check if we need to add the new client selection columns
-        from sqlalchemy import inspect, text
-        inspector = inspect(db.engine)
-
-        # Get existing columns for user_preferences table
-        columns = [col['name'] for col in inspector.get_columns('user_preferences')]
-
-        # Add selected_client_name column if it doesn't exist
-        if 'selected_client_name' not in columns:
-            print("Adding selected_client_name column to user_preferences...")
-            with db.engine.connect() as conn:
-                conn.execute(text('ALTER TABLE user_preferences ADD COLUMN selected_client_name VARCHAR(255)'))
-                conn.commit()
-            print("✓ Added selected_client_name column")
-
-        # Add selected_client_identifier column if it doesn't exist
-        if 'selected_client_identifier' not in columns:
-            print("Adding selected_client_identifier column to user_preferences...")
-            with db.engine.connect() as conn:
-                conn.execute(text('ALTER TABLE user_preferences ADD COLUMN selected_client_identifier VARCHAR(255)'))
-                conn.commit()
-            print("✓ Added selected_client_identifier column")
-
-        print("Database migration completed successfully")
-
-    except Exception as e:
-        print(f"Error during database migration: {e}")
-        import traceback
-        traceback.print_exc()
@@ -0,0 +1,116 @@
+"""Actor name index of a library snapshot, for autocomplete and the actor filter."""
+from array import array
+import unicodedata
+
+from app.library_cache import SnapshotIndex
+
+
+def normalize_name(name):
+    """Case- and accent-insensitive form of a name ("Émile" -> "emile")"""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ActorIndex(SnapshotIndex):
+    """Distinct actors of one snapshot, their movies and a trigram index of their names"""
+
+    index_name = 'actors'
+
+    def __init__(self, snapshot):
+        self.names = []          # actor id -> display name
+        self.normalized = []     # actor id -> normalized name
+        self.movies = []         # actor id -> array of ordinals
+        self.trigrams = {}       # trigram -> array of actor ids
+        ids = {}
+        for ordinal, actors in enumerate(snapshot.actors):
+            for name in actors:
+                key = normalize_name(name)
+                if not key:
+                    continue
+                actor_id = ids.get(key)
+                if actor_id is None:
+                    actor_id = ids[key] = len(self.names)
+                    self.names.append(name)
+                    self.normalized.append(key)
+                    self.movies.append(array('I'))
+                    for trigram in _trigrams(key):
+                        self.trigrams.setdefault(trigram, array('I')).append(actor_id)
+                movies = self.movies[actor_id]
+                if not movies or movies[-1] != ordinal:
+                    movies.append(ordinal)
+
+    def match(self, query):
+        """Ids of the actors whose name contains ``query``"""
+        query = normalize_name(query)
+        if not query:
+            return []
+        if len(query) < 3:
+            return [i for i, name in enumerate(self.normalized) if query in name]
+
+        postings = []
+        for trigram in _trigrams(query):
+            posting = self.trigrams.get(trigram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return [i for i in candidates if query in self.normalized[i]]
+
+    def ordinals(self, query):
+        """Ordinals of the movies with an actor whose name contains ``query``"""
+        ordinals = set()
+        for actor_id in self.match(query):
+            ordinals.update(self.movies[actor_id])
+        return ordinals
+
+    def suggest(self, query, candidates=None):
+        """Actors matching ``query`` with their movies among ``candidates``
+
+        Returns:
+            list: (normalized name, display name, [ordinals]) for each actor
+            with at least one candidate movie
+        """
+        if candidates is not None and not isinstance(candidates, (set, frozenset, range)):
+            candidates = set(candidates)
+        results = []
+        for actor_id in self.match(query):
+            movies = self.movies[actor_id]
+            if candidates is not None:
+                movies = [i for i in movies if i in candidates]
+            if movies:
+                results.append((self.normalized[actor_id], self.names[actor_id], list(movies)))
+        return results
+
+
+def rank_suggestions(query, counts, names, limit):
+    """Order actor suggestions: exact match, then name prefix, then word prefix, then the rest
+
+    Within each tier, actors with more movies come first.
+
+    Args:
+        counts: dict of normalized name -> movie count
+        names: dict of normalized name -> display name
+    """
+    query = normalize_name(query)
+
+    def tier(key):
+        if key == query:
+            return 0
+        if key.startswith(query):
+            return 1
+        if f' {query}' in key:
+            return 2
+        return 3
+
+    ranked = sorted(counts, key=lambda key: (tier(key), -counts[key], key))
+    return [{'name': names[key], 'movies': counts[key]} for key in ranked[:limit]]
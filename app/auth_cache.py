@@ -0,0 +1,133 @@
+"""Cached Plex token validation for logins.
+
+Logging in used to cost a Plex round trip every time: a full MyPlex sign-in,
+or a fresh server handshake just to check the configured ``PLEX_TOKEN``.
+Tokens that are known to work are now remembered by their hash for a while.
+A username keeps at most one remembered sign-in: signing in with a new
+password (after changing it on plex.tv) or logging out forgets the old one,
+so a stale password stops working.
+The configured token is checked once at startup and re-checked in the
+background, and the server connection made while checking stays in the
+connection pool for the user's first requests.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import hmac
+import logging
+import threading
+import time
+
+from app.cache_registry import CacheEntry, cache_registry
+from app.library_cache import token_key
+from app.plex_api import PlexAPI
+
+logger = logging.getLogger(__name__)
+
+
+# A hashed key, a username, a token and a timestamp
+LOGIN_ENTRY_SIZE = 450
+
+
+class LoginCache:
+    """Remembers validated tokens and recent MyPlex sign-ins"""
+
+    def __init__(self, ttl=900, token_ttl=3600):
+        self.ttl = ttl
+        self.token_ttl = token_ttl
+        self.secret = b''
+        self.env_token = None
+        self._lock = threading.Lock()
+        self._valid_tokens = {}
+        self._sign_ins = {}
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='plex-login')
+        self._refresher = None
+        cache_registry.register('logins', self._entries, self._evict)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('LOGIN_CACHE_TTL', self.ttl)
+        self.token_ttl = app.config.get('TOKEN_CACHE_TTL', self.token_ttl)
+        self.secret = app.config['SECRET_KEY'].encode('utf-8')
+        self.env_token = app.config.get('PLEX_TOKEN') or None
+        if self.env_token and self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_env_token, name='plex-token-check', daemon=True)
+            self._refresher.start()
+
+    def _credentials_key(self, username, password):
+        message = f'{username}\0{password}'.encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def token_valid(self, token):
+        """Whether a token can connect to the primary server, checking at most once per TTL"""
+        key = token_key(token)
+        with self._lock:
+            verified_at = self._valid_tokens.get(key)
+        if verified_at is not None and time.time() - verified_at < self.token_ttl:
+            cache_registry.hit('logins')
+            return True
+        cache_registry.miss('logins')
+        return self._verify(token)
+
+    def _verify(self, token):
+        # The connection lands in the server pool and is reused by later requests
+        valid = PlexAPI(token).server is not None
+        with self._lock:
+            if valid:
+                self._valid_tokens[token_key(token)] = time.time()
+            else:
+                self._valid_tokens.pop(token_key(token), None)
+        return valid
+
+    def _refresh_env_token(self):
+        while True:
+            try:
+                if not self._verify(self.env_token):
+                    logger.warning("Configured PLEX_TOKEN could not connect to the Plex server")
+            except Exception as e:
+                logger.warning("Error checking configured PLEX_TOKEN: %s", e)
+            time.sleep(self.token_ttl)
+
+    def authenticate(self, username, password):
+        """Sign in with MyPlex, reusing the token of a recent sign-in with the same credentials"""
+        key = self._credentials_key(username, password)
+        with self._lock:
+            cached = self._sign_ins.get(key)
+        if cached is not None and time.time() - cached[2] < self.ttl:
+            cache_registry.hit('logins')
+            return cached[1]
+
+        cache_registry.miss('logins')
+        token = PlexAPI.authenticate(username, password)
+        if not token:
+            return None
+        with self._lock:
+            # Only the latest working password of a username is remembered
+            self._forget(username)
+            self._sign_ins[key] = (username, token, time.time())
+        # Connect to the server now so the first recommendation doesn't wait for it
+        self._executor.submit(self._verify, token)
+        return token
+
+    def _forget(self, username):
+        for key in [key for key, entry in self._sign_ins.items() if entry[0] == username]:
+            del self._sign_ins[key]
+
+    def forget(self, username):
+        """Drop a user's remembered sign-in, so the next login asks MyPlex again"""
+        with self._lock:
+            self._forget(username)
+
+    def _entries(self):
+        with self._lock:
+            tokens = [CacheEntry(('token', key), LOGIN_ENTRY_SIZE, verified_at)
+                      for key, verified_at in self._valid_tokens.items()]
+            sign_ins = [CacheEntry(('sign-in', key), LOGIN_ENTRY_SIZE, signed_in_at)
+                        for key, (_, _, signed_in_at) in self._sign_ins.items()]
+        return tokens + sign_ins
+
+    def _evict(self, key):
+        kind, key = key
+        with self._lock:
+            (self._valid_tokens if kind == 'token' else self._sign_ins).pop(key, None)
+
+
+login_cache = LoginCache()
@@ -0,0 +1,188 @@
+"""One memory budget for every in-process cache.
+
+Each cache registers itself under a name and reports its entries with an
+approximate size in bytes, when each was last used and roughly how long it
+takes to rebuild. When the total goes over ``MEMORY_BUDGET_MB`` the registry
+evicts across all caches, starting with the entries that are big, idle and
+cheap to rebuild, until the total is back under the budget. Entries used in
+the last few seconds are never evicted so a request can't lose the data it
+is working on.
+
+Caches also count their hits and misses here, for the admin view.
+"""
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Entries used more recently than this (seconds) are never evicted
+EVICTION_GRACE = 10
+
+# Evict down to this fraction of the budget, so eviction doesn't run on every insert
+EVICTION_TARGET = 0.9
+
+# Containers longer than this are sized from an evenly spaced sample of their items
+SIZE_SAMPLE = 100
+
+
+def estimate_size(obj, seen=None):
+    """Approximate deep size of an object in bytes
+
+    Follows lists, tuples, sets, dicts and plain objects. Long containers
+    are extrapolated from a sample of their items. Objects whose id is in
+    ``seen`` are not counted (again).
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        items = [item for pair in obj.items() for item in pair]
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(obj) if not isinstance(obj, (list, tuple)) else obj
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        items = list(vars(obj).values())
+    else:
+        return size
+
+    if len(items) <= SIZE_SAMPLE:
+        return size + sum(estimate_size(item, seen) for item in items)
+    step = len(items) / SIZE_SAMPLE
+    sample = sum(estimate_size(items[int(i * step)], seen) for i in range(SIZE_SAMPLE))
+    return size + int(sample * len(items) / SIZE_SAMPLE)
+
+
+class CacheEntry:
+    """One evictable entry of a registered cache"""
+
+    __slots__ = ('key', 'size', 'last_used', 'cost')
+
+    def __init__(self, key, size, last_used, cost=0.0):
+        self.key = key
+        self.size = size
+        self.last_used = last_used
+        self.cost = cost  # Roughly how many seconds rebuilding the entry takes
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+
+class CacheRegistry:
+    """Named caches sharing one memory budget
+
+    A cache registers two functions: ``entries()`` returning its CacheEntry
+    objects, and ``evict(key)`` dropping one of them.
+    """
+
+    def __init__(self, budget=256 * 1024 * 1024):
+        self.budget = budget
+        self._caches = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._enforce_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.budget = app.config.get('MEMORY_BUDGET_MB', self.budget // (1024 * 1024)) * 1024 * 1024
+
+    def register(self, name, entries, evict):
+        with self._lock:
+            self._caches[name] = (entries, evict)
+            self._stats.setdefault(name, CacheStats())
+
+    def _stat(self, name):
+        with self._lock:
+            return self._stats.setdefault(name, CacheStats())
+
+    def hit(self, name):
+        self._stat(name).hits += 1
+
+    def miss(self, name):
+        self._stat(name).misses += 1
+
+    def _entries(self):
+        entries = []
+        for name, (cache_entries, _) in list(self._caches.items()):
+            try:
+                entries.extend((name, entry) for entry in cache_entries())
+            except Exception as e:
+                logger.warning("Error sizing cache '%s': %s", name, e)
+        return entries
+
+    def enforce(self):
+        """Evict idle entries across caches until the total is under the budget"""
+        if self.budget <= 0 or not self._enforce_lock.acquire(blocking=False):
+            return 0
+        try:
+            entries = self._entries()
+            total = sum(entry.size for _, entry in entries)
+            if total <= self.budget:
+                return 0
+
+            now = time.time()
+            target = self.budget * EVICTION_TARGET
+
+            # Big, long idle and cheap to rebuild goes first
+            def priority(item):
+                entry = item[1]
+                return entry.size * (now - entry.last_used) / (1.0 + entry.cost)
+
+            evicted = 0
+            for name, entry in sorted(entries, key=priority, reverse=True):
+                if total <= target:
+                    break
+                if now - entry.last_used < EVICTION_GRACE:
+                    continue
+                try:
+                    self._caches[name][1](entry.key)
+                except Exception as e:
+                    logger.warning("Error evicting from cache '%s': %s", name, e)
+                    continue
+                stats = self._stat(name)
+                stats.evictions += 1
+                stats.evicted_bytes += entry.size
+                total -= entry.size
+                evicted += 1
+
+            if total > self.budget:
+                logger.warning("Caches use %d MB, over the %d MB budget, and everything left is in use",
+                               total // (1024 * 1024), self.budget // (1024 * 1024))
+            return evicted
+        finally:
+            self._enforce_lock.release()
+
+    def status(self):
+        """Size, entry count, hits, misses and evictions of every cache"""
+        sizes = {}
+        for name, entry in self._entries():
+            count, size = sizes.get(name, (0, 0))
+            sizes[name] = (count + 1, size + entry.size)
+        caches = {}
+        with self._lock:
+            stats = dict(self._stats)
+        for name, stat in sorted(stats.items()):
+            count, size = sizes.get(name, (0, 0))
+            caches[name] = {
+                'entries': count,
+                'bytes': size,
+                'hits': stat.hits,
+                'misses': stat.misses,
+                'evictions': stat.evictions,
+                'evicted_bytes': stat.evicted_bytes,
+            }
+        return {
+            'budget_bytes': self.budget,
+            'used_bytes': sum(cache['bytes'] for cache in caches.values()),
+            'caches': caches,
+        }
+
+
+cache_registry = CacheRegistry()
@@ -0,0 +1,127 @@
+"""Command line tasks, run with ``flask --app run <command>``."""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.actor_index import ActorIndex
+from app.library_cache import library_cache
+from app.plex_api import PlexAPI
+from app.server_pool import server_pool
+from app.similarity import CreditIndex
+
+
+@click.command('warm-library')
+@click.option('--token', envvar='PLEX_TOKEN', help='Plex token to connect with (default: PLEX_TOKEN)')
+@click.option('--all-sections', is_flag=True, help="Load every movie library, not only the default 'Movies'")
+@with_appcontext
+def warm_library_command(token, all_sections):
+    """Load every server's movie library, build its indexes and save it to disk
+
+    Run before starting the web app so the first recommendation after a
+    restart is served from a warm library.
+    """
+    if not token:
+        raise click.UsageError('A Plex token is required (--token or PLEX_TOKEN)')
+
+    started = time.time()
+    warmed = 0
+    for config in server_pool.servers:
+        step = time.time()
+        plex = PlexAPI(token, config.name)
+        if not plex.server:
+            click.echo(f"{config.name}: could not connect to {config.url}", err=True)
+            continue
+        connected = time.time() - step
+
+        step = time.time()
+        if all_sections:
+            section_keys = [key for key, _ in plex.get_library_sections()]
+        else:
+            section_keys = plex.get_default_section_keys()
+        snapshot = library_cache.get_snapshot(plex, section_keys)
+        # Sections saved by an earlier run are checked against the server's change markers
+        changed = library_cache.refresh_server(plex)
+        snapshot = library_cache.get_snapshot(plex, section_keys) if changed else snapshot
+        if snapshot is None:
+            click.echo(f"{config.name}: could not load the movie library", err=True)
+            continue
+        loaded = time.time() - step
+
+        step = time.time()
+        CreditIndex.of(snapshot)
+        ActorIndex.of(snapshot)
+        indexed = time.time() - step
+
+        warmed += 1
+        click.echo(f"{config.name}: {len(snapshot)} movie(s) in {len(section_keys)} section(s) - "
+                   f"connect {connected:.2f}s, library {loaded:.2f}s, indexes {indexed:.2f}s")
+
+    click.echo(f"Warmed {warmed} of {len(server_pool.servers)} server(s) in {time.time() - started:.2f}s")
+    if not warmed:
+        raise click.exceptions.Exit(1)
+
+
+# Run in a fresh interpreter by startup-time: times importing the app package
+# and create_app(), and reports which slow dependencies got imported
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print('startup-time', json.dumps({'import': imported - started, 'create_app': created - imported,
+                                  'plexapi': 'plexapi' in sys.modules, 'requests': 'requests' in sys.modules}))
+"""
+
+
+@click.command('startup-time')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters to time')
+@click.option('--budget', type=float, help='Fail when the median startup takes longer than this many seconds')
+@with_appcontext
+def startup_time_command(runs, budget):
+    """Time importing the app and create_app() in fresh interpreters
+
+    Reports the median of each step and of the whole process start, and
+    whether plexapi was imported (it should only load on the first request
+    that talks to Plex).
+    """
+    root = os.path.dirname(current_app.root_path)
+    results = []
+    for _ in range(max(runs, 1)):
+        started = time.perf_counter()
+        probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=root,
+                               capture_output=True, text=True)
+        total = time.perf_counter() - started
+        if probe.returncode != 0:
+            raise click.ClickException(f"App failed to start:\n{probe.stderr}")
+        # The app's own log lines may come before or after the result
+        line = next(line for line in probe.stdout.splitlines() if line.startswith('startup-time '))
+        result = json.loads(line.split(' ', 1)[1])
+        result['total'] = total
+        results.append(result)
+
+    def median(name):
+        return statistics.median(result[name] for result in results)
+
+    click.echo(f"import app:   {median('import') * 1000:7.1f} ms")
+    click.echo(f"create_app(): {median('create_app') * 1000:7.1f} ms")
+    click.echo(f"process:      {median('total') * 1000:7.1f} ms (median of {len(results)} run(s))")
+    for module in ('plexapi', 'requests'):
+        click.echo(f"{module} imported at startup: {'yes' if results[-1][module] else 'no'}")
+
+    if budget is not None and median('import') + median('create_app') > budget:
+        click.echo(f"Startup is over the {budget:.2f}s budget", err=True)
+        raise click.exceptions.Exit(1)
+
+
+def init_app(app):
+    app.cli.add_command(warm_library_command)
+    app.cli.add_command(startup_time_command)
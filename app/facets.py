@@ -0,0 +1,166 @@
+"""Candidate counts for filter choices, without running a recommendation.
+
+For each server, the set of candidates every filter keeps is computed once
+from the snapshot, the watched overlay and the user's passes. Any
+combination of filters is then a few set intersections, so counting every
+decade, rating group and toggle costs about as much as one recommendation.
+Films on several servers (same GUID) count once, and are left out
+everywhere once watched or passed on any of them, as they are when
+recommending. Unsaved filter choices can be previewed by passing them as
+overrides.
+"""
+from app.actor_index import ActorIndex
+from app.movie_selector import share_exclusions
+
+# Preferences that are simple on/off switches
+TOGGLES = ('exclude_watched', 'exclude_same_actors', 'exclude_same_director', 'similar_to_last_watched')
+
+# Switches that change how another filter works; they can be previewed but get no counts
+OPTIONS = ('similarity_genres',)
+
+
+class FilterMasks:
+    """The candidates each filter keeps on one server"""
+
+    def __init__(self, selector, actor=None):
+        self.selector = selector
+        snapshot = selector.snapshot
+        candidates = list(snapshot.candidates(selector.section_keys))
+        self.candidates = set(candidates)
+
+        overlay = selector.overlay
+        guids = snapshot.guids
+        watched = selector.shared_watched
+        self.unwatched = {i for i in candidates
+                          if not (overlay is not None and overlay.is_watched(i)) and guids[i] not in watched}
+        passed = selector._passed_ordinals()
+        self.not_passed = {i for i in candidates if i not in passed and guids[i] not in selector.shared_passed}
+
+        self.same_actors = set(selector._filter_by_actors(candidates))
+        self.same_director = set(selector._filter_by_director(candidates))
+        self.actor = None
+        if actor:
+            self.actor = ActorIndex.of(snapshot).ordinals(actor) & self.candidates
+
+        self._similar = {}
+
+        self.decades = {}
+        years = snapshot.years
+        for i in candidates:
+            decade = selector.get_decade_from_year(years[i])
+            if decade:
+                self.decades.setdefault(decade, set()).add(i)
+
+    def pool(self, settings):
+        """Ordinals left after the filters enabled in ``settings``, in filter order"""
+        pool = self.not_passed
+        if settings['exclude_watched']:
+            pool = pool & self.unwatched
+        if settings['exclude_same_actors']:
+            pool = pool & self.same_actors
+        if settings['exclude_same_director']:
+            pool = pool & self.same_director
+        if settings['filter_decade']:
+            pool = pool & self.decades.get(settings['filter_decade'], set())
+        if settings['filter_actor'] and self.actor is not None:
+            pool = pool & self.actor
+        if settings['similar_to_last_watched']:
+            pool = pool & self.similar(settings['similarity_genres'])
+        return pool
+
+    def similar(self, include_genres):
+        """The movies most similar to the last watched one, among those not passed
+
+        Scored once per genre setting and intersected with each pool, so
+        counts are of the top SIMILAR_TOP_K films that the other filters keep.
+        """
+        similar = self._similar.get(include_genres)
+        if similar is None:
+            similar = self._similar[include_genres] = set(
+                self.selector._filter_by_similarity(sorted(self.not_passed), include_genres))
+        return similar
+
+    def films(self, pool):
+        """Keys identifying the films of a pool across servers"""
+        snapshot = self.selector.snapshot
+        guids = snapshot.guids
+        return {guids[i] or (snapshot.machine_identifier, i) for i in pool}
+
+
+def current_settings(prefs, overrides=None):
+    """The filter settings saved in a user's preferences, with unsaved choices applied
+
+    Returns:
+        tuple: (settings: dict, actor: the actor filter text or None)
+    """
+    settings = {
+        'exclude_watched': bool(prefs and prefs.exclude_watched),
+        'exclude_same_actors': bool(prefs and prefs.exclude_same_actors),
+        'exclude_same_director': bool(prefs and prefs.exclude_same_director),
+        'filter_decade': prefs.filter_decade if prefs else None,
+        'similar_to_last_watched': bool(prefs and prefs.similar_to_last_watched),
+        'similarity_genres': bool(prefs and prefs.similarity_genres),
+    }
+    actor = prefs.filter_actor if prefs else None
+    overrides = overrides or {}
+    for name in TOGGLES + OPTIONS:
+        if name in overrides:
+            settings[name] = bool(overrides[name])
+    if 'filter_decade' in overrides:
+        settings['filter_decade'] = overrides['filter_decade'] or None
+    if 'filter_actor' in overrides:
+        actor = overrides['filter_actor']
+    actor = (actor or '').strip() or None
+    settings['filter_actor'] = actor is not None
+    return settings, actor
+
+
+def count_facets(selectors, overrides=None):
+    """Candidate counts for the current filters and for each alternative choice
+
+    ``overrides`` holds filter choices to use instead of the saved ones.
+
+    Returns:
+        dict: ``total`` for the saved filters; ``decades`` and ``ratings``
+        with counts per decade (as if that decade were selected) and per
+        rating group; ``toggles`` with the counts if each switch were on or
+        off; ``filter_actor`` with the counts with and without the actor
+        filter, when one is set.
+    """
+    settings, actor = current_settings(selectors[0].preferences if selectors else None, overrides)
+    if len(selectors) > 1:
+        share_exclusions(selectors)
+    masks = [FilterMasks(selector, actor) for selector in selectors if selector.snapshot is not None]
+
+    def count(**changes):
+        changed = dict(settings, **changes)
+        found = set()
+        for mask in masks:
+            found |= mask.films(mask.pool(changed))
+        return len(found)
+
+    decades = sorted(set().union(*(mask.decades for mask in masks)))
+    ratings = {}
+    seen = set()
+    for mask in masks:
+        snapshot = mask.selector.snapshot
+        pool = mask.pool(settings)
+        for i in sorted(pool):
+            film = snapshot.guids[i] or (snapshot.machine_identifier, i)
+            if film in seen:
+                continue
+            seen.add(film)
+            rating = snapshot.ratings[i]
+            bucket = int(rating) if rating else 0
+            ratings[bucket] = ratings.get(bucket, 0) + 1
+
+    facets = {
+        'total': len(seen),
+        'decades': {decade: count(filter_decade=decade) for decade in decades},
+        'any_decade': count(filter_decade=None),
+        'ratings': {str(bucket): ratings[bucket] for bucket in sorted(ratings, reverse=True)},
+        'toggles': {name: {'on': count(**{name: True}), 'off': count(**{name: False})} for name in TOGGLES},
+    }
+    if settings['filter_actor']:
+        facets['filter_actor'] = {'on': count(filter_actor=True), 'off': count(filter_actor=False)}
+    return facets
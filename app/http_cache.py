@@ -0,0 +1,183 @@
+"""HTTP validators and response compression.
+
+JSON endpoints answer conditional requests from a cheap version (a row
+version, a few aggregates, a snapshot generation) before building the body,
+so an unchanged resource costs a 304 and no serialization. Compressible
+responses are gzip (or brotli, when the ``brotli`` package is installed)
+encoded, and static assets are compressed once into the instance folder and
+served from there.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+from flask import current_app, request, send_file
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+    'text/html',
+    'text/plain',
+    'image/svg+xml',
+}
+STATIC_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt')
+
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 500
+
+
+def make_etag(*parts):
+    """Opaque validator from the parts that determine a response"""
+    raw = ':'.join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]
+
+
+def conditional_response(etag, build):
+    """Answer 304 if the client's copy matches ``etag``, otherwise call ``build()``
+
+    The ETag is weak because the body may be compressed on the way out.
+    Responses are private and always revalidated.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = build()
+        if isinstance(response, tuple):
+            return response
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _accepted_encoding():
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class Compression:
+    """Compresses dynamic responses and serves precompressed static assets"""
+
+    def __init__(self, level=6):
+        self.level = level
+        self.directory = None
+
+    def init_app(self, app):
+        self.level = app.config.get('COMPRESSION_LEVEL', self.level)
+        self.directory = app.config.get('STATIC_COMPRESSED_DIR') or os.path.join(app.instance_path, 'static-compressed')
+        app.after_request(self.compress_response)
+
+        if app.static_folder and 'static' in app.view_functions:
+            serve_static = app.view_functions['static']
+
+            def static(filename):
+                return self.send_static(app, filename) or serve_static(filename=filename)
+
+            app.view_functions['static'] = static
+            self.precompress_static(app)
+
+    def compress_response(self, response):
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+        if (response.content_length or 0) < MIN_COMPRESS_SIZE:
+            return response
+
+        encoding = _accepted_encoding()
+        if encoding is None:
+            return response
+
+        response.set_data(_compress(response.get_data(), encoding, self.level))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _compressed_path(self, app, filename, encoding):
+        """Compressed copy of a static file, (re)written if it is missing or stale"""
+        source = safe_join(app.static_folder, filename)
+        if source is None or not os.path.isfile(source):
+            return None
+        suffix = 'gz' if encoding == 'gzip' else encoding
+        target = safe_join(self.directory, f'{filename}.{suffix}')
+        if target is None:
+            return None
+
+        mtime = os.path.getmtime(source)
+        if not os.path.exists(target) or os.path.getmtime(target) != mtime:
+            with open(source, 'rb') as f:
+                data = _compress(f.read(), encoding, 9)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f'{target}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.utime(tmp_path, (mtime, mtime))
+            os.replace(tmp_path, target)
+        return target
+
+    def precompress_static(self, app):
+        """Compress every static asset ahead of the first request"""
+        encodings = ['gzip'] + (['br'] if brotli is not None else [])
+        try:
+            for root, _, files in os.walk(app.static_folder):
+                for name in files:
+                    if not name.endswith(STATIC_EXTENSIONS):
+                        continue
+                    filename = os.path.relpath(os.path.join(root, name), app.static_folder).replace(os.sep, '/')
+                    for encoding in encodings:
+                        self._compressed_path(app, filename, encoding)
+        except OSError as e:
+            logger.warning("Could not precompress static assets: %s", e)
+
+    def send_static(self, app, filename):
+        """Serve the compressed copy of a static asset, or None to serve it as is"""
+        if not filename.endswith(STATIC_EXTENSIONS):
+            return None
+        encoding = _accepted_encoding()
+        if encoding is None:
+            return None
+        try:
+            path = self._compressed_path(app, filename, encoding)
+        except OSError as e:
+            logger.warning("Could not compress %s: %s", filename, e)
+            return None
+        if path is None:
+            return None
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_file(path, mimetype=mimetype, conditional=True,
+                             max_age=app.get_send_file_max_age(filename))
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+compression = Compression()
@@ -0,0 +1,759 @@
+"""Process-wide library snapshots shared by every user of a Plex server.
+
+A snapshot holds the movie library of one server (keyed by its machine
+identifier) as parallel columns indexed by a movie ordinal. Per-user watched
+state is kept separately as a small overlay over those ordinals, so a
+household of several users costs one copy of the library instead of one per
+user.
+
+Each movie section is fetched and refreshed on its own; the server snapshot
+merges every loaded section into one index, deduplicated by GUID so a film
+present in both an HD and a 4K section is a single candidate.
+
+Loaded sections are kept fresh in the background: a scheduler re-checks each
+server on an interval, and a request that finds a stale section is answered
+from the current snapshot while the refresh runs. A refresh first compares
+each section's ``updatedAt``/``contentChangedAt`` and only re-downloads the
+sections that changed, so an unchanged library keeps its generation (and
+every overlay and index built on it).
+
+Loaded sections are also saved to disk (see snapshot_store) and read back at
+startup, so a restarted process answers from the saved library right away.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from app.cache_registry import CacheEntry, cache_registry, estimate_size
+from app.snapshot_store import snapshot_store
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on sections fetched from one server at the same time
+SECTION_LOAD_WORKERS = 4
+
+# How often the refresh scheduler looks for servers that are due, in seconds
+SCHEDULER_TICK = 5
+
+
+class SnapshotMovie:
+    """Lightweight view of one movie inside a library snapshot"""
+
+    __slots__ = ('snapshot', 'ordinal', 'copy_rating_key')
+
+    def __init__(self, snapshot, ordinal, copy_rating_key=None):
+        self.snapshot = snapshot
+        self.ordinal = ordinal
+        self.copy_rating_key = copy_rating_key
+
+    @property
+    def rating_key(self):
+        return self.copy_rating_key or self.snapshot.rating_keys[self.ordinal]
+
+    @property
+    def guid(self):
+        return self.snapshot.guids[self.ordinal]
+
+    @property
+    def title(self):
+        return self.snapshot.titles[self.ordinal]
+
+    @property
+    def year(self):
+        return self.snapshot.years[self.ordinal]
+
+    @property
+    def rating(self):
+        return self.snapshot.ratings[self.ordinal]
+
+    @property
+    def summary(self):
+        return self.snapshot.summaries[self.ordinal]
+
+    @property
+    def thumb(self):
+        return self.snapshot.thumbs[self.ordinal]
+
+    @property
+    def duration(self):
+        return self.snapshot.durations[self.ordinal]
+
+    @property
+    def actors(self):
+        return list(self.snapshot.actors[self.ordinal])
+
+    @property
+    def directors(self):
+        return list(self.snapshot.directors[self.ordinal])
+
+    @property
+    def genres(self):
+        return list(self.snapshot.genres[self.ordinal])
+
+    def __repr__(self):
+        return f'<SnapshotMovie {self.title}>'
+
+
+class LibrarySnapshot:
+    """Immutable columnar copy of a server's movie library"""
+
+    def __init__(self, machine_identifier, generation=1):
+        self.machine_identifier = machine_identifier
+        self.generation = generation
+        self.built_at = time.time()
+        self.rating_keys = []
+        self.guids = []
+        self.titles = []
+        self.years = []
+        self.ratings = []
+        self.summaries = []
+        self.thumbs = []
+        self.durations = []
+        self.actors = []
+        self.directors = []
+        self.genres = []
+        self.ordinals = {}
+        self.section_ordinals = {}
+        self.section_copies = {}
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+        self._unique_guids = None
+
+    @classmethod
+    def from_movies(cls, machine_identifier, movies, plex, generation=1):
+        """Build a snapshot from plexapi movie objects"""
+        snapshot = cls(machine_identifier, generation)
+        for movie in movies:
+            snapshot.append(
+                rating_key=str(movie.ratingKey),
+                guid=getattr(movie, 'guid', None) or '',
+                title=movie.title,
+                year=plex.get_movie_year(movie) or 0,
+                rating=float(plex.get_movie_rating(movie) or 0),
+                summary=getattr(movie, 'summary', '') or '',
+                thumb=getattr(movie, 'thumb', '') or '',
+                duration=getattr(movie, 'duration', 0) or 0,
+                actors=tuple(plex.get_movie_actors(movie)),
+                directors=tuple(plex.get_movie_directors(movie)),
+                genres=tuple(g.tag for g in (getattr(movie, 'genres', None) or [])),
+            )
+        return snapshot
+
+    @classmethod
+    def merge(cls, machine_identifier, sections, generation=1):
+        """Merge per-section snapshots into one server snapshot
+
+        Movies sharing a GUID across sections get a single ordinal; the rating
+        keys of every copy resolve to it, and the ordinal is listed under each
+        section it appears in.
+        """
+        if len(sections) == 1 and sections[0].snapshot.unique_guids():
+            # Nothing to deduplicate: share the section's columns (and mapped buffers) as is
+            part = sections[0].snapshot
+            merged = cls(machine_identifier, generation)
+            for name in ('rating_keys', 'guids', 'titles', 'years', 'ratings', 'summaries',
+                         'thumbs', 'durations', 'actors', 'directors', 'genres', 'ordinals'):
+                setattr(merged, name, getattr(part, name))
+            merged._unique_guids = True
+            merged.section_ordinals[sections[0].key] = range(len(part))
+            return merged
+
+        merged = cls(machine_identifier, generation)
+        by_guid = {}
+        for section in sections:
+            part = section.snapshot
+            members = []
+            for i in range(len(part)):
+                guid = part.guids[i]
+                ordinal = by_guid.get(guid) if guid else None
+                if ordinal is None:
+                    ordinal = merged.append(
+                        part.rating_keys[i], guid, part.titles[i], part.years[i],
+                        part.ratings[i], part.summaries[i], part.thumbs[i],
+                        part.durations[i], part.actors[i], part.directors[i],
+                        part.genres[i],
+                    )
+                    if guid:
+                        by_guid[guid] = ordinal
+                else:
+                    merged.ordinals[part.rating_keys[i]] = ordinal
+                    merged.section_copies[(section.key, ordinal)] = part.rating_keys[i]
+                members.append(ordinal)
+            merged.section_ordinals[section.key] = members
+        return merged
+
+    def candidates(self, section_keys=None):
+        """Ordinals of the movies in the given sections (all when None)"""
+        if section_keys is None:
+            return range(len(self))
+        lists = [self.section_ordinals[key] for key in section_keys if key in self.section_ordinals]
+        if len(lists) == 1:
+            return lists[0]
+        return sorted(set().union(*lists))
+
+    def append(self, rating_key, guid, title, year, rating, summary, thumb,
+               duration, actors, directors, genres):
+        """Add one movie and return its ordinal"""
+        ordinal = len(self.rating_keys)
+        self.rating_keys.append(rating_key)
+        self.guids.append(guid)
+        self.titles.append(title)
+        self.years.append(year)
+        self.ratings.append(rating)
+        self.summaries.append(summary)
+        self.thumbs.append(thumb)
+        self.durations.append(duration)
+        self.actors.append(actors)
+        self.directors.append(directors)
+        self.genres.append(genres)
+        self.ordinals[rating_key] = ordinal
+        return ordinal
+
+    def __len__(self):
+        return len(self.rating_keys)
+
+    def ordinal_for(self, rating_key):
+        """Return the ordinal for a rating key, or None if not in the snapshot"""
+        if self.ordinals is None:
+            # Snapshots mapped from disk build their key lookup on first use
+            self.ordinals = {key: ordinal for ordinal, key in enumerate(self.rating_keys)}
+        return self.ordinals.get(str(rating_key))
+
+    def unique_guids(self):
+        """Whether no two movies share a GUID"""
+        if self._unique_guids is None:
+            guids = [guid for guid in self.guids if guid]
+            self._unique_guids = len(guids) == len(set(guids))
+        return self._unique_guids
+
+    def movie(self, ordinal, section_keys=None):
+        """Return a view of the movie at the given ordinal
+
+        With section keys, a film deduplicated across sections resolves to the
+        copy in one of those sections (e.g. the 4K copy for a 4K-only user).
+        """
+        if ordinal is None:
+            return None
+        copy_rating_key = None
+        if section_keys is not None:
+            copies = [self.section_copies.get((key, ordinal)) for key in section_keys
+                      if ordinal in self.section_ordinals.get(key, ())]
+            if copies and None not in copies:
+                copy_rating_key = copies[0]
+        return SnapshotMovie(self, ordinal, copy_rating_key)
+
+    def index(self, name, build):
+        """A derived index of this snapshot, built by ``build(snapshot)`` on first use
+
+        Indexes live as long as the snapshot, so every user of the server
+        shares them and a new generation starts with none.
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            with self._index_lock:
+                index = self._indexes.get(name)
+                if index is None:
+                    index = build(self)
+                    self._indexes[name] = index
+        return index
+
+    def memory_size(self, seen=None):
+        """Approximate bytes held by the columns and indexes of the snapshot"""
+        columns = (self.rating_keys, self.guids, self.titles, self.years, self.ratings,
+                   self.summaries, self.thumbs, self.durations, self.actors, self.directors,
+                   self.genres, self.ordinals, self.section_ordinals, self.section_copies)
+        size = sum(estimate_size(column, seen) for column in columns)
+        return size + sum(estimate_size(index, seen) for index in list(self._indexes.values()))
+
+    @property
+    def age(self):
+        return time.time() - self.built_at
+
+
+class SnapshotIndex:
+    """Base for indexes derived from a snapshot and kept on it as ``index_name``"""
+
+    index_name = None
+
+    @classmethod
+    def of(cls, snapshot):
+        """The snapshot's index, built on first use"""
+        return snapshot.index(cls.index_name, cls)
+
+
+class WatchedOverlay:
+    """Compact per-user watched state over the ordinals of one snapshot
+
+    Watched flags are a bitset; lastViewedAt timestamps are a sparse map that
+    only holds entries for movies the user has actually watched.
+    """
+
+    def __init__(self, size, generation):
+        self.generation = generation
+        self.built_at = time.time()
+        self.bits = bytearray((size + 7) // 8)
+        self.last_viewed = {}
+        self.last_used = self.built_at
+
+    def mark_watched(self, ordinal, last_viewed_at=None):
+        self.bits[ordinal >> 3] |= 1 << (ordinal & 7)
+        if last_viewed_at is not None:
+            previous = self.last_viewed.get(ordinal)
+            if previous is None or last_viewed_at > previous:
+                self.last_viewed[ordinal] = last_viewed_at
+
+    def is_watched(self, ordinal):
+        return bool(self.bits[ordinal >> 3] & (1 << (ordinal & 7)))
+
+    def watched_ordinals(self):
+        """Ordinals of every watched movie, in order"""
+        for index, byte in enumerate(self.bits):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield (index << 3) | bit
+
+    @property
+    def watched_count(self):
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+    def last_watched_ordinal(self):
+        """Ordinal of the most recently viewed movie, or None"""
+        if not self.last_viewed:
+            return None
+        return max(self.last_viewed, key=self.last_viewed.get)
+
+    @property
+    def age(self):
+        return time.time() - self.built_at
+
+
+def token_key(token):
+    """Stable, non-reversible cache key for a Plex token"""
+    return hashlib.sha256((token or '').encode('utf-8')).hexdigest()[:16]
+
+
+class SectionLibrary:
+    """One movie section of a server, fetched and refreshed on its own"""
+
+    def __init__(self, key, title, snapshot, updated_at=None, content_changed_at=None, load_seconds=0.0):
+        self.key = key
+        self.title = title
+        self.snapshot = snapshot
+        self.updated_at = updated_at
+        self.content_changed_at = content_changed_at
+        self.load_seconds = load_seconds
+        self.built_at = time.time()
+
+    def unchanged(self, section):
+        """Whether the server reports no change to the section since it was fetched"""
+        if self.updated_at is None and self.content_changed_at is None:
+            return False
+        return (getattr(section, 'updatedAt', None) == self.updated_at
+                and getattr(section, 'contentChangedAt', None) == self.content_changed_at)
+
+    @property
+    def age(self):
+        return time.time() - self.built_at
+
+
+class ServerLibrary:
+    """Everything cached for one server: its section list, sections and merged snapshot"""
+
+    def __init__(self, machine_identifier):
+        self.machine_identifier = machine_identifier
+        self.section_list = []
+        self.section_list_built_at = 0
+        self.sections = {}
+        self.snapshot = None
+        self.server_name = None
+        self.connect = None  # Returns a new PlexAPI for this server, for background refreshes
+        self.refreshing = False
+        self.next_refresh_at = 0
+        self.last_sync = None
+        self.last_used = time.time()
+        self._memory = (None, 0)
+
+    def memory_size(self):
+        """Approximate bytes held by the merged snapshot and its sections
+
+        Sections and the merged snapshot share most of their values, so they
+        are sized together; the result is kept until the snapshot or its
+        indexes change.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return 0
+        version = (id(snapshot), len(snapshot._indexes), len(self.sections))
+        if self._memory[0] != version:
+            seen = set()
+            size = snapshot.memory_size(seen)
+            size += sum(section.snapshot.memory_size(seen) for section in list(self.sections.values()))
+            self._memory = (version, size)
+        return self._memory[1]
+
+
+class LibraryCache:
+    """Registry of library snapshots keyed by server machine identifier
+
+    Snapshots are shared across all users of a server. Watched overlays are
+    keyed by (machine identifier, user key) and rebuilt whenever the
+    snapshot generation they were built against is replaced.
+    """
+
+    def __init__(self, ttl=300, overlay_ttl=60, refresh_interval=300, refresh_jitter=0.1):
+        self.ttl = ttl
+        self.overlay_ttl = overlay_ttl
+        self.refresh_interval = refresh_interval
+        self.refresh_jitter = refresh_jitter
+        self._lock = threading.Lock()
+        self._servers = {}
+        self._overlays = {}
+        self._build_locks = {}
+        self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='library-refresh')
+        self._scheduler = None
+        cache_registry.register('library', self._library_entries, self.invalidate)
+        cache_registry.register('watched', self._overlay_entries, self._evict_overlay)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('LIBRARY_CACHE_TTL', self.ttl)
+        self.overlay_ttl = app.config.get('WATCHED_CACHE_TTL', self.overlay_ttl)
+        self.refresh_interval = app.config.get('LIBRARY_REFRESH_INTERVAL', self.refresh_interval)
+        self.refresh_jitter = app.config.get('LIBRARY_REFRESH_JITTER', self.refresh_jitter)
+        if self.refresh_interval > 0 and self._scheduler is None:
+            self._scheduler = threading.Thread(target=self._run_scheduler, name='library-scheduler', daemon=True)
+            self._scheduler.start()
+        self.load_saved()
+
+    def load_saved(self):
+        """Install the sections saved by a previous run as each server's first snapshot"""
+        for machine_identifier, sections in snapshot_store.load_all().items():
+            server = self._server(machine_identifier)
+            with self._build_lock(('snapshot', machine_identifier)):
+                if server.snapshot is not None:
+                    continue
+                for section in sections:
+                    server.sections[section.key] = section
+                self._rebuild(server)
+
+    def ready(self):
+        """Whether at least one server has a library snapshot to answer from"""
+        with self._lock:
+            return any(server.snapshot is not None for server in self._servers.values())
+
+    def _build_lock(self, key):
+        with self._lock:
+            lock = self._build_locks.get(key)
+            if lock is None:
+                lock = self._build_locks[key] = threading.Lock()
+            return lock
+
+    def _server(self, machine_identifier):
+        with self._lock:
+            server = self._servers.get(machine_identifier)
+            if server is None:
+                server = self._servers[machine_identifier] = ServerLibrary(machine_identifier)
+            return server
+
+    def get_sections(self, plex):
+        """Return [(key, title)] for the movie sections of a server"""
+        server = self._server(plex.server.machineIdentifier)
+        if server.section_list and time.time() - server.section_list_built_at < self.ttl:
+            return server.section_list
+        server.section_list = [(str(section.key), section.title) for section in plex.get_movie_sections()]
+        server.section_list_built_at = time.time()
+        return server.section_list
+
+    def default_section_keys(self, plex):
+        """The 'Movies' section if the server has one, otherwise every movie section"""
+        sections = self.get_sections(plex)
+        keys = [key for key, title in sections if title == 'Movies']
+        return keys or [key for key, _ in sections]
+
+    def get_snapshot(self, plex, section_keys=None):
+        """Return the current snapshot for the server behind a PlexAPI instance
+
+        Requested sections that were never loaded are fetched concurrently
+        before returning. Stale sections are not waited for: the current
+        snapshot is returned and a background refresh is started. The
+        returned snapshot covers every section loaded so far.
+        """
+        if not plex.server:
+            return None
+        server = self._server(plex.server.machineIdentifier)
+        server.server_name = plex.server_name
+        api, token, server_name = type(plex), plex.token, plex.server_name
+        server.connect = lambda: api(token, server_name)
+        available = {key: title for key, title in self.get_sections(plex)}
+        if section_keys is None:
+            section_keys = self.default_section_keys(plex)
+        wanted = [key for key in section_keys if key in available]
+
+        server.last_used = time.time()
+
+        if server.snapshot is not None and not self._missing_sections(server, wanted):
+            cache_registry.hit('library')
+            if self._stale_sections(server, wanted):
+                self.schedule_refresh(server)
+            return server.snapshot
+
+        cache_registry.miss('library')
+
+        # Only one thread rebuilds a given server; the others wait and reuse it
+        with self._build_lock(('snapshot', server.machine_identifier)):
+            missing = self._missing_sections(server, wanted)
+            if server.snapshot is not None and not missing:
+                return server.snapshot
+
+            if missing:
+                with ThreadPoolExecutor(max_workers=min(len(missing), SECTION_LOAD_WORKERS)) as executor:
+                    loaded = list(executor.map(
+                        lambda key: self._load_section(plex, key, available[key]), missing))
+                for section in loaded:
+                    if section is not None:
+                        server.sections[section.key] = section
+
+            self._rebuild(server)
+            if not server.next_refresh_at:
+                server.next_refresh_at = self._next_refresh_time()
+            snapshot = server.snapshot
+        cache_registry.enforce()
+        return snapshot
+
+    def _missing_sections(self, server, keys):
+        return [key for key in keys if key not in server.sections]
+
+    def _stale_sections(self, server, keys):
+        return [key for key in keys
+                if key not in server.sections or server.sections[key].age >= self.ttl]
+
+    def _load_section(self, plex, key, title, section=None):
+        started = time.time()
+        try:
+            if section is None:
+                section = plex.get_movie_section(key)
+            movies = section.all()
+            snapshot = LibrarySnapshot.from_movies(plex.server.machineIdentifier, movies, plex)
+            logger.info("Loaded %s movie(s) from section '%s' in %.1fs", len(snapshot), title, time.time() - started)
+            library = SectionLibrary(key, title, snapshot, getattr(section, 'updatedAt', None),
+                                     getattr(section, 'contentChangedAt', None), time.time() - started)
+        except Exception as e:
+            logger.warning("Error loading section '%s': %s", title, e)
+            return None
+        try:
+            snapshot_store.save_section(plex.server.machineIdentifier, library)
+        except OSError as e:
+            logger.warning("Could not save section '%s': %s", title, e)
+        return library
+
+    def refresh_server(self, plex, server=None):
+        """Re-sync the loaded sections of a server that changed on the server
+
+        Each section's change markers are checked first; only changed
+        sections are downloaded again, and a new snapshot generation is only
+        built when at least one did. Requests keep using the current snapshot
+        meanwhile.
+
+        Returns:
+            list: Keys of the sections that were reloaded
+        """
+        server = server or self._server(plex.server.machineIdentifier)
+        started = time.time()
+        changed = []
+        error = None
+        with self._build_lock(('snapshot', server.machine_identifier)):
+            try:
+                # List the sections afresh: plexapi keeps the markers sectionByID()
+                # returns from the connection's first listing
+                listed = {str(section.key): section for section in plex.server.library.sections()}
+                for key, library in list(server.sections.items()):
+                    section = listed.get(str(key))
+                    if section is None:
+                        raise RuntimeError(f"section '{library.title}' is no longer on the server")
+                    if library.unchanged(section):
+                        library.built_at = time.time()
+                        continue
+                    loaded = self._load_section(plex, key, library.title, section)
+                    if loaded is None:
+                        raise RuntimeError(f"could not reload section '{library.title}'")
+                    server.sections[key] = loaded
+                    changed.append(key)
+            except Exception as e:
+                error = str(e)
+            if changed:
+                self._rebuild(server)
+        if changed:
+            cache_registry.enforce()
+        server.last_sync = {
+            'started_at': started,
+            'duration': time.time() - started,
+            'changed_sections': changed,
+            'error': error,
+        }
+        return changed
+
+    def schedule_refresh(self, server):
+        """Refresh a server in the background unless a refresh is already running"""
+        if server.connect is None:
+            return False
+        with self._lock:
+            if server.refreshing:
+                return False
+            server.refreshing = True
+        self._refresh_executor.submit(self._refresh_in_background, server)
+        return True
+
+    def _refresh_in_background(self, server):
+        try:
+            plex = server.connect()
+            if not plex.server:
+                raise ConnectionError(f"could not connect to '{server.server_name}'")
+            changed = self.refresh_server(plex, server)
+            if changed:
+                logger.info("Refreshed %s changed section(s) on '%s'", len(changed), server.server_name)
+        except Exception as e:
+            logger.warning("Error refreshing library of '%s': %s", server.server_name, e)
+            server.last_sync = {'started_at': time.time(), 'duration': 0, 'changed_sections': [], 'error': str(e)}
+        finally:
+            server.next_refresh_at = self._next_refresh_time()
+            server.refreshing = False
+
+    def _next_refresh_time(self):
+        # Jitter keeps servers and worker processes from refreshing in lockstep
+        jitter = random.uniform(-self.refresh_jitter, self.refresh_jitter)
+        return time.time() + self.refresh_interval * (1 + jitter)
+
+    def _run_scheduler(self):
+        while True:
+            time.sleep(min(SCHEDULER_TICK, self.refresh_interval))
+            now = time.time()
+            with self._lock:
+                servers = list(self._servers.values())
+            for server in servers:
+                if server.sections and server.next_refresh_at and now >= server.next_refresh_at:
+                    self.schedule_refresh(server)
+
+    def refresh_all(self):
+        """Start a background refresh of every server that has loaded sections"""
+        with self._lock:
+            servers = list(self._servers.values())
+        return [server.server_name for server in servers if server.sections and self.schedule_refresh(server)]
+
+    def status(self):
+        """Snapshot generation, age and last sync of each cached server"""
+        now = time.time()
+        with self._lock:
+            servers = list(self._servers.values())
+        status = []
+        for server in servers:
+            snapshot = server.snapshot
+            last_sync = None
+            if server.last_sync:
+                last_sync = {
+                    'started_at': datetime.utcfromtimestamp(server.last_sync['started_at']).isoformat(),
+                    'age': round(now - server.last_sync['started_at'], 1),
+                    'duration': round(server.last_sync['duration'], 3),
+                    'changed_sections': server.last_sync['changed_sections'],
+                    'error': server.last_sync['error'],
+                }
+            status.append({
+                'server': server.server_name,
+                'machine_identifier': server.machine_identifier,
+                'generation': snapshot.generation if snapshot else None,
+                'movies': len(snapshot) if snapshot else 0,
+                'age': round(snapshot.age, 1) if snapshot else None,
+                'refreshing': server.refreshing,
+                'next_refresh_in': (round(max(0, server.next_refresh_at - now), 1)
+                                    if self.refresh_interval > 0 and server.next_refresh_at else None),
+                'last_sync': last_sync,
+                'sections': [{
+                    'key': section.key,
+                    'title': section.title,
+                    'movies': len(section.snapshot),
+                    'age': round(section.age, 1),
+                } for section in server.sections.values()],
+            })
+        return status
+
+    def _rebuild(self, server):
+        """Merge the loaded sections into a new snapshot generation"""
+        generation = server.snapshot.generation + 1 if server.snapshot else 1
+        sections = [server.sections[key] for key in sorted(server.sections, key=_section_sort_key)]
+        snapshot = LibrarySnapshot.merge(server.machine_identifier, sections, generation)
+        with self._lock:
+            server.snapshot = snapshot
+
+    def get_overlay(self, snapshot, user_key, load_states):
+        """Return the watched overlay for a user against a snapshot
+
+        ``load_states`` is called on a rebuild and must return an iterable of
+        (rating_key, last_viewed_timestamp) pairs for the user's watched movies.
+        """
+        key = (snapshot.machine_identifier, user_key)
+
+        overlay = self._overlays.get(key)
+        if self._overlay_fresh(overlay, snapshot):
+            cache_registry.hit('watched')
+            overlay.last_used = time.time()
+            return overlay
+
+        cache_registry.miss('watched')
+        with self._build_lock(('overlay',) + key):
+            overlay = self._overlays.get(key)
+            if self._overlay_fresh(overlay, snapshot):
+                return overlay
+
+            overlay = WatchedOverlay(len(snapshot), snapshot.generation)
+            for rating_key, last_viewed_at in load_states():
+                ordinal = snapshot.ordinal_for(rating_key)
+                if ordinal is not None:
+                    overlay.mark_watched(ordinal, last_viewed_at)
+            with self._lock:
+                self._overlays[key] = overlay
+        cache_registry.enforce()
+        return overlay
+
+    def _overlay_fresh(self, overlay, snapshot):
+        return (overlay is not None
+                and overlay.generation == snapshot.generation
+                and overlay.age < self.overlay_ttl)
+
+    def _library_entries(self):
+        with self._lock:
+            servers = list(self._servers.values())
+        return [CacheEntry(server.machine_identifier, server.memory_size(), server.last_used,
+                           sum(section.load_seconds for section in list(server.sections.values())))
+                for server in servers if server.snapshot is not None]
+
+    def _overlay_entries(self):
+        with self._lock:
+            overlays = list(self._overlays.items())
+        return [CacheEntry(key, estimate_size(overlay.bits) + estimate_size(overlay.last_viewed), overlay.last_used)
+                for key, overlay in overlays]
+
+    def _evict_overlay(self, key):
+        with self._lock:
+            self._overlays.pop(key, None)
+
+    def invalidate(self, machine_identifier=None):
+        """Drop cached snapshots and overlays (all servers if none given)"""
+        with self._lock:
+            if machine_identifier is None:
+                self._servers.clear()
+                self._overlays.clear()
+                return
+            self._servers.pop(machine_identifier, None)
+            for key in [k for k in self._overlays if k[0] == machine_identifier]:
+                del self._overlays[key]
+
+
+def _section_sort_key(key):
+    # Numeric section keys load in server order, so the oldest section's copy wins a GUID tie
+    return (0, int(key), key) if key.isdigit() else (1, 0, key)
+
+
+library_cache = LibraryCache()
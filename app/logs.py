@@ -0,0 +1,97 @@
+"""Leveled, structured logging that writes off the request thread.
+
+Modules log through ``logging.getLogger(__name__)`` with %-style arguments,
+so a message is only formatted when its level is enabled. Records go onto an
+in-process queue and a single listener thread formats and writes them, so a
+request never waits on stdout.
+
+``event()`` logs a named event with fields (``method=... outcome=...``),
+which the formatter appends as ``key=value`` pairs, or as JSON with
+``LOG_FORMAT=json``. Per-attempt Plex diagnostics are debug events: free
+unless ``LOG_LEVEL=DEBUG``.
+"""
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+_listener = None
+
+
+def event(logger, level, name, exc_info=False, **fields):
+    """Log a structured event; nothing is built when the level is disabled"""
+    if logger.isEnabledFor(level):
+        logger.log(level, name, exc_info=exc_info, extra={'fields': fields})
+
+
+def _field(value):
+    if isinstance(value, float):
+        return f'{value:.3f}'
+    text = str(value)
+    return json.dumps(text) if not text or ' ' in text or '"' in text else text
+
+
+class TextFormatter(logging.Formatter):
+    """The message, then the event's fields as key=value pairs"""
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={_field(value)}' for key, value in fields.items())
+        return line
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with the event's fields as keys"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class _LocalQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are; formatting happens on the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+def init_app(app):
+    """Send the app's loggers through a queue to stdout at LOG_LEVEL"""
+    global _listener
+    level = logging.getLevelName(str(app.config.get('LOG_LEVEL', 'INFO')).upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+
+    logger = logging.getLogger('app')
+    logger.setLevel(level)
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if app.config.get('LOG_FORMAT', 'text') == 'json':
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(TextFormatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger.addHandler(_LocalQueueHandler(records))
+    logger.propagate = False
@@ -0,0 +1,144 @@
+"""Versioned database migrations and SQLite connection tuning.
+
+The schema version is stored in a one-row ``schema_version`` table. At
+startup we read that single integer and only apply the migrations numbered
+above it, in order, each in its own transaction. A new database is created
+from the models and stamped with the latest version directly.
+
+Databases from before versioning existed have tables but no version; they
+run every migration once. Each migration therefore checks whether its change
+is already there before applying it.
+"""
+import logging
+
+from sqlalchemy import event, inspect, text
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def _add_column(conn, table, column, ddl):
+    columns = [col['name'] for col in inspect(conn).get_columns(table)]
+    if column in columns:
+        return
+    logger.info("Adding %s column to %s", column, table)
+    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    logger.info("Added %s column", column)
+
+
+def create_missing_tables(conn):
+    """Tables added to the models since the database was created"""
+    db.metadata.create_all(conn)
+
+
+def add_selected_client_columns(conn):
+    _add_column(conn, 'user_preferences', 'selected_client_name', 'VARCHAR(255)')
+    _add_column(conn, 'user_preferences', 'selected_client_identifier', 'VARCHAR(255)')
+
+
+def add_library_sections(conn):
+    _add_column(conn, 'user_preferences', 'library_sections', 'VARCHAR(255)')
+
+
+def add_passed_movie_server(conn):
+    _add_column(conn, 'passed_movies', 'server_name', 'VARCHAR(100)')
+
+
+def recreate_watched_movies(conn):
+    """watched_movies only caches server watch history, so an old single-server
+    copy is simply recreated and re-synced"""
+    from app.models import WatchedMovie
+    columns = [col['name'] for col in inspect(conn).get_columns('watched_movies')]
+    if 'server_id' in columns:
+        return
+    logger.info("Recreating watched_movies for multi-server watch history")
+    WatchedMovie.__table__.drop(conn)
+    WatchedMovie.__table__.create(conn)
+    logger.info("Recreated watched_movies table")
+
+
+def add_preference_version(conn):
+    _add_column(conn, 'user_preferences', 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+def add_passed_movie_indexes(conn):
+    """Indexes for paging and filtering the passed movies list"""
+    from app.models import PassedMovie
+    for index in PassedMovie.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def add_similarity_preferences(conn):
+    _add_column(conn, 'user_preferences', 'similar_to_last_watched', 'BOOLEAN DEFAULT 0')
+    _add_column(conn, 'user_preferences', 'similarity_genres', 'BOOLEAN DEFAULT 0')
+
+
+def add_account_check_time(conn):
+    _add_column(conn, 'watch_history_syncs', 'account_checked_at', 'DATETIME')
+
+
+# Ordered migrations; append new ones with the next number, never renumber
+MIGRATIONS = [
+    (1, create_missing_tables),
+    (2, add_selected_client_columns),
+    (3, add_library_sections),
+    (4, add_passed_movie_server),
+    (5, recreate_watched_movies),
+    (6, add_preference_version),
+    (7, add_passed_movie_indexes),
+    (8, add_similarity_preferences),
+    (9, add_account_check_time),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """The stored schema version, or None if the database isn't versioned yet"""
+    conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    return conn.execute(text('SELECT version FROM schema_version')).scalar()
+
+
+def _set_schema_version(conn, version):
+    conn.execute(text('DELETE FROM schema_version'))
+    conn.execute(text('INSERT INTO schema_version (version) VALUES (:version)'), {'version': version})
+
+
+def upgrade_database(engine):
+    """Bring the database schema up to LATEST_VERSION"""
+    with engine.begin() as conn:
+        version = get_schema_version(conn)
+        if version == LATEST_VERSION:
+            return
+
+        if version is None and not inspect(conn).has_table('users'):
+            # A new database gets the current schema in one go
+            db.metadata.create_all(conn)
+            _set_schema_version(conn, LATEST_VERSION)
+            logger.info("Created database schema (version %s)", LATEST_VERSION)
+            return
+
+    current = version or 0
+    for number, migration in MIGRATIONS:
+        if number <= current:
+            continue
+        with engine.begin() as conn:
+            migration(conn)
+            _set_schema_version(conn, number)
+    logger.info("Database migrated from version %s to %s", current, LATEST_VERSION)
+
+
+def configure_sqlite(engine, busy_timeout=30, synchronous='NORMAL'):
+    """Use WAL journaling so readers don't block the writer, and wait for locks"""
+    if engine.dialect.name != 'sqlite':
+        return
+    if synchronous not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+        synchronous = 'NORMAL'
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout * 1000)}')
+        cursor.close()
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from sqlalchemy import event
 from app import db
 from flask_login import UserMixin
 
@@ -13,6 +14,8 @@ class User(UserMixin, db.Model):
 
     # Relationships
     passed_movies = db.relationship('PassedMovie', backref='user', lazy=True, cascade='all, delete-orphan')
+    watched_movies = db.relationship('WatchedMovie', backref='user', lazy=True, cascade='all, delete-orphan')
+    history_syncs = db.relationship('WatchHistorySync', backref='user', lazy=True, cascade='all, delete-orphan')
     preferences = db.relationship('UserPreference', backref='user', uselist=False, cascade='all, delete-orphan')
 
     def __repr__(self):
@@ -20,10 +23,15 @@ class User(UserMixin, db.Model):
 
 class PassedMovie(db.Model):
     __tablename__ = 'passed_movies'
+    __table_args__ = (
+        db.Index('ix_passed_movies_user_passed', 'user_id', 'passed_at', 'id'),
+        db.Index('ix_passed_movies_user_expires', 'user_id', 'expires_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     plex_rating_key = db.Column(db.String(100), nullable=False)
+    server_name = db.Column(db.String(100), nullable=True)  # Configured server name; None means the primary server
     movie_title = db.Column(db.String(255), nullable=False)
     passed_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=False)
@@ -41,6 +49,37 @@ class PassedMovie(db.Model):
     def __repr__(self):
         return f'<PassedMovie {self.movie_title}>'
 
+class WatchedMovie(db.Model):
+    __tablename__ = 'watched_movies'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'server_id', 'plex_rating_key', name='uq_watched_movies_user_server_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    server_id = db.Column(db.String(100), nullable=False)  # Plex server machine identifier
+    plex_rating_key = db.Column(db.String(100), nullable=False)
+    last_viewed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<WatchedMovie {self.plex_rating_key} for user_id {self.user_id}>'
+
+class WatchHistorySync(db.Model):
+    __tablename__ = 'watch_history_syncs'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'server_id', name='uq_watch_history_syncs_user_server'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    server_id = db.Column(db.String(100), nullable=False)  # Plex server machine identifier
+    plex_account_id = db.Column(db.Integer, nullable=True)  # Account ID on that server (managed users included)
+    account_checked_at = db.Column(db.DateTime, nullable=True)  # Last failed account lookup (UTC)
+    synced_at = db.Column(db.DateTime, nullable=True)  # Last successful watch history sync (UTC)
+
+    def __repr__(self):
+        return f'<WatchHistorySync user_id {self.user_id} on {self.server_id}>'
+
 class UserPreference(db.Model):
     __tablename__ = 'user_preferences'
 
@@ -53,10 +92,44 @@ class UserPreference(db.Model):
     exclude_same_director = db.Column(db.Boolean, default=False)
     filter_decade = db.Column(db.String(10), nullable=True)  # e.g., "1990s", "2000s"
     filter_actor = db.Column(db.String(100), nullable=True)
+    similar_to_last_watched = db.Column(db.Boolean, default=False)  # Rank by cast/crew overlap
+    similarity_genres = db.Column(db.Boolean, default=False)  # Let shared genres count toward similarity
+
+    # Library preferences
+    library_sections = db.Column(db.String(255), nullable=True)  # Comma-separated section keys, e.g. "1,4,archive:2"
 
     # Playback client preferences
     selected_client_name = db.Column(db.String(255), nullable=True)  # e.g., "SHIELD Android TV"
     selected_client_identifier = db.Column(db.String(255), nullable=True)  # Machine identifier for verification
 
+    # Bumped on every update; used as the ETag of preference responses
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    @property
+    def section_keys(self):
+        """Selected movie sections, or None to use the default 'Movies' section
+
+        Sections on the primary server are stored as their bare key; sections
+        on other servers are prefixed with the server name ("archive:2").
+        """
+        if not self.library_sections:
+            return None
+        return [key for key in self.library_sections.split(',') if key]
+
+    def section_keys_for(self, server_name, primary=False):
+        """Selected section keys on one server, or None to use its default sections"""
+        keys = self.section_keys
+        if keys is None:
+            return None
+        prefix = f'{server_name}:'
+        return [key[len(prefix):] if key.startswith(prefix) else key
+                for key in keys
+                if key.startswith(prefix) or (primary and ':' not in key)]
+
     def __repr__(self):
         return f'<UserPreference for user_id {self.user_id}>'
+
+@event.listens_for(UserPreference, 'before_update')
+def bump_preference_version(mapper, connection, target):
+    # Incremented in SQL, so concurrent saves don't conflict (last write wins)
+    target.version = UserPreference.version + 1
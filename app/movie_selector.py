@@ -1,13 +1,62 @@
 import random
 from datetime import datetime
-from app.models import PassedMovie
+from flask import current_app
+from app import db
+from app.models import PassedMovie, User
 from app.plex_api import PlexAPI
+from app.posters import poster_url
+from app.server_pool import server_pool, run_on_servers
+from app.similarity import CreditIndex
+from app.actor_index import ActorIndex
 
 class MovieSelector:
-    def __init__(self, user, plex_api):
+    """Select movies from the shared library snapshot of one server
+
+    Filters work on movie ordinals of the snapshot rather than on plexapi
+    objects, so a recommendation never re-downloads the library.
+    """
+
+    def __init__(self, user, plex_api, last_watched=None):
         self.user = user
         self.plex = plex_api
         self.preferences = user.preferences
+        self.last_watched = last_watched
+        # GUIDs watched or passed on any connected server (see share_exclusions)
+        self.shared_watched = frozenset()
+        self.shared_passed = frozenset()
+        self._passed_keys = None
+        self._snapshot = None
+        self._overlay = None
+        self._section_keys = None
+
+    @property
+    def section_keys(self):
+        """Movie sections of this server the user draws recommendations from"""
+        if self._section_keys is None:
+            keys = self.plex.get_user_section_keys(self.user)
+            self._section_keys = keys if keys is not None else self.plex.get_default_section_keys()
+        return self._section_keys
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = self.plex.get_library_snapshot(self.section_keys)
+        return self._snapshot
+
+    @property
+    def overlay(self):
+        if self._overlay is None and self.snapshot is not None:
+            self._overlay = self.plex.get_watched_overlay(self.snapshot, self.user)
+        return self._overlay
+
+    def get_last_watched(self):
+        """Return (last_viewed_timestamp, movie) for this server, or None"""
+        if self.overlay is None:
+            return None
+        ordinal = self.overlay.last_watched_ordinal()
+        if ordinal is None:
+            return None
+        return self.overlay.last_viewed[ordinal], self.snapshot.movie(ordinal)
 
     def get_decade_from_year(self, year):
         """Convert year to decade string (e.g., 1995 -> '1990s')"""
@@ -16,17 +65,25 @@ class MovieSelector:
         decade = (year // 10) * 10
         return f"{decade}s"
 
-    def filter_movies(self, movies):
-        """Apply all active filters to the movie list"""
-        filtered_movies = movies
+    def filter_movies(self, ordinals):
+        """Apply all active filters to a list of movie ordinals"""
+        filtered_movies = ordinals
 
-        # Filter 1: Exclude watched movies
-        if self.preferences and self.preferences.exclude_watched:
-            filtered_movies = [m for m in filtered_movies if not getattr(m, 'isWatched', False)]
+        guids = self.snapshot.guids
 
-        # Get passed movie rating keys
-        passed_keys = self._get_passed_movie_keys()
-        filtered_movies = [m for m in filtered_movies if str(m.ratingKey) not in passed_keys]
+        # Filter 1: Exclude watched movies, and films watched on another server
+        if self.preferences and self.preferences.exclude_watched:
+            if self.overlay is not None:
+                is_watched = self.overlay.is_watched
+                filtered_movies = [i for i in filtered_movies if not is_watched(i)]
+            if self.shared_watched:
+                filtered_movies = [i for i in filtered_movies if guids[i] not in self.shared_watched]
+
+        # Get passed movie rating keys (any copy of a film passes every copy)
+        passed = self._passed_ordinals()
+        if passed or self.shared_passed:
+            filtered_movies = [i for i in filtered_movies
+                               if i not in passed and guids[i] not in self.shared_passed]
 
         # Filter 2: Include only movies with same actors as last watched
         if self.preferences and self.preferences.exclude_same_actors:
@@ -44,96 +101,135 @@ class MovieSelector:
         if self.preferences and self.preferences.filter_actor:
             filtered_movies = self._filter_by_specific_actor(filtered_movies)
 
+        # Filter 6: Keep the movies most similar to last watched
+        if self.preferences and self.preferences.similar_to_last_watched:
+            filtered_movies = self._filter_by_similarity(filtered_movies)
+
         return filtered_movies
 
     def _get_passed_movie_keys(self):
-        """Get list of rating keys for movies that are currently passed (not expired)"""
-        passed_movies = PassedMovie.query.filter_by(user_id=self.user.id).all()
-        # Only include non-expired passes - store as strings for comparison
-        return set([str(pm.plex_rating_key) for pm in passed_movies if not pm.is_expired])
-
-    def _filter_by_actors(self, movies):
+        """Get list of rating keys for movies on this server that are currently passed (not expired)"""
+        if self._passed_keys is not None:
+            return self._passed_keys
+        # Only include non-expired passes (ix_passed_movies_user_expires)
+        passed_movies = PassedMovie.query.filter(
+            PassedMovie.user_id == self.user.id,
+            PassedMovie.expires_at >= datetime.utcnow()
+        ).all()
+        server_name = self.plex.server_name
+        primary = self.plex.server_config.primary
+        # Store as strings for comparison
+        self._passed_keys = set([str(pm.plex_rating_key) for pm in passed_movies
+                                 if pm.server_name == server_name or (pm.server_name is None and primary)])
+        return self._passed_keys
+
+    def _passed_ordinals(self):
+        """Ordinals of this server's passed movies"""
+        ordinal_for = self.snapshot.ordinal_for
+        return {ordinal_for(key) for key in self._get_passed_movie_keys()} - {None}
+
+    def watched_guids(self):
+        """GUIDs of the movies the user watched on this server"""
+        if self.overlay is None:
+            return set()
+        guids = self.snapshot.guids
+        return {guids[i] for i in self.overlay.watched_ordinals() if guids[i]}
+
+    def passed_guids(self):
+        """GUIDs of the movies the user passed on this server"""
+        guids = self.snapshot.guids
+        return {guids[i] for i in self._passed_ordinals() if guids[i]}
+
+    def _get_last_watched_movie(self):
+        """The last watched movie, across servers when one was handed in"""
+        if self.last_watched is not None:
+            return self.last_watched
+        last_watched = self.get_last_watched()
+        return last_watched[1] if last_watched else None
+
+    def _filter_by_actors(self, ordinals):
         """Filter to only include movies with actors from the last watched movie"""
-        last_watched = self.plex.get_last_watched_movie(self.user.plex_username)
-        if not last_watched:
-            return movies
+        last_watched = self._get_last_watched_movie()
+        if last_watched is None:
+            return ordinals
 
-        last_actors = set(self.plex.get_movie_actors(last_watched))
+        last_actors = set(last_watched.actors)
         if not last_actors:
-            return movies
-
-        filtered = []
-        for movie in movies:
-            movie_actors = set(self.plex.get_movie_actors(movie))
-            # Include if there's any overlap in actors
-            if movie_actors.intersection(last_actors):
-                filtered.append(movie)
+            return ordinals
 
-        return filtered
+        # Include if there's any overlap in actors
+        actors = self.snapshot.actors
+        return [i for i in ordinals if not last_actors.isdisjoint(actors[i])]
 
-    def _filter_by_director(self, movies):
+    def _filter_by_director(self, ordinals):
         """Filter to only include movies from the same director as last watched movie"""
-        last_watched = self.plex.get_last_watched_movie(self.user.plex_username)
-        if not last_watched:
-            return movies
+        last_watched = self._get_last_watched_movie()
+        if last_watched is None:
+            return ordinals
 
-        last_directors = set(self.plex.get_movie_directors(last_watched))
+        last_directors = set(last_watched.directors)
         if not last_directors:
-            return movies
+            return ordinals
 
-        filtered = []
-        for movie in movies:
-            movie_directors = set(self.plex.get_movie_directors(movie))
-            # Include if there's any overlap in directors
-            if movie_directors.intersection(last_directors):
-                filtered.append(movie)
+        # Include if there's any overlap in directors
+        directors = self.snapshot.directors
+        return [i for i in ordinals if not last_directors.isdisjoint(directors[i])]
 
-        return filtered
-
-    def _filter_by_decade(self, movies):
+    def _filter_by_decade(self, ordinals):
         """Filter movies by specified decade"""
         target_decade = self.preferences.filter_decade
         if not target_decade:
-            return movies
+            return ordinals
 
-        filtered = []
-        for movie in movies:
-            year = self.plex.get_movie_year(movie)
-            if year:
-                movie_decade = self.get_decade_from_year(year)
-                if movie_decade == target_decade:
-                    filtered.append(movie)
+        try:
+            start = int(target_decade.rstrip('s'))
+        except ValueError:
+            return []
 
-        return filtered
+        years = self.snapshot.years
+        return [i for i in ordinals if years[i] and start <= years[i] < start + 10]
 
-    def _filter_by_specific_actor(self, movies):
+    def _filter_by_specific_actor(self, ordinals):
         """Filter movies by specific actor name"""
-        target_actor = self.preferences.filter_actor.lower()
+        target_actor = self.preferences.filter_actor.strip()
         if not target_actor:
-            return movies
+            return ordinals
 
-        filtered = []
-        for movie in movies:
-            actors = self.plex.get_movie_actors(movie)
-            # Check if any actor name contains the target actor string
-            if any(target_actor in actor.lower() for actor in actors):
-                filtered.append(movie)
+        # Movies of every actor whose name contains the target actor string
+        matches = ActorIndex.of(self.snapshot).ordinals(target_actor)
+        return [i for i in ordinals if i in matches]
 
-        return filtered
+    def _filter_by_similarity(self, ordinals, include_genres=None):
+        """Keep the top SIMILAR_TOP_K movies by weighted cast/crew overlap with the last watched movie
 
-    def group_movies_by_rating(self, movies):
+        ``include_genres`` defaults to the user's similarity_genres preference.
+        """
+        last_watched = self._get_last_watched_movie()
+        if last_watched is None:
+            return ordinals
+        if include_genres is None:
+            include_genres = bool(self.preferences and self.preferences.similarity_genres)
+
+        index = CreditIndex.of(self.snapshot)
+        return index.most_similar(
+            last_watched,
+            ordinals,
+            current_app.config.get('SIMILAR_TOP_K', 50),
+            include_genres=include_genres,
+            exclude_guid=last_watched.guid,
+            exclude_ordinal=last_watched.ordinal if last_watched.snapshot is self.snapshot else None
+        )
+
+    def group_movies_by_rating(self, ordinals):
         """Group movies by their rating (rounded down to integer)"""
         rating_groups = {}
+        ratings = self.snapshot.ratings
 
-        for movie in movies:
-            rating = self.plex.get_movie_rating(movie)
+        for ordinal in ordinals:
+            rating = ratings[ordinal]
             # Round down to integer (e.g., 4.5 -> 4)
             rating_group = int(rating) if rating else 0
-
-            if rating_group not in rating_groups:
-                rating_groups[rating_group] = []
-
-            rating_groups[rating_group].append(movie)
+            rating_groups.setdefault(rating_group, []).append(ordinal)
 
         return rating_groups
 
@@ -141,23 +237,25 @@ class MovieSelector:
         """Get a random movie from a specific rating group"""
         if not rating_group or len(rating_group) == 0:
             return None
-        return random.choice(rating_group)
+        return self.snapshot.movie(random.choice(rating_group), self.section_keys)
 
-    def recommend_movie(self):
+    def rank_movies(self):
         """
-        Main recommendation method that:
-        1. Gets all movies
+        Filter this server's movies and group them by rating:
+        1. Gets the library snapshot
         2. Applies filters
         3. Groups by rating
-        4. Returns random movie from highest rating group
+
+        Returns:
+            tuple: (rating_groups: dict or None, error_message: str or None)
         """
-        # Get all movies from Plex
-        all_movies = self.plex.get_all_movies()
-        if not all_movies:
+        # Get the shared library snapshot
+        snapshot = self.snapshot
+        if not snapshot:
             return None, "No movies found in library"
 
-        # Apply filters
-        filtered_movies = self.filter_movies(all_movies)
+        # Apply filters to the movies of the user's sections
+        filtered_movies = self.filter_movies(snapshot.candidates(self.section_keys))
         if not filtered_movies:
             return None, "No movies match the current filters"
 
@@ -166,6 +264,17 @@ class MovieSelector:
         if not rating_groups:
             return None, "No movies available"
 
+        return rating_groups, None
+
+    def recommend_movie(self):
+        """
+        Main recommendation method that ranks this server's movies and
+        returns a random movie from the highest rating group
+        """
+        rating_groups, error = self.rank_movies()
+        if error:
+            return None, error
+
         # Get highest rating group
         highest_rating = max(rating_groups.keys())
         highest_group = rating_groups[highest_rating]
@@ -181,13 +290,119 @@ class MovieSelector:
             return None
 
         return {
-            'rating_key': movie.ratingKey,
+            'rating_key': movie.rating_key,
+            'server': self.plex.server_name,
             'title': movie.title,
-            'year': self.plex.get_movie_year(movie),
-            'rating': self.plex.get_movie_rating(movie),
-            'summary': movie.summary if hasattr(movie, 'summary') else '',
-            'poster': movie.thumbUrl if hasattr(movie, 'thumbUrl') else '',
-            'actors': self.plex.get_movie_actors(movie)[:5],  # Top 5 actors
-            'directors': self.plex.get_movie_directors(movie),
-            'duration': movie.duration if hasattr(movie, 'duration') else 0,
+            'year': movie.year or None,
+            'rating': movie.rating,
+            'summary': movie.summary,
+            'poster': poster_url(self.plex.server_name, movie.rating_key, movie.thumb),
+            'actors': movie.actors[:5],  # Top 5 actors
+            'directors': movie.directors,
+            'duration': movie.duration,
         }
+
+
+def connect_servers(user, token, deadline=None):
+    """Connect to every configured server and warm its library in parallel
+
+    Each server's snapshot and the user's watched overlay are loaded on the
+    shared server executor. Servers that are offline or miss the deadline are
+    left out so one laggard can't stall the request.
+
+    Returns:
+        list: Connected PlexAPI instances, primary server first
+    """
+    app = current_app._get_current_object()
+    user_id = user.id
+
+    def warm(config):
+        with app.app_context():
+            plex = PlexAPI(token, config.name)
+            if not plex.server:
+                raise ConnectionError(f"could not connect to {config.url}")
+            warm_user = db.session.get(User, user_id)
+            snapshot = plex.get_library_snapshot(plex.get_user_section_keys(warm_user))
+            plex.get_watched_overlay(snapshot, warm_user)
+            return plex
+
+    return [plex for _, plex in run_on_servers(warm, server_pool.available(), deadline)]
+
+
+def find_last_watched(user, plexes):
+    """Return (selector, movie) for the most recently watched movie across servers"""
+    latest = None
+    for plex in plexes:
+        selector = MovieSelector(user, plex)
+        last_watched = selector.get_last_watched()
+        if last_watched and (latest is None or last_watched[0] > latest[0]):
+            latest = (last_watched[0], selector, last_watched[1])
+    if latest is None:
+        return None, None
+    return latest[1], latest[2]
+
+
+def share_exclusions(selectors):
+    """Apply watched and passed state across servers
+
+    A film present on several servers (same GUID) that was watched or passed
+    on one of them is left out on all of them.
+    """
+    watched, passed = set(), set()
+    for selector in selectors:
+        if selector.snapshot is None:
+            continue
+        watched |= selector.watched_guids()
+        passed |= selector.passed_guids()
+    for selector in selectors:
+        selector.shared_watched = watched
+        selector.shared_passed = passed
+
+
+def recommend_from_servers(user, plexes):
+    """Recommend one movie from the merged candidate pool of several servers
+
+    The highest rating group across all servers wins. Films present on more
+    than one server (same GUID) count once, taken from the earliest server.
+
+    Returns:
+        tuple: (movie, selector, error_message) - the selector is the one for
+        the movie's server, for building its info and playing it
+    """
+    if not plexes:
+        return None, None, "Could not reach any Plex server"
+
+    _, last_watched = find_last_watched(user, plexes)
+
+    selectors = [MovieSelector(user, plex, last_watched=last_watched) for plex in plexes]
+    if len(selectors) > 1:
+        share_exclusions(selectors)
+
+    ranked = []
+    errors = []
+    for selector in selectors:
+        rating_groups, error = selector.rank_movies()
+        if error:
+            errors.append(error)
+        else:
+            ranked.append((selector, rating_groups))
+
+    if not ranked:
+        return None, None, errors[0]
+
+    # Get highest rating group across servers
+    highest_rating = max(max(rating_groups) for _, rating_groups in ranked)
+    pool = []
+    seen_guids = set()
+    for selector, rating_groups in ranked:
+        guids = selector.snapshot.guids
+        for ordinal in rating_groups.get(highest_rating, []):
+            guid = guids[ordinal]
+            if guid and guid in seen_guids:
+                continue
+            seen_guids.add(guid)
+            pool.append((selector, ordinal))
+
+    # Get random movie from highest rating group
+    selector, ordinal = random.choice(pool)
+    return selector.snapshot.movie(ordinal, selector.section_keys), selector, None
@@ -0,0 +1,107 @@
+"""Passing on movies and undoing passes, one movie or a whole batch at a time.
+
+Bulk changes run as a handful of set-based statements (one lookup per chunk
+of keys, one UPDATE, one multi-row INSERT or one DELETE) and a single commit,
+so passing or clearing hundreds of movies costs one transaction.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+
+from app import db
+from app.models import PassedMovie
+from app.watch_history import lookup_chunks
+
+# How long a pass keeps a movie out of recommendations
+PASS_DURATION = timedelta(days=180)
+
+
+def passed_movies_query(user_id, search=None, status='all', now=None):
+    """A user's passes, optionally filtered by title and active/expired status"""
+    query = PassedMovie.query.filter(PassedMovie.user_id == user_id)
+    if search:
+        pattern = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(PassedMovie.movie_title.ilike(f'%{pattern}%', escape='\\'))
+    now = now or datetime.utcnow()
+    if status == 'active':
+        query = query.filter(PassedMovie.expires_at >= now)
+    elif status == 'expired':
+        query = query.filter(PassedMovie.expires_at < now)
+    return query
+
+
+def _server_filter(server_name):
+    if server_name is None:
+        return PassedMovie.server_name.is_(None)
+    return PassedMovie.server_name == server_name
+
+
+def pass_movies(user_id, server_name, movies):
+    """Pass on movies of one server in a single transaction
+
+    Movies already passed get their pass renewed; the others are inserted.
+
+    Args:
+        user_id: The user passing on the movies
+        server_name: Configured server name, None for the primary server
+        movies: dict of rating key -> movie title
+
+    Returns:
+        tuple: (added: int, renewed: int)
+    """
+    now = datetime.utcnow()
+    expires_at = now + PASS_DURATION
+    movies = {str(key): title for key, title in movies.items()}
+
+    existing = {}
+    for chunk in lookup_chunks(list(movies)):
+        existing.update(db.session.query(PassedMovie.plex_rating_key, PassedMovie.id).filter(
+            PassedMovie.user_id == user_id,
+            _server_filter(server_name),
+            PassedMovie.plex_rating_key.in_(chunk)
+        ))
+
+    for chunk in lookup_chunks(list(existing.values())):
+        db.session.execute(
+            update(PassedMovie).where(PassedMovie.id.in_(chunk)).values(passed_at=now, expires_at=expires_at)
+        )
+
+    new_rows = [{
+        'user_id': user_id,
+        'plex_rating_key': key,
+        'server_name': server_name,
+        'movie_title': title or 'Unknown',
+        'passed_at': now,
+        'expires_at': expires_at
+    } for key, title in movies.items() if key not in existing]
+    if new_rows:
+        db.session.execute(insert(PassedMovie), new_rows)
+
+    db.session.commit()
+    return len(new_rows), len(existing)
+
+
+def unpass_movies(user_id, ids=None, server_name=None, rating_keys=None, expired=False):
+    """Remove passes in a single transaction
+
+    Removes the passes with the given ids, the passes of the given rating
+    keys on one server, or every expired pass.
+
+    Returns:
+        int: Number of passes removed
+    """
+    base = PassedMovie.query.filter(PassedMovie.user_id == user_id)
+    deleted = 0
+
+    if expired:
+        deleted += base.filter(PassedMovie.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+    for chunk in lookup_chunks(list(ids or [])):
+        deleted += base.filter(PassedMovie.id.in_(chunk)).delete(synchronize_session=False)
+    for chunk in lookup_chunks([str(key) for key in rating_keys or []]):
+        deleted += base.filter(
+            _server_filter(server_name),
+            PassedMovie.plex_rating_key.in_(chunk)
+        ).delete(synchronize_session=False)
+
+    db.session.commit()
+    return deleted
@@ -0,0 +1,293 @@
+"""Playback warming for recommended movies.
+
+Resolving the movie object and finding the user's selected client can take
+several seconds (server.clients(), sessions, account devices and
+device.connect()). As soon as a recommendation is shown we do that work in
+the background and keep the result as a short-lived handle, so pressing Play
+usually only has to send the playMedia command.
+
+Pressing Play itself runs as a background job: /api/play answers right away
+with a job id, and the browser follows the job's progress by polling or over
+a server-sent event stream instead of holding a request open for the whole
+client discovery.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+import uuid
+
+from app.cache_registry import CacheEntry, cache_registry
+from app.plex_api import PlexAPI
+from app.rate_limit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# A resolved plexapi movie and client hold their parsed XML and a few objects
+WARM_ENTRY_SIZE = 64 * 1024
+
+
+class WarmPlayback:
+    """A resolved movie and client, ready for playMedia"""
+
+    def __init__(self, movie, client, client_identifier):
+        self.movie = movie
+        self.client = client
+        self.client_identifier = client_identifier
+        self.resolved_at = time.time()
+
+
+class PlaybackWarmer:
+    """Keeps at most one warm playback handle per user"""
+
+    def __init__(self, ttl=120, max_workers=4):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='playback-warm')
+        self._lock = threading.Lock()
+        self._pending = {}
+        cache_registry.register('playback', self._entries, self._evict)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PLAYBACK_WARM_TTL', self.ttl)
+
+    def _entries(self):
+        with self._lock:
+            return [CacheEntry(user_id, WARM_ENTRY_SIZE, started_at)
+                    for user_id, (_, started_at, _) in self._pending.items()]
+
+    def _evict(self, user_id):
+        with self._lock:
+            self._pending.pop(user_id, None)
+
+    def warm(self, user_id, token, server_name, rating_key, client_name, client_identifier):
+        """Start resolving the movie and the selected client in the background"""
+        if not client_name or not client_identifier:
+            return
+        key = (server_name, str(rating_key), client_identifier)
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is not None and previous[0] == key and not previous[2].done():
+                # The same movie and client are already being resolved
+                return
+            future = self._executor.submit(
+                self._run, token, server_name, rating_key, client_name, client_identifier)
+            # A newer recommendation replaces the previous handle
+            self._pending[user_id] = (key, time.time(), future)
+        if previous is not None:
+            previous[2].cancel()
+        cache_registry.enforce()
+
+    def take(self, user_id, server_name, rating_key, client_identifier):
+        """Return the warm handle for this movie and client, or None
+
+        Waits for a resolve that is still running: it is doing exactly the
+        work /api/play would otherwise start from scratch.
+        """
+        with self._lock:
+            entry = self._pending.pop(user_id, None)
+        if entry is None:
+            cache_registry.miss('playback')
+            return None
+
+        key, started_at, future = entry
+        if key != (server_name, str(rating_key), client_identifier) or time.time() - started_at > self.ttl:
+            cache_registry.miss('playback')
+            return None
+        cache_registry.hit('playback')
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning("Playback warm-up failed: %s", e)
+            return None
+
+    def _run(self, token, server_name, rating_key, client_name, client_identifier):
+        # Warm-ups share the Plex concurrency slots, and are skipped when all are taken
+        release = rate_limiter.try_acquire()
+        if release is None:
+            logger.debug("Skipping playback warm-up, the Plex server is busy")
+            return None
+        try:
+            return self._resolve(token, server_name, rating_key, client_name, client_identifier)
+        finally:
+            release()
+
+    def _resolve(self, token, server_name, rating_key, client_name, client_identifier):
+        plex = PlexAPI(token, server_name)
+        if not plex.server:
+            return None
+
+        movie = plex.get_movie_details(rating_key)
+        if not movie:
+            return None
+
+        logger.debug("Warming playback of '%s' on %s", movie.title, client_name)
+        for client, error in plex.iter_selected_client(client_name, client_identifier):
+            if error:
+                return WarmPlayback(movie, None, client_identifier)
+            return WarmPlayback(movie, client, client_identifier)
+        return WarmPlayback(movie, None, client_identifier)
+
+
+playback_warmer = PlaybackWarmer()
+
+
+class PlaybackJob:
+    """State of one play request running in the background"""
+
+    def __init__(self, user_id, server_name, rating_key):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.server_name = server_name
+        self.rating_key = str(rating_key)
+        self.status = 'queued'
+        self.method = None
+        self.attempts = 0
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed')
+
+    def update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated_at = time.time()
+            self.version += 1
+            self._changed.notify_all()
+
+    def progress(self, method):
+        """Record that a discovery method has started"""
+        self.update(status='running', method=method, attempts=self.attempts + 1)
+
+    def wait_for_change(self, version, timeout):
+        """Block until the job changes past ``version``
+
+        Returns (version, state), or None if nothing changed before the timeout.
+        """
+        with self._changed:
+            if not self._changed.wait_for(lambda: self.version != version, timeout):
+                return None
+            return self.version, self.to_dict()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'server': self.server_name,
+            'rating_key': self.rating_key,
+            'status': self.status,
+            'method': self.method,
+            'attempts': self.attempts,
+            'error': self.error,
+            'done': self.done,
+        }
+
+
+class PlaybackJobs:
+    """Runs play requests on a bounded pool of background workers"""
+
+    def __init__(self, max_workers=4, max_pending=32, ttl=600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def init_app(self, app):
+        self.max_workers = app.config.get('PLAYBACK_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('PLAYBACK_MAX_PENDING', self.max_pending)
+        self.ttl = app.config.get('PLAYBACK_JOB_TTL', self.ttl)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='playback-job')
+        return self._executor
+
+    def submit(self, user_id, token, server_name, rating_key, client_name, client_identifier, on_done=None):
+        """Queue a play request and return its job
+
+        Pressing Play again while the same movie is still being started
+        returns the running job. Returns None when too many jobs are pending.
+        ``on_done()`` is called once the new job has finished, or right away
+        when no new job was started.
+        """
+        with self._lock:
+            self._prune()
+            running = None
+            for job in self._jobs.values():
+                if (job.user_id == user_id and not job.done
+                        and (job.server_name, job.rating_key) == (server_name, str(rating_key))):
+                    running = job
+                    break
+            full = running is None and sum(1 for job in self._jobs.values() if not job.done) >= self.max_pending
+            if running is None and not full:
+                job = PlaybackJob(user_id, server_name, rating_key)
+                self._jobs[job.id] = job
+                executor = self._get_executor()
+        if running is not None or full:
+            if on_done is not None:
+                on_done()
+            return running
+
+        try:
+            executor.submit(self._run, job, token, client_name, client_identifier, on_done)
+        except BaseException:
+            if on_done is not None:
+                on_done()
+            raise
+        return job
+
+    def get(self, job_id, user_id):
+        """Look up a job, only for the user who started it"""
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job, token, client_name, client_identifier, on_done=None):
+        try:
+            success, error_message = self._play(job, token, client_name, client_identifier)
+        except Exception as e:
+            success, error_message = False, str(e)
+        finally:
+            if on_done is not None:
+                on_done()
+
+        if success:
+            job.update(status='succeeded')
+        else:
+            logger.warning("Playback job %s failed: %s", job.id, error_message)
+            job.update(status='failed', error=error_message or 'Failed to play movie')
+
+    def _play(self, job, token, client_name, client_identifier):
+        job.update(status='running')
+
+        # Use the movie and client resolved when the recommendation was shown
+        warm = playback_warmer.take(job.user_id, job.server_name, job.rating_key, client_identifier)
+        if warm and warm.client and client_name:
+            logger.debug("Using warm playback handle for '%s'", warm.movie.title)
+            job.progress('warm client')
+            if PlexAPI.send_play_media(warm.client, warm.movie, client_name):
+                return True, None
+
+        plex = PlexAPI(token, job.server_name)
+        return plex.play_movie(
+            job.rating_key,
+            selected_client_name=client_name,
+            selected_client_identifier=client_identifier,
+            movie=warm.movie if warm else None,
+            progress=job.progress
+        )
+
+
+playback_jobs = PlaybackJobs()
@@ -1,33 +1,92 @@
-from plexapi.myplex import MyPlexAccount
-from plexapi.server import PlexServer
-from plexapi.exceptions import BadRequest, Unauthorized
-import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import importlib
+import logging
+import time
+from app.library_cache import library_cache, token_key
+from app.logs import event
+from app.server_pool import server_pool, run_on_servers
+
+logger = logging.getLogger(__name__)
+
+
+# plexapi classes used here and the modules they live in. plexapi (and
+# requests with it) takes a while to import, so it is only imported the first
+# time a request talks to Plex rather than when the app starts.
+PLEXAPI_CLASSES = {
+    'MyPlexAccount': 'plexapi.myplex',
+    'PlexClient': 'plexapi.client',
+    'PlayQueue': 'plexapi.playqueue',
+    'BadRequest': 'plexapi.exceptions',
+    'Unauthorized': 'plexapi.exceptions',
+}
+_plexapi_loaded = {}
+
+
+def plexapi(name):
+    """A plexapi class by name, imported on first use"""
+    cls = _plexapi_loaded.get(name)
+    if cls is None:
+        cls = _plexapi_loaded[name] = getattr(importlib.import_module(PLEXAPI_CLASSES[name]), name)
+    return cls
+
+
+def _no_progress(method):
+    pass
+
+
+def _attempt(method, started, outcome, exc_info=False, **fields):
+    """Debug event for one try at finding or reaching a client"""
+    event(logger, logging.DEBUG, 'client attempt', exc_info=exc_info, method=method,
+          duration=time.monotonic() - started, outcome=outcome, **fields)
+
+
+# Client discovery asks the server and plex.tv at the same time
+_client_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix='plex-clients')
+
 
 class PlexAPI:
-    def __init__(self, token=None):
+    def __init__(self, token=None, server_name=None):
         self.token = token
         self.server = None
-        if token:
+        self.server_config = server_pool.get(server_name)
+        if token and self.server_config:
             self._connect_server()
 
     def _connect_server(self):
         """Connect to Plex server using token"""
         try:
-            server_url = os.environ.get('PLEX_SERVER_URL', 'http://localhost:32400')
-            self.server = PlexServer(server_url, self.token)
+            self.server = server_pool.connect(self.server_config, self.token)
             return True
         except Exception as e:
-            print(f"Error connecting to Plex server: {e}")
+            logger.warning("Error connecting to Plex server '%s': %s", self.server_config.name, e)
             return False
 
+    @property
+    def server_name(self):
+        return self.server_config.name if self.server_config else None
+
+    @classmethod
+    def connect_all(cls, token, deadline=None):
+        """Connect to every configured server in parallel
+
+        Servers that are offline or slower than the deadline are left out.
+        """
+        def connect(config):
+            plex = cls(token, config.name)
+            if not plex.server:
+                raise ConnectionError(f"could not connect to {config.url}")
+            return plex
+
+        return [plex for _, plex in run_on_servers(connect, server_pool.available(), deadline)]
+
     @staticmethod
     def authenticate(username, password):
         """Authenticate user with Plex and return token"""
         try:
-            account = MyPlexAccount(username, password)
+            account = plexapi('MyPlexAccount')(username, password)
             return account.authenticationToken
-        except (BadRequest, Unauthorized) as e:
-            print(f"Authentication error: {e}")
+        except (plexapi('BadRequest'), plexapi('Unauthorized')) as e:
+            logger.info("Authentication error: %s", e)
             return None
 
     def get_movie_library(self, library_name='Movies'):
@@ -37,8 +96,48 @@ class PlexAPI:
         try:
             return self.server.library.section(library_name)
         except Exception as e:
-            print(f"Error getting library: {e}")
+            logger.warning("Error getting library: %s", e)
+            return None
+
+    def get_movie_sections(self):
+        """Get every movie section on the server"""
+        if not self.server:
+            return []
+        try:
+            return [section for section in self.server.library.sections() if section.type == 'movie']
+        except Exception as e:
+            logger.warning("Error listing library sections: %s", e)
+            return []
+
+    def get_movie_section(self, section_key):
+        """Get a movie section by its key"""
+        return self.server.library.sectionByID(int(section_key) if str(section_key).isdigit() else section_key)
+
+    def get_library_sections(self):
+        """Get [(key, title)] for the movie sections on the server"""
+        if not self.server:
+            return []
+        try:
+            return library_cache.get_sections(self)
+        except Exception as e:
+            logger.warning("Error listing library sections: %s", e)
+            return []
+
+    def get_default_section_keys(self):
+        """Sections used when a user hasn't chosen any"""
+        if not self.server:
+            return []
+        try:
+            return library_cache.default_section_keys(self)
+        except Exception as e:
+            logger.warning("Error listing library sections: %s", e)
+            return []
+
+    def get_user_section_keys(self, user):
+        """Sections of this server a user has chosen, or None for the default sections"""
+        if user is None or not user.preferences:
             return None
+        return user.preferences.section_keys_for(self.server_name, self.server_config.primary)
 
     def get_all_movies(self, library_name='Movies'):
         """Get all movies from the specified library"""
@@ -54,41 +153,234 @@ class PlexAPI:
         try:
             return self.server.fetchItem(rating_key)
         except Exception as e:
-            print(f"Error fetching movie: {e}")
+            logger.warning("Error fetching movie: %s", e)
             return None
 
-    def get_user_watched_movies(self, username):
-        """Get list of movies watched by user"""
+    def get_library_snapshot(self, section_keys=None):
+        """Get the shared library snapshot for this server
+
+        Args:
+            section_keys: Movie sections that must be loaded (default: 'Movies')
+        """
         if not self.server:
-            return []
+            return None
         try:
-            movies = self.get_all_movies()
-            watched = []
-            for movie in movies:
-                if movie.isWatched:
-                    watched.append(movie)
-            return watched
+            return library_cache.get_snapshot(self, section_keys)
         except Exception as e:
-            print(f"Error getting watched movies: {e}")
+            logger.warning("Error loading library snapshot: %s", e)
+            return None
+
+    def get_watched_overlay(self, snapshot, user=None):
+        """Get the watched overlay for a user against a snapshot
+
+        With a user, watched state comes from that user's own watch history on
+        the server, so managed and shared accounts each get their own overlay.
+        Without one, it falls back to the token's own view of the library.
+        """
+        if not self.server or snapshot is None:
+            return None
+        try:
+            if user is not None:
+                from app.watch_history import load_watched_states
+                return library_cache.get_overlay(
+                    snapshot, f'user:{user.id}', lambda: load_watched_states(user, self))
+            return library_cache.get_overlay(snapshot, token_key(self.token), self.get_watched_states)
+        except Exception as e:
+            logger.warning("Error loading watched state: %s", e)
+            return None
+
+    def get_watched_states(self):
+        """Yield (rating_key, last_viewed_timestamp) for watched movies
+
+        Only watched items are requested from the server, so this is much
+        cheaper than listing the whole library.
+        """
+        for library in self.get_movie_sections():
+            for movie in library.search(filters={'viewCount>>': 0}):
+                last_viewed_at = getattr(movie, 'lastViewedAt', None)
+                yield str(movie.ratingKey), (last_viewed_at.timestamp() if last_viewed_at else None)
+
+    def get_account_id(self, username):
+        """Resolve a Plex username to its account ID on this server
+
+        Managed home users and shared users each have their own account on
+        the server, which is what watch history entries are recorded against.
+        """
+        if not self.server or not username:
+            return None
+        try:
+            wanted = username.casefold()
+            for account in self.server.systemAccounts():
+                if account.name and account.name.casefold() == wanted:
+                    return account.id
+
+            # The username may be an email address; ask plex.tv who owns the token
+            account = plexapi('MyPlexAccount')(token=self.token)
+            names = {n.casefold() for n in (account.username, account.title, account.email) if n}
+            if wanted in names:
+                for system_account in self.server.systemAccounts():
+                    if system_account.name and system_account.name.casefold() in names:
+                        return system_account.id
+        except Exception as e:
+            logger.warning("Error resolving account ID for %s: %s", username, e)
+        return None
+
+    def get_watch_history(self, account_id, since=None):
+        """Yield (rating_key, viewed_at) for movies in an account's watch history
+
+        The server pages the history container for us; passing ``since`` (an
+        aware UTC datetime) limits the fetch to entries newer than the last sync.
+        """
+        if not self.server:
+            return
+        for item in self.server.history(mindate=since, accountID=account_id):
+            if getattr(item, 'type', None) != 'movie':
+                continue
+            viewed_at = getattr(item, 'viewedAt', None)
+            if item.ratingKey and viewed_at:
+                yield str(item.ratingKey), viewed_at
+
+    def get_user_watched_movies(self, user):
+        """Get list of movies watched by user"""
+        snapshot = self.get_library_snapshot(self.get_user_section_keys(user))
+        overlay = self.get_watched_overlay(snapshot, user)
+        if overlay is None:
             return []
+        return [snapshot.movie(i) for i in range(len(snapshot)) if overlay.is_watched(i)]
 
-    def get_last_watched_movie(self, username):
+    def get_last_watched_movie(self, user):
         """Get the last movie watched by the user"""
-        if not self.server:
+        snapshot = self.get_library_snapshot(self.get_user_section_keys(user))
+        overlay = self.get_watched_overlay(snapshot, user)
+        if overlay is None:
+            return None
+        return snapshot.movie(overlay.last_watched_ordinal())
+
+    def get_movie_thumb(self, rating_key, snapshot=None):
+        """Thumb path of a movie, from the library snapshot when it's there"""
+        if snapshot is not None:
+            ordinal = snapshot.ordinal_for(rating_key)
+            if ordinal is not None:
+                return snapshot.thumbs[ordinal]
+        movie = self.get_movie_details(rating_key)
+        return movie.thumb if movie else None
+
+    def fetch_poster(self, thumb, width, height):
+        """Download a poster resized by the Plex photo transcoder, as JPEG bytes"""
+        if not self.server or not thumb:
             return None
         try:
-            movies = self.get_all_movies()
-            watched_movies = [m for m in movies if m.isWatched and m.lastViewedAt]
-            if not watched_movies:
-                return None
-            # Sort by last viewed date
-            watched_movies.sort(key=lambda x: x.lastViewedAt, reverse=True)
-            return watched_movies[0]
+            url = self.server.transcodeImage(thumb, height, width, imageFormat='jpeg')
+            response = server_pool.session(self.server_config).get(url, timeout=server_pool.timeout)
+            response.raise_for_status()
+            return response.content
         except Exception as e:
-            print(f"Error getting last watched movie: {e}")
+            logger.warning("Error fetching poster %s: %s", thumb, e)
             return None
 
-    def play_movie(self, rating_key, player_name=None, selected_client_name=None, selected_client_identifier=None):
+    def iter_selected_client(self, selected_client_name, selected_client_identifier, progress=None):
+        """Find the user's selected client, trying the cheapest methods first
+
+        Yields (client, None) for every client object found for the selected
+        device, in method order:
+        1. server.clients() - fastest if the client is advertising
+        2. Active sessions - if the device is currently playing something
+        3. device.connect() from the account's registered devices
+
+        Yields (None, error_message) and stops when the selection itself is
+        invalid (not on the account, or a server rather than a player).
+
+        ``progress(method)`` is called as each method starts.
+        """
+        progress = progress or _no_progress
+        device = selected_client_name
+
+        # Method 1: Try server.clients() first (fastest if client is advertising)
+        progress('server.clients()')
+        started = time.monotonic()
+        try:
+            client = next((c for c in self.server.clients()
+                           if getattr(c, 'machineIdentifier', None) == selected_client_identifier), None)
+            _attempt('server.clients()', started, 'found' if client else 'not found', device=device)
+            if client:
+                yield client, None
+        except Exception as e:
+            _attempt('server.clients()', started, 'failed', device=device, error=e)
+
+        # Method 2: Try active sessions (if device is currently playing something)
+        progress('active sessions')
+        started = time.monotonic()
+        try:
+            sessions = self.server.sessions()
+            matched = False
+            for session in sessions:
+                for player in session.players or ():
+                    if getattr(player, 'machineIdentifier', None) != selected_client_identifier:
+                        continue
+                    matched = True
+                    # Try to get client by title
+                    try:
+                        client = self.server.client(getattr(player, 'title', None))
+                    except Exception as e:
+                        _attempt('active sessions', started, 'failed', device=device, sessions=len(sessions), error=e)
+                        continue
+                    _attempt('active sessions', started, 'found' if client else 'no client object',
+                             device=device, sessions=len(sessions))
+                    if client:
+                        yield client, None
+            if not matched:
+                _attempt('active sessions', started, 'not found', device=device, sessions=len(sessions))
+        except Exception as e:
+            _attempt('active sessions', started, 'failed', exc_info=True, device=device, error=e)
+
+        # Method 3: Try device.connect() from account devices
+        progress('account devices')
+        started = time.monotonic()
+        try:
+            account = plexapi('MyPlexAccount')(token=self.token)
+            devices = account.devices()
+
+            # Find the selected device
+            selected_device = next((d for d in devices if d.clientIdentifier == selected_client_identifier), None)
+            if not selected_device:
+                _attempt('account devices', started, 'not on account', device=device)
+                yield None, f"Selected client '{selected_client_name}' not found in your account. Please refresh and select again."
+                return
+
+            # Check if it's a server (shouldn't be, but verify)
+            product = getattr(selected_device, 'product', '').lower()
+            if 'server' in product or 'media server' in product:
+                _attempt('account devices', started, 'is a server', device=device, product=selected_device.product)
+                yield None, f"'{selected_client_name}' is a server, not a client. Please select a playback device."
+                return
+
+            # Try to connect to the selected device
+            device_connection = selected_device.connect()
+            if device_connection and isinstance(device_connection, plexapi('PlexClient')):
+                _attempt('account devices', started, 'connected', device=device, product=selected_device.product)
+                yield device_connection, None
+            else:
+                _attempt('account devices', started, 'not a client' if device_connection else 'no connection',
+                         device=device, product=selected_device.product)
+
+        except Exception as e:
+            _attempt('account devices', started, 'failed', exc_info=True, device=device, error=e)
+
+    @staticmethod
+    def send_play_media(client, movie, client_name):
+        """Send playMedia to a client, returning True if the command went through"""
+        started = time.monotonic()
+        try:
+            client.playMedia(movie)
+        except Exception as e:
+            _attempt('playMedia', started, 'failed', device=client_name, error=e)
+            return False
+        _attempt('playMedia', started, 'sent', device=client_name)
+        logger.info("Playing '%s' on %s", movie.title, client_name)
+        return True
+
+    def play_movie(self, rating_key, player_name=None, selected_client_name=None, selected_client_identifier=None, movie=None,
+                   progress=None):
         """Play a movie on the specified player or default player
 
         This method tries multiple approaches:
@@ -97,132 +389,42 @@ class PlexAPI:
         3. Active sessions - Clients currently playing something
         4. Account devices - Try to connect to registered devices
 
+        Each attempt is logged as a debug event with its method, device,
+        duration and outcome.
+
         Args:
             rating_key: The Plex rating key for the movie
             player_name: (deprecated) Name of the player to use
             selected_client_name: Name of the pre-selected client from user preferences
             selected_client_identifier: Machine identifier of the pre-selected client
+            movie: Already fetched movie object, to skip looking it up again
+            progress: Optional callback, called with the name of each discovery method as it starts
 
         Returns:
             tuple: (success: bool, error_message: str or None)
         """
         if not self.server:
             return False, "Not connected to Plex server"
+        progress = progress or _no_progress
         try:
-            movie = self.get_movie_details(rating_key)
+            if movie is None:
+                movie = self.get_movie_details(rating_key)
             if not movie:
                 return False, "Movie not found"
 
-            print(f"\n=== Attempting to play movie: {movie.title} ===")
-
             # If user has selected a specific client, try multiple methods to connect
             if selected_client_name and selected_client_identifier:
-                print(f"User has pre-selected client: {selected_client_name}")
-                print(f"Attempting to connect to selected client using multiple methods...")
-
-                # Method 1: Try server.clients() first (fastest if client is advertising)
-                print(f"  Method 1: Checking if '{selected_client_name}' is in server.clients()...")
-                try:
-                    clients = self.server.clients()
-                    for client in clients:
-                        if hasattr(client, 'machineIdentifier') and client.machineIdentifier == selected_client_identifier:
-                            print(f"  ✓ Found '{selected_client_name}' in active clients!")
-                            print(f"  Sending playMedia command...")
-                            client.playMedia(movie)
-                            print(f"  SUCCESS! Movie playback initiated on {selected_client_name}")
-                            return True, None
-                    print(f"  '{selected_client_name}' not found in active clients")
-                except Exception as e:
-                    print(f"  Method 1 failed: {e}")
-
-                # Method 2: Try active sessions (if device is currently playing something)
-                print(f"  Method 2: Checking if '{selected_client_name}' is in active sessions...")
-                try:
-                    sessions = self.server.sessions()
-                    print(f"    Found {len(sessions)} active session(s)")
-
-                    for idx, session in enumerate(sessions):
-                        print(f"    Session {idx + 1}: {session.title if hasattr(session, 'title') else 'Unknown'}")
-                        if session.players:
-                            for player in session.players:
-                                player_id = getattr(player, 'machineIdentifier', 'no-id')
-                                player_title = getattr(player, 'title', 'no-title')
-                                print(f"      Player: {player_title} (ID: {player_id})")
-                                print(f"      Looking for ID: {selected_client_identifier}")
-
-                                if player_id == selected_client_identifier:
-                                    print(f"  ✓ MATCH! Found '{selected_client_name}' in active session!")
-                                    # Try to get client by title
-                                    try:
-                                        client = self.server.client(player_title)
-                                        if client:
-                                            print(f"  Got client object, sending playMedia command...")
-                                            client.playMedia(movie)
-                                            print(f"  SUCCESS! Movie playback initiated on {selected_client_name}")
-                                            return True, None
-                                        else:
-                                            print(f"  server.client() returned None")
-                                    except Exception as client_err:
-                                        print(f"  Could not get client object from session: {client_err}")
-                        else:
-                            print(f"      No players in this session")
-
-                    print(f"  '{selected_client_name}' (ID: {selected_client_identifier}) not found in active sessions")
-                except Exception as e:
-                    print(f"  Method 2 failed: {e}")
-                    import traceback
-                    traceback.print_exc()
-
-                # Method 3: Try device.connect() from account devices
-                print(f"  Method 3: Trying device.connect() for '{selected_client_name}'...")
-                try:
-                    from plexapi.myplex import MyPlexAccount
-                    account = MyPlexAccount(token=self.token)
-                    devices = account.devices()
-
-                    # Find the selected device
-                    selected_device = None
-                    for device in devices:
-                        if device.clientIdentifier == selected_client_identifier:
-                            selected_device = device
-                            break
-
-                    if not selected_device:
-                        error_msg = f"Selected client '{selected_client_name}' not found in your account. Please refresh and select again."
-                        print(f"  ERROR: {error_msg}")
-                        return False, error_msg
-
-                    # Check if it's a server (shouldn't be, but verify)
-                    product = getattr(selected_device, 'product', '').lower()
-                    if 'server' in product or 'media server' in product:
-                        error_msg = f"'{selected_client_name}' is a server, not a client. Please select a playback device."
-                        print(f"  ERROR: {error_msg}")
+                candidates = self.iter_selected_client(selected_client_name, selected_client_identifier, progress)
+                for client, error_msg in candidates:
+                    if error_msg:
+                        logger.warning("Could not play '%s': %s", movie.title, error_msg)
                         return False, error_msg
-
-                    # Try to connect to the selected device
-                    print(f"  Attempting device.connect() for {selected_device.name} ({selected_device.product})...")
-                    device_connection = selected_device.connect()
-
-                    if device_connection:
-                        from plexapi.client import PlexClient
-                        if isinstance(device_connection, PlexClient):
-                            print(f"  ✓ Connected to {selected_device.name}")
-                            print(f"  Sending playMedia command...")
-                            device_connection.playMedia(movie)
-                            print(f"  SUCCESS! Movie playback initiated on {selected_device.name}")
-                            return True, None
-                        else:
-                            print(f"  Connected but object is not a PlexClient: {type(device_connection)}")
-                    else:
-                        print(f"  device.connect() returned None")
-
-                except Exception as e:
-                    print(f"  Method 3 failed: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    if self.send_play_media(client, movie, selected_client_name):
+                        return True, None
 
                 # All methods failed
-                error_msg = f"""Could not connect to '{selected_client_name}'.
+                logger.warning("Could not play '%s': no way to reach %s", movie.title, selected_client_name)
+                return False, f"""Could not connect to '{selected_client_name}'.
 
 Make sure:
 1. Plex is OPEN and RUNNING on the device
@@ -230,170 +432,138 @@ Make sure:
 3. The device is on the same network as the Plex server
 
 Tip: Try playing something on '{selected_client_name}' first, then use this app."""
-                print(f"\nERROR: {error_msg}")
-                return False, error_msg
 
             # No selected client - try all methods (original behavior)
-            print("No pre-selected client. Trying all available methods...")
 
             # Try Method 1: Get clients via server.clients()
-            print("Method 1: Checking server.clients()...")
+            progress('server.clients()')
+            started = time.monotonic()
             clients = self.server.clients()
-            print(f"  Found {len(clients)} client(s) with remote control enabled")
-
             if clients:
                 client = clients[0]
                 if player_name:
                     client = next((c for c in clients if c.title == player_name), clients[0])
-                print(f"  Playing on client: {client.title}")
                 client.playMedia(movie)
+                _attempt('server.clients()', started, 'sent', device=client.title, clients=len(clients))
+                logger.info("Playing '%s' on %s", movie.title, client.title)
                 return True, None
+            _attempt('server.clients()', started, 'not found')
 
             # Try Method 2: Get clients from active sessions
-            print("Method 2: Checking active sessions for playback clients...")
+            progress('active sessions')
+            started = time.monotonic()
             try:
                 sessions = self.server.sessions()
-                print(f"  Found {len(sessions)} active session(s)")
-
-                if sessions:
-                    # Use the player from the first active session
-                    session = sessions[0]
-                    if session.players:
-                        player = session.players[0]
-                        print(f"  Found active player: {player.title}")
-                        print(f"  Player machine identifier: {player.machineIdentifier}")
-
-                        # Check if this is a web player - skip it as they can't be remotely controlled
-                        web_players = ['chrome', 'firefox', 'safari', 'edge', 'opera', 'plex web']
-                        is_web_player = any(wp in player.title.lower() for wp in web_players)
-
-                        if is_web_player:
-                            print(f"  ⚠️  Web players (browsers) cannot be remotely controlled")
-                            print(f"  Please use a native Plex app (Android, iOS, TV, Windows app)")
-                            print(f"  Skipping to Method 3 to try other devices...")
-                        else:
-                            # Try multiple methods to control the player
-                            try:
-                                # Method 2a: Try to get client by title from server
-                                print(f"  Method 2a: Trying server.client('{player.title}')...")
-                                try:
-                                    client = self.server.client(player.title)
-                                    if client:
-                                        print(f"  SUCCESS! Found client: {client.title}")
-                                        print(f"  Sending playMedia command to client...")
-                                        client.playMedia(movie)
-                                        return True, None
-                                except Exception as e:
-                                    print(f"  Method 2a failed: {e}")
-
-                                # Method 2b: Create a playQueue for native apps
-                                print(f"  Method 2b: Creating playQueue for native app playback...")
-                                try:
-                                    from plexapi.playqueue import PlayQueue
-                                    playqueue = PlayQueue.create(self.server, movie)
-                                    print(f"  PlayQueue created with ID: {playqueue.playQueueID}")
-
-                                    params = {
-                                        'type': 'video',
-                                        'providerIdentifier': 'com.plexapp.plugins.library',
-                                        'commandID': '1',
-                                        'machineIdentifier': player.machineIdentifier,
-                                        'containerKey': f'/playQueues/{playqueue.playQueueID}',
-                                        'key': movie.key,
-                                        'offset': '0'
-                                    }
-
-                                    # Use the player protocol if available
-                                    if hasattr(player, 'protocol'):
-                                        params['protocol'] = player.protocol
-                                    if hasattr(player, 'address'):
-                                        params['address'] = player.address
-                                    if hasattr(player, 'port'):
-                                        params['port'] = player.port
-
-                                    print(f"  Sending playback command via server (POST)...")
-                                    play_url = '/player/playback/playMedia'
-                                    result = self.server.query(play_url, method=self.server._session.post, params=params)
-                                    print(f"  Playback command sent successfully!")
-                                    return True, None
-
-                                except Exception as e:
-                                    print(f"  Method 2b failed: {e}")
-                                    import traceback
-                                    traceback.print_exc()
-
-                                # Method 2c: Direct playMedia on player object
-                                print(f"  Method 2c: Trying direct player.playMedia()...")
-                                if hasattr(player, 'playMedia'):
-                                    player.playMedia(movie)
-                                    print(f"  Direct playMedia sent to player")
-                                    return True, None
-                                else:
-                                    print(f"  Player object doesn't have playMedia method")
-
-                            except Exception as player_error:
-                                print(f"  All Method 2 attempts failed: {player_error}")
-                                import traceback
-                                traceback.print_exc()
-                    else:
-                        print(f"  Session found but no player available")
+                # Use the player from the first active session
+                session = sessions[0] if sessions else None
+                player = session.players[0] if session is not None and session.players else None
+                if player is None:
+                    _attempt('active sessions', started, 'not found', sessions=len(sessions))
+                elif self._is_web_player(player):
+                    # Browsers can't be remotely controlled; go on to the account's devices
+                    _attempt('active sessions', started, 'web player', device=player.title)
+                else:
+                    # Try multiple methods to control the player
+                    try:
+                        # Method 2a: Try to get client by title from server
+                        started = time.monotonic()
+                        try:
+                            client = self.server.client(player.title)
+                            if client:
+                                client.playMedia(movie)
+                                _attempt('session client', started, 'sent', device=player.title)
+                                logger.info("Playing '%s' on %s", movie.title, player.title)
+                                return True, None
+                            _attempt('session client', started, 'not found', device=player.title)
+                        except Exception as e:
+                            _attempt('session client', started, 'failed', device=player.title, error=e)
+
+                        # Method 2b: Create a playQueue for native apps
+                        started = time.monotonic()
+                        try:
+                            playqueue = plexapi('PlayQueue').create(self.server, movie)
+
+                            params = {
+                                'type': 'video',
+                                'providerIdentifier': 'com.plexapp.plugins.library',
+                                'commandID': '1',
+                                'machineIdentifier': player.machineIdentifier,
+                                'containerKey': f'/playQueues/{playqueue.playQueueID}',
+                                'key': movie.key,
+                                'offset': '0'
+                            }
+
+                            # Use the player protocol if available
+                            if hasattr(player, 'protocol'):
+                                params['protocol'] = player.protocol
+                            if hasattr(player, 'address'):
+                                params['address'] = player.address
+                            if hasattr(player, 'port'):
+                                params['port'] = player.port
+
+                            play_url = '/player/playback/playMedia'
+                            self.server.query(play_url, method=self.server._session.post, params=params)
+                            _attempt('play queue', started, 'sent', device=player.title,
+                                     play_queue=playqueue.playQueueID)
+                            logger.info("Playing '%s' on %s", movie.title, player.title)
+                            return True, None
+
+                        except Exception as e:
+                            _attempt('play queue', started, 'failed', exc_info=True, device=player.title, error=e)
+
+                        # Method 2c: Direct playMedia on player object
+                        started = time.monotonic()
+                        if hasattr(player, 'playMedia'):
+                            player.playMedia(movie)
+                            _attempt('player.playMedia()', started, 'sent', device=player.title)
+                            logger.info("Playing '%s' on %s", movie.title, player.title)
+                            return True, None
+                        _attempt('player.playMedia()', started, 'unsupported', device=player.title)
+
+                    except Exception as e:
+                        _attempt('player.playMedia()', started, 'failed', exc_info=True, device=player.title, error=e)
             except Exception as e:
-                print(f"  Could not use session client: {e}")
-                import traceback
-                traceback.print_exc()
+                _attempt('active sessions', started, 'failed', exc_info=True, error=e)
 
             # Try Method 3: Get devices from account and try to connect
-            print("Method 3: Trying to connect to account devices...")
+            progress('account devices')
+            started = time.monotonic()
             try:
-                from plexapi.myplex import MyPlexAccount
-                account = MyPlexAccount(token=self.token)
+                account = plexapi('MyPlexAccount')(token=self.token)
                 devices = account.devices()
-                print(f"  Found {len(devices)} device(s) on account")
 
-                # Filter out servers - we only want client devices
+                # Filter out servers - we only want client devices with connections
                 client_devices = []
                 for d in devices:
                     product = getattr(d, 'product', '').lower()
-                    # Skip servers
                     if 'server' in product or 'media server' in product:
-                        print(f"  Skipping server device: {d.name} ({d.product})")
                         continue
-                    # Only include devices with connections
                     if len(d.connections) > 0:
                         client_devices.append(d)
-
-                print(f"  Found {len(client_devices)} client device(s) with active connections")
+                _attempt('account devices', started, 'listed', devices=len(devices), clients=len(client_devices))
 
                 for device in client_devices:
+                    started = time.monotonic()
                     try:
-                        print(f"  Attempting to connect to: {device.name} ({device.product})")
-                        # Try to connect
                         device_connection = device.connect()
-
-                        if device_connection:
-                            # Check if this is a PlexClient (not a server)
-                            from plexapi.client import PlexClient
-                            if isinstance(device_connection, PlexClient):
-                                print(f"  ✓ Connected to client: {device.name}")
-                                print(f"  Sending playMedia command...")
-                                device_connection.playMedia(movie)
-                                print(f"  SUCCESS! Movie playback initiated on {device.name}")
-                                return True, None
-                            else:
-                                print(f"  Connected object is not a PlexClient (type: {type(device_connection).__name__})")
+                        # Check if this is a PlexClient (not a server)
+                        if device_connection and isinstance(device_connection, plexapi('PlexClient')):
+                            device_connection.playMedia(movie)
+                            _attempt('device.connect()', started, 'sent', device=device.name, product=device.product)
+                            logger.info("Playing '%s' on %s", movie.title, device.name)
+                            return True, None
+                        _attempt('device.connect()', started, 'not a client' if device_connection else 'no connection',
+                                 device=device.name, product=device.product)
                     except Exception as e:
-                        print(f"  Could not use {device.name}: {e}")
-                        continue
-
-                print(f"  No client devices were able to accept playback commands")
+                        _attempt('device.connect()', started, 'failed', device=device.name, product=device.product,
+                                 error=e)
 
             except Exception as e:
-                print(f"  Could not use account devices: {e}")
-                import traceback
-                traceback.print_exc()
+                _attempt('account devices', started, 'failed', exc_info=True, error=e)
 
             # No methods worked
-            error_msg = """No playable clients found. To enable playback:
+            logger.warning("Could not play '%s': no playable clients found", movie.title)
+            return False, """No playable clients found. To enable playback:
 
 1. Open Plex on a device
 2. In Plex Settings → enable "Advertise as player" and "Enable remote control"
@@ -401,22 +571,22 @@ Tip: Try playing something on '{selected_client_name}' first, then use this app.
 
 Devices found but not playable: Check Plex client settings."""
 
-            print(f"\n{error_msg}")
-            return False, error_msg
-
         except Exception as e:
-            error_msg = str(e)
-            print(f"Error playing movie: {error_msg}")
-            import traceback
-            traceback.print_exc()
-            return False, f"Error playing movie: {error_msg}"
+            logger.exception("Error playing movie %s", rating_key)
+            return False, f"Error playing movie: {e}"
+
+    @staticmethod
+    def _is_web_player(player):
+        """Browsers show up as players but can't be remotely controlled"""
+        web_players = ['chrome', 'firefox', 'safari', 'edge', 'opera', 'plex web']
+        return any(wp in player.title.lower() for wp in web_players)
 
     def get_movie_actors(self, movie):
         """Get list of actor names from a movie"""
         try:
             return [role.tag for role in movie.roles] if movie.roles else []
         except Exception as e:
-            print(f"Error getting actors: {e}")
+            logger.warning("Error getting actors: %s", e)
             return []
 
     def get_movie_directors(self, movie):
@@ -424,7 +594,7 @@ Devices found but not playable: Check Plex client settings."""
         try:
             return [director.tag for director in movie.directors] if movie.directors else []
         except Exception as e:
-            print(f"Error getting directors: {e}")
+            logger.warning("Error getting directors: %s", e)
             return []
 
     def get_movie_year(self, movie):
@@ -432,7 +602,7 @@ Devices found but not playable: Check Plex client settings."""
         try:
             return movie.year if hasattr(movie, 'year') else None
         except Exception as e:
-            print(f"Error getting year: {e}")
+            logger.warning("Error getting year: %s", e)
             return None
 
     def get_movie_rating(self, movie):
@@ -444,9 +614,72 @@ Devices found but not playable: Check Plex client settings."""
                 rating = movie.rating
             return rating if rating else 0
         except Exception as e:
-            print(f"Error getting rating: {e}")
+            logger.warning("Error getting rating: %s", e)
             return 0
 
+    def _clients_from_server(self):
+        """Clients connected to the server for remote control"""
+        clients = self.server.clients()
+        client_list = []
+        for client in clients:
+            client_list.append({
+                'title': client.title,
+                'product': client.product,
+                'platform': getattr(client, 'platform', 'Unknown'),
+                'platformVersion': getattr(client, 'platformVersion', 'Unknown'),
+                'device': getattr(client, 'device', 'Unknown'),
+                'machineIdentifier': getattr(client, 'machineIdentifier', 'Unknown'),
+                'source': 'server.clients()'
+            })
+        return client_list
+
+    def _clients_from_account(self):
+        """Devices registered on the MyPlex account"""
+        account = plexapi('MyPlexAccount')(token=self.token)
+        devices = account.devices()
+        client_list = []
+        for device in devices:
+            client_list.append({
+                'title': device.name,
+                'product': device.product,
+                'platform': getattr(device, 'platform', 'Unknown'),
+                'platformVersion': getattr(device, 'platformVersion', 'Unknown'),
+                'device': getattr(device, 'device', 'Unknown'),
+                'machineIdentifier': device.clientIdentifier,
+                'source': 'account.devices()'
+            })
+        return client_list
+
+    def _clients_from_sessions(self):
+        """Players of the server's active sessions (currently playing)"""
+        sessions = self.server.sessions()
+        client_list = []
+        for session in sessions:
+            player = session.players[0] if session.players else None
+            if player:
+                client_list.append({
+                    'title': player.title,
+                    'product': getattr(player, 'product', 'Unknown'),
+                    'platform': getattr(player, 'platform', 'Unknown'),
+                    'platformVersion': getattr(player, 'platformVersion', 'Unknown'),
+                    'device': getattr(player, 'device', 'Unknown'),
+                    'machineIdentifier': getattr(player, 'machineIdentifier', 'Unknown'),
+                    'source': 'sessions()'
+                })
+        return client_list
+
+    @staticmethod
+    def _client_source(method, source):
+        """Run one client source, logging a debug event with its outcome"""
+        started = time.monotonic()
+        try:
+            client_list = source()
+        except Exception as e:
+            _attempt(method, started, 'failed', error=e)
+            raise
+        _attempt(method, started, 'listed', clients=len(client_list))
+        return client_list
+
     def get_available_clients(self):
         """Get list of available Plex clients for playback
 
@@ -459,86 +692,74 @@ Devices found but not playable: Check Plex client settings."""
             list: List of dictionaries with client information
         """
         if not self.server:
-            print("ERROR: No server connection")
+            logger.warning("Can't list clients: not connected to a Plex server")
             return []
 
         client_list = []
 
         try:
-            print("\n=== Checking for Plex Clients ===")
-
             # Method 1: Try server.clients() - Gets currently connected clients for remote control
-            print("Method 1: Checking server.clients()...")
             try:
-                clients = self.server.clients()
-                print(f"  Found {len(clients)} client(s) via server.clients()")
-                for client in clients:
-                    print(f"    - {client.title} ({client.product})")
-                    client_info = {
-                        'title': client.title,
-                        'product': client.product,
-                        'platform': getattr(client, 'platform', 'Unknown'),
-                        'platformVersion': getattr(client, 'platformVersion', 'Unknown'),
-                        'device': getattr(client, 'device', 'Unknown'),
-                        'machineIdentifier': getattr(client, 'machineIdentifier', 'Unknown'),
-                        'source': 'server.clients()'
-                    }
-                    client_list.append(client_info)
-            except Exception as e:
-                print(f"  Error with server.clients(): {e}")
+                client_list.extend(self._client_source('server.clients()', self._clients_from_server))
+            except Exception:
+                pass
 
             # Method 2: Try MyPlex account devices
-            print("Method 2: Checking MyPlex account devices...")
             try:
-                from plexapi.myplex import MyPlexAccount
-                account = MyPlexAccount(token=self.token)
-                devices = account.devices()
-                print(f"  Found {len(devices)} device(s) on MyPlex account")
-                for device in devices:
-                    print(f"    - {device.name} ({device.product}) - Connections: {len(device.connections)}")
+                for client_info in self._client_source('account.devices()', self._clients_from_account):
                     # Only add if not already in list
-                    if not any(c['title'] == device.name for c in client_list):
-                        client_info = {
-                            'title': device.name,
-                            'product': device.product,
-                            'platform': getattr(device, 'platform', 'Unknown'),
-                            'platformVersion': getattr(device, 'platformVersion', 'Unknown'),
-                            'device': getattr(device, 'device', 'Unknown'),
-                            'machineIdentifier': device.clientIdentifier,
-                            'source': 'account.devices()'
-                        }
+                    if not any(c['title'] == client_info['title'] for c in client_list):
                         client_list.append(client_info)
-            except Exception as e:
-                print(f"  Error getting account devices: {e}")
+            except Exception:
+                pass
 
             # Method 3: Check active sessions (currently playing)
-            print("Method 3: Checking active sessions...")
             try:
-                sessions = self.server.sessions()
-                print(f"  Found {len(sessions)} active session(s)")
-                for session in sessions:
-                    player = session.players[0] if session.players else None
-                    if player:
-                        print(f"    - {player.title} playing '{session.title}'")
-                        if not any(c['title'] == player.title for c in client_list):
-                            client_info = {
-                                'title': player.title,
-                                'product': getattr(player, 'product', 'Unknown'),
-                                'platform': getattr(player, 'platform', 'Unknown'),
-                                'platformVersion': getattr(player, 'platformVersion', 'Unknown'),
-                                'device': getattr(player, 'device', 'Unknown'),
-                                'machineIdentifier': getattr(player, 'machineIdentifier', 'Unknown'),
-                                'source': 'sessions()'
-                            }
-                            client_list.append(client_info)
-            except Exception as e:
-                print(f"  Error getting sessions: {e}")
+                for client_info in self._client_source('sessions()', self._clients_from_sessions):
+                    if not any(c['title'] == client_info['title'] for c in client_list):
+                        client_list.append(client_info)
+            except Exception:
+                pass
 
-            print(f"=== Total unique clients found: {len(client_list)} ===\n")
             return client_list
 
-        except Exception as e:
-            print(f"Error in get_available_clients: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error listing Plex clients")
             return []
+
+    def iter_available_clients(self):
+        """Query all client sources concurrently and yield results as they arrive
+
+        Yields ('client', client_info) for each newly found client, deduplicated
+        by machine identifier (by title when a source doesn't report one), and
+        ('source', {'source', 'count', 'error'}) as each source finishes.
+        """
+        if not self.server:
+            yield 'source', {'source': 'server', 'count': 0, 'error': 'Not connected to Plex server'}
+            return
+
+        sources = {
+            'server.clients()': self._clients_from_server,
+            'account.devices()': self._clients_from_account,
+            'sessions()': self._clients_from_sessions,
+        }
+        futures = {_client_executor.submit(self._client_source, name, func): name for name, func in sources.items()}
+
+        seen = set()
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                client_list = future.result()
+            except Exception as e:
+                yield 'source', {'source': source, 'count': 0, 'error': str(e)}
+                continue
+
+            for client_info in client_list:
+                identifier = client_info['machineIdentifier']
+                key = identifier if identifier and identifier != 'Unknown' else ('title', client_info['title'])
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield 'client', client_info
+            yield 'source', {'source': source, 'count': len(client_list), 'error': None}
+
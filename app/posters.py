@@ -0,0 +1,131 @@
+"""Poster thumbnails served from a local disk cache.
+
+Browsers load posters from ``/poster/<rating_key>`` instead of straight from
+the Plex server, so the Plex token never reaches the page. Each poster is
+resized by the Plex photo transcoder once per width and kept on disk; the
+cache is bounded in size and evicts the least recently used files first.
+
+Poster URLs carry a short hash of the movie's thumb path, which changes
+whenever the artwork changes in Plex, so cached files and browser copies can
+be treated as immutable.
+"""
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import threading
+
+from flask import url_for
+
+logger = logging.getLogger(__name__)
+
+# Widths posters are resized to; requests snap up to the next one
+POSTER_WIDTHS = (200, 400, 600)
+DEFAULT_POSTER_WIDTH = 400
+
+
+def thumb_version(thumb):
+    """Short fingerprint of a thumb path (it includes the artwork's update time)"""
+    return hashlib.sha256(thumb.encode('utf-8')).hexdigest()[:12]
+
+
+def poster_width(requested):
+    """Snap a requested width to one of the cached sizes"""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return DEFAULT_POSTER_WIDTH
+    for width in POSTER_WIDTHS:
+        if requested <= width:
+            return width
+    return POSTER_WIDTHS[-1]
+
+
+def poster_url(server_name, rating_key, thumb, width=None):
+    """URL of the proxied poster for a movie, or '' if it has no artwork"""
+    if not thumb:
+        return ''
+    return url_for('poster', rating_key=rating_key, server=server_name,
+                   v=thumb_version(thumb), w=width or DEFAULT_POSTER_WIDTH)
+
+
+class PosterCache:
+    """Size-bounded LRU cache of poster files on disk"""
+
+    def __init__(self, directory=None, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None
+        self._total = 0
+
+    def init_app(self, app):
+        self.directory = app.config.get('POSTER_CACHE_DIR') or os.path.join(app.instance_path, 'posters')
+        self.max_bytes = app.config.get('POSTER_CACHE_SIZE', 200) * 1024 * 1024
+
+    @staticmethod
+    def key(server_name, rating_key, version, width):
+        """Cache key (and strong ETag) of one poster variant"""
+        raw = f'{server_name}:{rating_key}:{version}:{width}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.jpg')
+
+    def _load(self):
+        """Index the files already on disk, oldest first"""
+        if self._entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        files.sort()
+        self._entries = OrderedDict((key, size) for _, key, size in files)
+        self._total = sum(self._entries.values())
+
+    def get(self, key):
+        """Path of a cached poster, marking it as recently used, or None"""
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self.path(key)
+        try:
+            # The file's mtime keeps the LRU order across restarts
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def put(self, key, data):
+        """Store a poster and evict the least recently used ones over budget"""
+        with self._lock:
+            self._load()
+            path = self.path(key)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self.path(key))
+            except OSError as e:
+                logger.warning("Could not remove cached poster %s: %s", key, e)
+
+
+poster_cache = PosterCache()
@@ -0,0 +1,206 @@
+"""Per-user rate limits and a global concurrency cap for Plex-heavy endpoints.
+
+Recommendations, playback and client discovery all fan out into Plex calls.
+Each user gets a token bucket per endpoint group (a steady rate per minute
+plus a small burst), and all of these requests together share a fixed number
+of slots. A request that would exceed either waits a little, up to
+``RATE_LIMIT_WAIT`` seconds, and is answered with 429 and ``Retry-After``
+beyond that, so one client can't tie up the Plex server or our worker
+threads.
+
+A slot is held until the response is done: released as the view returns,
+when a streamed response ends, or, for work that carries on in the
+background (a playback job), when that work finishes (see ``hand_off``).
+"""
+from functools import wraps
+import math
+import threading
+import time
+
+from flask import g, jsonify, make_response
+from flask_login import current_user
+
+# Buckets kept before idle, full ones are dropped
+MAX_BUCKETS = 1024
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # Tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait):
+        """Take a token, returning how long to wait for it, or None if that is longer than ``max_wait``"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    def retry_after(self):
+        return (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Slot:
+    """One acquired concurrency slot, released at most once"""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._lock = threading.Lock()
+        self._held = True
+        self.handed_off = False
+
+    def release(self):
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        self._semaphore.release()
+
+
+class _ReleasingStream:
+    """Wraps a streamed response body to release its slot when the stream ends or is closed"""
+
+    def __init__(self, iterable, release):
+        self._iterable = iterable
+        self._release = release
+
+    def __iter__(self):
+        try:
+            yield from self._iterable
+        finally:
+            self._release()
+
+    def close(self):
+        try:
+            close = getattr(self._iterable, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._release()
+
+
+def _no_slot():
+    pass
+
+
+class RateLimiter:
+    """Token buckets per (endpoint group, user) and one shared concurrency gate"""
+
+    def __init__(self, limits=None, burst=5, concurrency=8, wait=2.0):
+        self.limits = limits or {'recommend': 30, 'play': 12, 'clients': 20}
+        self.burst = burst
+        self.wait = wait
+        self._concurrency = concurrency
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def init_app(self, app):
+        for name in self.limits:
+            self.limits[name] = app.config.get(f'RATE_LIMIT_{name.upper()}', self.limits[name])
+        self.burst = app.config.get('RATE_LIMIT_BURST', self.burst)
+        self.wait = app.config.get('RATE_LIMIT_WAIT', self.wait)
+        concurrency = app.config.get('PLEX_CONCURRENCY', self._concurrency)
+        if concurrency != self._concurrency:
+            self._concurrency = concurrency
+            self._slots = threading.BoundedSemaphore(max(concurrency, 1))
+
+    def _bucket(self, name, user_id):
+        key = (name, user_id)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_BUCKETS:
+                    now = time.monotonic()
+                    for stale in [k for k, b in self._buckets.items() if b.full(now)]:
+                        del self._buckets[stale]
+                bucket = self._buckets[key] = TokenBucket(self.limits[name] / 60.0, self.burst)
+            return bucket
+
+    def _too_many(self, message, retry_after):
+        response = jsonify({'error': message, 'retry_after': retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def limit(self, name, when=None):
+        """Decorator applying the ``name`` group's per-user limit and the shared slots to a view
+
+        With ``when``, only requests for which ``when()`` is true are limited.
+        """
+        def decorator(view):
+            @wraps(view)
+            def limited(*args, **kwargs):
+                if when is not None and not when():
+                    return view(*args, **kwargs)
+                started = time.monotonic()
+
+                if self.limits.get(name, 0) > 0:
+                    bucket = self._bucket(name, current_user.get_id())
+                    with self._lock:
+                        wait = bucket.reserve(self.wait)
+                        retry_after = bucket.retry_after()
+                    if wait is None:
+                        return self._too_many('Too many requests. Please slow down.', max(1, math.ceil(retry_after)))
+                    if wait:
+                        time.sleep(wait)
+
+                if self._concurrency <= 0:
+                    return view(*args, **kwargs)
+                remaining = max(0.0, self.wait - (time.monotonic() - started))
+                if not self._slots.acquire(timeout=remaining):
+                    return self._too_many('The server is busy. Please try again shortly.', 1)
+                slot = g.rate_limit_slot = _Slot(self._slots)
+                try:
+                    response = make_response(view(*args, **kwargs))
+                    if response.is_streamed and not slot.handed_off:
+                        # Streamed responses hold their slot until the stream ends
+                        response.response = _ReleasingStream(response.response, slot.release)
+                        slot = None
+                    return response
+                finally:
+                    g.pop('rate_limit_slot', None)
+                    if slot is not None and not slot.handed_off:
+                        slot.release()
+            return limited
+        return decorator
+
+    def try_acquire(self):
+        """Take a slot for background work on the Plex server, without waiting
+
+        Returns the function releasing it, or None when every slot is taken.
+        """
+        if self._concurrency <= 0:
+            return _no_slot
+        if not self._slots.acquire(blocking=False):
+            return None
+        return _Slot(self._slots).release
+
+    def hand_off(self):
+        """Keep the current request's slot after the view returns
+
+        For views that start background work on the Plex server: the slot
+        stays taken until the returned function is called, which the work
+        does when it finishes. Returns a no-op when no slot is held.
+        """
+        slot = g.pop('rate_limit_slot', None)
+        if slot is None:
+            return _no_slot
+        slot.handed_off = True
+        return slot.release
+
+
+rate_limiter = RateLimiter()
@@ -1,15 +1,183 @@
-from flask import render_template, request, jsonify, redirect, url_for, session
+from flask import render_template, request, jsonify, redirect, url_for, session, Response, send_file, abort, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db, login_manager
 from app.models import User, PassedMovie, UserPreference
 from app.plex_api import PlexAPI
-from app.movie_selector import MovieSelector
+from app.movie_selector import MovieSelector, connect_servers, find_last_watched, recommend_from_servers
+from app.server_pool import server_pool
+from app.playback import playback_warmer, playback_jobs
+from app.posters import poster_cache, poster_url, poster_width, thumb_version
+from app.http_cache import conditional_response, make_etag
+from app.passes import pass_movies, unpass_movies, passed_movies_query
+from app.user_cache import user_cache
+from app.auth_cache import login_cache
+from app.actor_index import ActorIndex, rank_suggestions
+from app.facets import OPTIONS, TOGGLES, count_facets
+from app.library_cache import library_cache
+from app.cache_registry import cache_registry
+from app.rate_limit import rate_limiter
 from datetime import datetime
-import os
+from sqlalchemy import and_, case, func, or_
+import json
+
+# Passed movies returned per page by default, and at most
+PASSED_PAGE_SIZE = 50
+MAX_PASSED_PAGE_SIZE = 200
+
+# Actor suggestions returned by default, and at most
+ACTOR_SUGGESTIONS = 10
+MAX_ACTOR_SUGGESTIONS = 50
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # User and preferences come from one joined query, cached for a short while
+    return user_cache.get(int(user_id))
+
+def get_or_create_preferences(user):
+    """The user's preferences, creating the defaults if none exist"""
+    prefs = user.preferences
+    if not prefs:
+        prefs = UserPreference(user_id=user.id)
+        db.session.add(prefs)
+        db.session.commit()
+        user_cache.invalidate(user.id)
+    return prefs
+
+def preferences_info(prefs):
+    """Preferences as returned by the API"""
+    return {
+        'exclude_watched': prefs.exclude_watched,
+        'exclude_same_actors': prefs.exclude_same_actors,
+        'exclude_same_director': prefs.exclude_same_director,
+        'filter_decade': prefs.filter_decade,
+        'filter_actor': prefs.filter_actor,
+        'similar_to_last_watched': bool(prefs.similar_to_last_watched),
+        'similarity_genres': bool(prefs.similarity_genres),
+        'library_sections': prefs.section_keys
+    }
+
+def selected_client_info(prefs):
+    """The selected playback client as returned by the API, or None"""
+    if not prefs or not prefs.selected_client_name:
+        return None
+    return {
+        'name': prefs.selected_client_name,
+        'identifier': prefs.selected_client_identifier
+    }
+
+def sections_info(user, plexes):
+    """Movie sections of the connected servers and which ones the user selected"""
+    sections = []
+    multiple_servers = len(server_pool.servers) > 1
+
+    for plex in plexes:
+        selected = plex.get_user_section_keys(user)
+        if selected is None:
+            selected = plex.get_default_section_keys()
+        prefix = '' if plex.server_config.primary else f'{plex.server_name}:'
+
+        for key, title in plex.get_library_sections():
+            sections.append({
+                'key': prefix + key,
+                'title': f'{title} ({plex.server_name})' if multiple_servers else title,
+                'server': plex.server_name,
+                'selected': key in selected
+            })
+    return sections
+
+def last_watched_info(user, plexes, found=None):
+    """The most recently watched movie across the connected servers, or None"""
+    selector, last_watched = found or find_last_watched(user, plexes)
+    if not last_watched:
+        return None
+    return {
+        'title': last_watched.title,
+        'year': last_watched.year or None,
+        'poster': poster_url(selector.plex.server_name, last_watched.rating_key, last_watched.thumb),
+        'actors': last_watched.actors[:5],
+        'directors': last_watched.directors
+    }
+
+def recommendation_info(user, plexes):
+    """Recommend a movie and start warming its playback
+
+    Returns:
+        tuple: (movie_info: dict or None, error_message: str or None)
+    """
+    # Get recommendation from the merged candidate pool
+    movie, selector, error = recommend_from_servers(user, plexes)
+
+    if error:
+        return None, error
+
+    if not movie:
+        return None, 'No movie found'
+
+    # Get movie info
+    movie_info = selector.get_movie_info(movie)
+
+    # Start resolving the movie and playback client while the user decides
+    prefs = user.preferences
+    if prefs and prefs.selected_client_identifier:
+        playback_warmer.warm(
+            user.id,
+            user.plex_token,
+            movie_info['server'],
+            movie_info['rating_key'],
+            prefs.selected_client_name,
+            prefs.selected_client_identifier
+        )
+    return movie_info, None
+
+def user_snapshot(server):
+    """The current user's library snapshot and section keys on one server"""
+    plex = PlexAPI(current_user.plex_token, server.name)
+    if not plex.server:
+        return None, None
+    selector = MovieSelector(current_user, plex)
+    return selector.snapshot, selector.section_keys
+
+def decade_ordinals(snapshot, ordinals, decade):
+    """The ordinals of movies from a decade like "1990s", or None if it is malformed"""
+    try:
+        start = int(str(decade).rstrip('s'))
+    except ValueError:
+        return None
+    years = snapshot.years
+    return [i for i in ordinals if years[i] and start <= years[i] < start + 10]
+
+def user_libraries(user, plexes):
+    """[(snapshot, section_keys)] of the user's libraries on the connected servers"""
+    libraries = []
+    for plex in plexes:
+        selector = MovieSelector(user, plex)
+        if selector.snapshot is not None:
+            libraries.append((selector.snapshot, selector.section_keys))
+    return libraries
+
+def actor_suggestions(query, libraries, limit):
+    """Ranked actors matching a query, counting each film once across servers"""
+    names = {}
+    films = {}
+    for snapshot, section_keys in libraries:
+        guids = snapshot.guids
+        for key, name, ordinals in ActorIndex.of(snapshot).suggest(query, snapshot.candidates(section_keys)):
+            names.setdefault(key, name)
+            films.setdefault(key, set()).update(guids[i] or (snapshot.machine_identifier, i) for i in ordinals)
+    counts = {key: len(movies) for key, movies in films.items()}
+    return rank_suggestions(query, counts, names, limit)
+
+def is_admin(user):
+    """Whether a user may see and trigger library syncs (everyone when ADMIN_USERS is unset)"""
+    admins = current_app.config.get('ADMIN_USERS')
+    return not admins or user.plex_username in admins
+
+def parse_passed_cursor(cursor):
+    """Split a passed-movies page cursor into (passed_at, id)"""
+    passed_at, sep, movie_id = cursor.rpartition('~')
+    if not sep:
+        raise ValueError(cursor)
+    return datetime.fromisoformat(passed_at), int(movie_id)
 
 def register_routes(app):
 
@@ -20,6 +188,12 @@ def register_routes(app):
             return render_template('index.html')
         return redirect(url_for('login'))
 
+    @app.route('/ready')
+    def ready():
+        """Readiness check: 200 once a library snapshot is loaded, 503 before"""
+        ready = library_cache.ready()
+        return jsonify({'ready': ready}), 200 if ready else 503
+
     @app.route('/login')
     def login():
         """Login page"""
@@ -36,18 +210,17 @@ def register_routes(app):
             return jsonify({'error': 'Username and password required'}), 400
 
         # Check if PLEX_TOKEN is set in environment (Unraid UI configuration)
-        env_token = os.environ.get('PLEX_TOKEN', '').strip()
+        env_token = app.config['PLEX_TOKEN']
 
         if env_token:
             # Use environment token for authentication
             token = env_token
-            # Verify the token works by testing connection
-            plex = PlexAPI(token)
-            if not plex.server:
+            # Verified at startup and re-checked in the background
+            if not login_cache.token_valid(token):
                 return jsonify({'error': 'Invalid Plex token in configuration'}), 401
         else:
             # Authenticate with Plex using username/password
-            token = PlexAPI.authenticate(username, password)
+            token = login_cache.authenticate(username, password)
             if not token:
                 return jsonify({'error': 'Invalid credentials'}), 401
 
@@ -69,6 +242,7 @@ def register_routes(app):
             user.plex_token = token
             user.last_login = datetime.utcnow()
             db.session.commit()
+        user_cache.invalidate(user.id)
 
         # Log user in
         login_user(user)
@@ -82,32 +256,23 @@ def register_routes(app):
     @login_required
     def api_logout():
         """API endpoint for logout"""
+        login_cache.forget(current_user.plex_username)
         logout_user()
         return jsonify({'success': True})
 
     @app.route('/api/recommend', methods=['GET'])
     @login_required
+    @rate_limiter.limit('recommend')
     def api_recommend():
         """Get a movie recommendation"""
         try:
-            # Create Plex API instance
-            plex = PlexAPI(current_user.plex_token)
-
-            # Create movie selector
-            selector = MovieSelector(current_user, plex)
-
-            # Get recommendation
-            movie, error = selector.recommend_movie()
+            # Connect to every configured Plex server
+            plexes = connect_servers(current_user, current_user.plex_token)
 
+            movie_info, error = recommendation_info(current_user, plexes)
             if error:
                 return jsonify({'error': error}), 404
 
-            if not movie:
-                return jsonify({'error': 'No movie found'}), 404
-
-            # Get movie info
-            movie_info = selector.get_movie_info(movie)
-
             return jsonify({
                 'success': True,
                 'movie': movie_info
@@ -116,39 +281,116 @@ def register_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    def wants_recommendation():
+        return request.args.get('recommend') in ('1', 'true')
+
+    @app.route('/api/bootstrap', methods=['GET'])
+    @login_required
+    @rate_limiter.limit('recommend', when=wants_recommendation)
+    def api_bootstrap():
+        """Everything the index page needs on load, in one request
+
+        All servers are connected and their libraries and watched states
+        loaded in parallel once; the Plex-backed parts are then computed from
+        those shared connections. Pass ?recommend=1 to include a first
+        recommendation, which counts against the recommendation rate limit.
+        """
+        try:
+            prefs = get_or_create_preferences(current_user)
+            plexes = connect_servers(current_user, current_user.plex_token)
+
+            data = {
+                'success': True,
+                'preferences': preferences_info(prefs),
+                'selected_client': selected_client_info(prefs),
+                'sections': sections_info(current_user, plexes),
+                'last_watched': last_watched_info(current_user, plexes)
+            }
+
+            if wants_recommendation():
+                data['movie'], data['recommend_error'] = recommendation_info(current_user, plexes)
+
+            return jsonify(data)
+
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/play', methods=['POST'])
     @login_required
+    @rate_limiter.limit('play')
     def api_play():
         """Play a movie"""
         data = request.get_json()
         rating_key = data.get('rating_key')
+        server_name = data.get('server')
 
         if not rating_key:
             return jsonify({'error': 'rating_key required'}), 400
 
-        try:
-            # Get selected client from user preferences
-            selected_client_name = None
-            selected_client_identifier = None
-
-            if current_user.preferences:
-                selected_client_name = current_user.preferences.selected_client_name
-                selected_client_identifier = current_user.preferences.selected_client_identifier
+        if server_name and not server_pool.get(server_name):
+            return jsonify({'error': f'Unknown Plex server: {server_name}'}), 400
+
+        # Get selected client from user preferences
+        selected_client_name = None
+        selected_client_identifier = None
+
+        if current_user.preferences:
+            selected_client_name = current_user.preferences.selected_client_name
+            selected_client_identifier = current_user.preferences.selected_client_identifier
+
+        # Client discovery can take a while, so it runs as a background job,
+        # which keeps this request's Plex slot until it finishes
+        job = playback_jobs.submit(
+            current_user.id,
+            current_user.plex_token,
+            server_name or server_pool.primary.name,
+            rating_key,
+            selected_client_name,
+            selected_client_identifier,
+            on_done=rate_limiter.hand_off()
+        )
+        if job is None:
+            return jsonify({'error': 'Too many playback requests in progress. Please try again shortly.'}), 503
 
-            plex = PlexAPI(current_user.plex_token)
-            success, error_message = plex.play_movie(
-                rating_key,
-                selected_client_name=selected_client_name,
-                selected_client_identifier=selected_client_identifier
-            )
-
-            if success:
-                return jsonify({'success': True})
-            else:
-                return jsonify({'error': error_message or 'Failed to play movie'}), 500
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('api_play_status', job_id=job.id),
+            'events_url': url_for('api_play_events', job_id=job.id)
+        }), 202
 
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+    @app.route('/api/play/<job_id>')
+    @login_required
+    def api_play_status(job_id):
+        """Get the progress of a playback job"""
+        job = playback_jobs.get(job_id, current_user.id)
+        if not job:
+            return jsonify({'error': 'Playback job not found'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/api/play/<job_id>/events')
+    @login_required
+    def api_play_events(job_id):
+        """Stream the progress of a playback job as server-sent events"""
+        job = playback_jobs.get(job_id, current_user.id)
+        if not job:
+            return jsonify({'error': 'Playback job not found'}), 404
+
+        def events():
+            version = -1
+            while True:
+                change = job.wait_for_change(version, timeout=15)
+                if change is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                version, state = change
+                event = 'done' if state['done'] else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(state)}\n\n"
+                if state['done']:
+                    return
+
+        return Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
     @app.route('/api/pass', methods=['POST'])
     @login_required
@@ -157,34 +399,65 @@ def register_routes(app):
         data = request.get_json()
         rating_key = data.get('rating_key')
         title = data.get('title', 'Unknown')
+        server = server_pool.get(data.get('server'))
 
         if not rating_key:
             return jsonify({'error': 'rating_key required'}), 400
 
+        if not server:
+            return jsonify({'error': f"Unknown Plex server: {data.get('server')}"}), 400
+
+        # Passes on the primary server keep server_name empty, like passes made before multi-server support
+        server_name = None if server.primary else server.name
+
         try:
-            # Check if already passed (convert rating_key to string for consistency)
-            existing = PassedMovie.query.filter_by(
-                user_id=current_user.id,
-                plex_rating_key=str(rating_key)
-            ).first()
+            # Passing again renews the pass
+            pass_movies(current_user.id, server_name, {rating_key: title})
+
+            return jsonify({'success': True})
 
-            if existing:
-                # Update expiration date
-                from datetime import datetime, timedelta
-                existing.passed_at = datetime.utcnow()
-                existing.expires_at = datetime.utcnow() + timedelta(days=180)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/pass/bulk', methods=['POST'])
+    @login_required
+    def api_pass_bulk():
+        """Pass on many movies of one server at once
+
+        Takes either "movies" (a list of {rating_key, title}), "rating_keys"
+        (titles are looked up in the library) or "decade" (every movie of the
+        user's libraries from that decade, e.g. "1990s").
+        """
+        data = request.get_json() or {}
+        server = server_pool.get(data.get('server'))
+
+        if not server:
+            return jsonify({'error': f"Unknown Plex server: {data.get('server')}"}), 400
+
+        try:
+            if data.get('movies'):
+                movies = {str(m['rating_key']): m.get('title') for m in data['movies'] if m.get('rating_key')}
+            elif data.get('rating_keys') or data.get('decade'):
+                snapshot, section_keys = user_snapshot(server)
+                if snapshot is None:
+                    return jsonify({'error': 'Could not load the movie library'}), 502
+                if data.get('decade'):
+                    ordinals = decade_ordinals(snapshot, snapshot.candidates(section_keys), data['decade'])
+                    if ordinals is None:
+                        return jsonify({'error': 'decade must look like "1990s"'}), 400
+                    movies = {snapshot.movie(i, section_keys).rating_key: snapshot.titles[i] for i in ordinals}
+                else:
+                    movies = {}
+                    for key in data['rating_keys']:
+                        ordinal = snapshot.ordinal_for(str(key))
+                        movies[str(key)] = snapshot.titles[ordinal] if ordinal is not None else None
             else:
-                # Create new pass entry
-                passed_movie = PassedMovie(
-                    user_id=current_user.id,
-                    plex_rating_key=str(rating_key),
-                    movie_title=title
-                )
-                db.session.add(passed_movie)
+                return jsonify({'error': 'movies, rating_keys or decade required'}), 400
 
-            db.session.commit()
+            # Passes on the primary server keep server_name empty
+            added, renewed = pass_movies(current_user.id, None if server.primary else server.name, movies)
 
-            return jsonify({'success': True})
+            return jsonify({'success': True, 'added': added, 'renewed': renewed})
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -193,22 +466,78 @@ def register_routes(app):
     @login_required
     def api_get_passed_movies():
         """Get list of passed movies for current user"""
+        status = request.args.get('status', 'all')
+        if status not in ('all', 'active', 'expired'):
+            return jsonify({'error': 'status must be all, active or expired'}), 400
+        search = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', PASSED_PAGE_SIZE, type=int), 1), MAX_PASSED_PAGE_SIZE)
+        cursor = request.args.get('cursor')
         try:
-            passed_movies = PassedMovie.query.filter_by(user_id=current_user.id).all()
+            after = parse_passed_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
 
-            movies_list = [{
-                'id': pm.id,
-                'title': pm.movie_title,
-                'rating_key': pm.plex_rating_key,
-                'passed_at': pm.passed_at.isoformat(),
-                'expires_at': pm.expires_at.isoformat(),
-                'is_expired': pm.is_expired
-            } for pm in passed_movies]
-
-            return jsonify({
-                'success': True,
-                'movies': movies_list
-            })
+        try:
+            now = datetime.utcnow()
+            # Any pass added, removed, renewed or expired changes one of these
+            # aggregates (a renewal moves the newest passed_at and expires_at)
+            count, max_id, id_total, expired, last_passed, last_expires = db.session.query(
+                func.count(PassedMovie.id),
+                func.max(PassedMovie.id),
+                func.total(PassedMovie.id),
+                func.count(case((PassedMovie.expires_at < now, 1))),
+                func.max(PassedMovie.passed_at),
+                func.max(PassedMovie.expires_at)
+            ).filter(PassedMovie.user_id == current_user.id).one()
+            etag = make_etag('passed-movies', current_user.id, count, max_id, id_total, expired,
+                             last_passed, last_expires, status, search, limit, cursor)
+
+            def build():
+                # Newest first; the cursor is the (passed_at, id) of the last row sent
+                query = passed_movies_query(current_user.id, search, status, now)
+                if after:
+                    query = query.filter(or_(
+                        PassedMovie.passed_at < after[0],
+                        and_(PassedMovie.passed_at == after[0], PassedMovie.id < after[1])
+                    ))
+                passed_movies = query.order_by(
+                    PassedMovie.passed_at.desc(), PassedMovie.id.desc()
+                ).limit(limit + 1).all()
+
+                next_cursor = None
+                if len(passed_movies) > limit:
+                    passed_movies = passed_movies[:limit]
+                    last = passed_movies[-1]
+                    next_cursor = f'{last.passed_at.isoformat()}~{last.id}'
+
+                # Counts for the current search, from one aggregate query
+                total, expired_count = passed_movies_query(current_user.id, search).with_entities(
+                    func.count(PassedMovie.id),
+                    func.count(case((PassedMovie.expires_at < now, 1)))
+                ).one()
+
+                movies_list = [{
+                    'id': pm.id,
+                    'title': pm.movie_title,
+                    'rating_key': pm.plex_rating_key,
+                    'server': pm.server_name or server_pool.primary.name,
+                    'passed_at': pm.passed_at.isoformat(),
+                    'expires_at': pm.expires_at.isoformat(),
+                    'is_expired': pm.expires_at < now
+                } for pm in passed_movies]
+
+                return jsonify({
+                    'success': True,
+                    'movies': movies_list,
+                    'next_cursor': next_cursor,
+                    'counts': {
+                        'all': total,
+                        'active': total - expired_count,
+                        'expired': expired_count
+                    }
+                })
+
+            return conditional_response(etag, build)
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -234,28 +563,70 @@ def register_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/passed-movies/delete', methods=['POST'])
+    @login_required
+    def api_delete_passed_movies():
+        """Remove many passes at once
+
+        Takes "ids", "rating_keys" (with "server"), "expired": true for every
+        expired pass, or "decade" (with "server") for the passes of movies
+        from that decade.
+        """
+        data = request.get_json() or {}
+        server = server_pool.get(data.get('server'))
+
+        if not server:
+            return jsonify({'error': f"Unknown Plex server: {data.get('server')}"}), 400
+        server_name = None if server.primary else server.name
+
+        if not any(data.get(field) for field in ('ids', 'rating_keys', 'expired', 'decade')):
+            return jsonify({'error': 'ids, rating_keys, expired or decade required'}), 400
+
+        try:
+            rating_keys = [str(key) for key in data.get('rating_keys') or []]
+
+            if data.get('decade'):
+                snapshot, _ = user_snapshot(server)
+                if snapshot is None:
+                    return jsonify({'error': 'Could not load the movie library'}), 502
+                passed_keys = [key for (key,) in db.session.query(PassedMovie.plex_rating_key).filter(
+                    PassedMovie.user_id == current_user.id,
+                    PassedMovie.server_name.is_(None) if server_name is None else PassedMovie.server_name == server_name
+                )]
+                ordinals = {key: snapshot.ordinal_for(key) for key in passed_keys}
+                in_decade = decade_ordinals(snapshot, [i for i in ordinals.values() if i is not None], data['decade'])
+                if in_decade is None:
+                    return jsonify({'error': 'decade must look like "1990s"'}), 400
+                in_decade = set(in_decade)
+                rating_keys += [key for key, ordinal in ordinals.items() if ordinal in in_decade]
+
+            deleted = unpass_movies(
+                current_user.id,
+                ids=[int(movie_id) for movie_id in data.get('ids') or []],
+                server_name=server_name,
+                rating_keys=rating_keys,
+                expired=bool(data.get('expired'))
+            )
+
+            return jsonify({'success': True, 'deleted': deleted})
+
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/preferences', methods=['GET'])
     @login_required
     def api_get_preferences():
         """Get user preferences"""
         try:
-            prefs = current_user.preferences
-            if not prefs:
-                # Create default preferences if none exist
-                prefs = UserPreference(user_id=current_user.id)
-                db.session.add(prefs)
-                db.session.commit()
-
-            return jsonify({
-                'success': True,
-                'preferences': {
-                    'exclude_watched': prefs.exclude_watched,
-                    'exclude_same_actors': prefs.exclude_same_actors,
-                    'exclude_same_director': prefs.exclude_same_director,
-                    'filter_decade': prefs.filter_decade,
-                    'filter_actor': prefs.filter_actor
-                }
-            })
+            prefs = get_or_create_preferences(current_user)
+
+            return conditional_response(
+                make_etag('preferences', prefs.id, prefs.version),
+                lambda: jsonify({
+                    'success': True,
+                    'preferences': preferences_info(prefs)
+                })
+            )
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -283,14 +654,169 @@ def register_routes(app):
                 prefs.filter_decade = data['filter_decade'] if data['filter_decade'] else None
             if 'filter_actor' in data:
                 prefs.filter_actor = data['filter_actor'] if data['filter_actor'] else None
+            if 'similar_to_last_watched' in data:
+                prefs.similar_to_last_watched = bool(data['similar_to_last_watched'])
+            if 'similarity_genres' in data:
+                prefs.similarity_genres = bool(data['similarity_genres'])
+            if 'library_sections' in data:
+                sections = [str(key) for key in (data['library_sections'] or []) if str(key).strip()]
+                prefs.library_sections = ','.join(sections) if sections else None
 
             db.session.commit()
+            user_cache.invalidate(current_user.id)
 
             return jsonify({'success': True})
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/actors', methods=['GET'])
+    @login_required
+    def api_get_actors():
+        """Suggest actors from the user's libraries whose name contains q, with movie counts"""
+        query = request.args.get('q', '').strip()
+        try:
+            limit = min(max(int(request.args.get('limit', ACTOR_SUGGESTIONS)), 1), MAX_ACTOR_SUGGESTIONS)
+        except ValueError:
+            return jsonify({'error': 'limit must be a number'}), 400
+
+        if not query:
+            return jsonify({'success': True, 'actors': []})
+
+        try:
+            libraries = user_libraries(current_user, PlexAPI.connect_all(current_user.plex_token))
+            prefs = current_user.preferences
+
+            # Same libraries and same snapshot generations give the same answer
+            etag = make_etag('actors', current_user.id, prefs.version if prefs else None, query, limit,
+                             *((s.machine_identifier, s.generation) for s, _ in libraries))
+
+            return conditional_response(etag, lambda: jsonify({
+                'success': True,
+                'actors': actor_suggestions(query, libraries, limit)
+            }))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/facets', methods=['GET'])
+    @login_required
+    def api_get_facets():
+        """Count the movies left by the current filters and by each alternative choice
+
+        Filter choices passed as query parameters (the toggles and
+        similarity_genres as 0/1, filter_decade, filter_actor) are previewed
+        instead of the saved ones.
+        """
+        overrides = {}
+        for name in TOGGLES + OPTIONS:
+            if name in request.args:
+                overrides[name] = request.args[name].lower() in ('1', 'true', 'on')
+        for name in ('filter_decade', 'filter_actor'):
+            if name in request.args:
+                overrides[name] = request.args[name]
+
+        try:
+            plexes = connect_servers(current_user, current_user.plex_token)
+            if not plexes:
+                return jsonify({'error': 'Could not reach any Plex server'}), 502
+
+            _, last_watched = find_last_watched(current_user, plexes)
+            selectors = [MovieSelector(current_user, plex, last_watched=last_watched) for plex in plexes]
+
+            return jsonify({
+                'success': True,
+                'facets': count_facets(selectors, overrides)
+            })
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/admin/library', methods=['GET'])
+    @login_required
+    def api_admin_library():
+        """Library cache status: snapshot generation and age, last sync duration per server"""
+        if not is_admin(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+
+        return jsonify({
+            'success': True,
+            'refresh_interval': library_cache.refresh_interval,
+            'servers': library_cache.status()
+        })
+
+    @app.route('/api/admin/library/refresh', methods=['POST'])
+    @login_required
+    def api_admin_library_refresh():
+        """Start a background sync of every cached server library"""
+        if not is_admin(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+
+        return jsonify({'success': True, 'refreshing': library_cache.refresh_all()}), 202
+
+    @app.route('/api/admin/caches', methods=['GET'])
+    @login_required
+    def api_admin_caches():
+        """Memory budget and per-cache size, entries, hits, misses and evictions"""
+        if not is_admin(current_user):
+            return jsonify({'error': 'Admin access required'}), 403
+
+        return jsonify({'success': True, **cache_registry.status()})
+
+    @app.route('/api/sections', methods=['GET'])
+    @login_required
+    def api_get_sections():
+        """Get the movie sections on the Plex server and which ones are selected"""
+        try:
+            plexes = PlexAPI.connect_all(current_user.plex_token)
+            sections = sections_info(current_user, plexes)
+
+            return jsonify({
+                'success': True,
+                'sections': sections
+            })
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/poster/<rating_key>')
+    @login_required
+    def poster(rating_key):
+        """Serve a resized movie poster from the local cache"""
+        server = server_pool.get(request.args.get('server'))
+        if server is None:
+            abort(404)
+        width = poster_width(request.args.get('w'))
+        version = request.args.get('v', '')
+
+        # A known version is served from disk without asking Plex at all
+        key = poster_cache.key(server.name, rating_key, version, width)
+        path = poster_cache.get(key) if version else None
+
+        if path is None:
+            plex = PlexAPI(current_user.plex_token, server.name)
+            if not plex.server:
+                abort(502)
+            thumb = plex.get_movie_thumb(rating_key, MovieSelector(current_user, plex).snapshot)
+            if not thumb:
+                abort(404)
+
+            version = thumb_version(thumb)
+            key = poster_cache.key(server.name, rating_key, version, width)
+            path = poster_cache.get(key)
+            if path is None:
+                data = plex.fetch_poster(thumb, width, width * 3 // 2)
+                if not data:
+                    abort(502)
+                path = poster_cache.put(key, data)
+
+        # The URL names the artwork version, so the response never changes
+        immutable = request.args.get('v') == version
+        response = send_file(path, mimetype='image/jpeg', etag=key, conditional=True,
+                             max_age=31536000 if immutable else 3600)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        if immutable:
+            response.cache_control.immutable = True
+        return response
+
     @app.route('/passed-list')
     @login_required
     def passed_list():
@@ -308,27 +834,24 @@ def register_routes(app):
     def api_get_last_watched():
         """Get the last watched movie information"""
         try:
-            plex = PlexAPI(current_user.plex_token)
-            last_watched = plex.get_last_watched_movie(current_user.plex_username)
-
-            if not last_watched:
-                return jsonify({'success': True, 'movie': None})
-
-            # Get movie details
-            movie_info = {
-                'title': last_watched.title,
-                'year': plex.get_movie_year(last_watched),
-                'poster': last_watched.thumbUrl if hasattr(last_watched, 'thumbUrl') else '',
-                'actors': plex.get_movie_actors(last_watched)[:5],
-                'directors': plex.get_movie_directors(last_watched)
-            }
+            plexes = connect_servers(current_user, current_user.plex_token)
+            selector, last_watched = find_last_watched(current_user, plexes)
 
-            return jsonify({'success': True, 'movie': movie_info})
+            # Same library generation and same movie: nothing to rebuild
+            etag = make_etag('last-watched', current_user.id, *(
+                (selector.plex.server_name, selector.snapshot.generation, last_watched.rating_key)
+                if last_watched else ()))
+
+            return conditional_response(etag, lambda: jsonify({
+                'success': True,
+                'movie': last_watched_info(current_user, plexes, (selector, last_watched))
+            }))
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/clients', methods=['GET'])
     @login_required
+    @rate_limiter.limit('clients')
     def api_get_clients():
         """Get list of available Plex clients"""
         try:
@@ -343,22 +866,43 @@ def register_routes(app):
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/clients/stream')
+    @login_required
+    @rate_limiter.limit('clients')
+    def api_stream_clients():
+        """Stream Plex clients as server-sent events while they are discovered"""
+        plex = PlexAPI(current_user.plex_token)
+
+        def events():
+            count = 0
+            sources = {}
+            for kind, payload in plex.iter_available_clients():
+                if kind == 'client':
+                    count += 1
+                else:
+                    sources[payload['source']] = payload
+                yield f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+            summary = {'count': count, 'sources': list(sources.values())}
+            yield f"event: summary\ndata: {json.dumps(summary)}\n\n"
+
+        return Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
     @app.route('/api/selected-client', methods=['GET'])
     @login_required
     def api_get_selected_client():
         """Get the currently selected playback client"""
         try:
             prefs = current_user.preferences
-            if not prefs or not prefs.selected_client_name:
-                return jsonify({'success': True, 'client': None})
 
-            return jsonify({
-                'success': True,
-                'client': {
-                    'name': prefs.selected_client_name,
-                    'identifier': prefs.selected_client_identifier
-                }
-            })
+            return conditional_response(
+                make_etag('selected-client', current_user.id, prefs.id if prefs else None,
+                          prefs.version if prefs else None),
+                lambda: jsonify({
+                    'success': True,
+                    'client': selected_client_info(prefs)
+                })
+            )
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
@@ -382,6 +926,7 @@ def register_routes(app):
             prefs.selected_client_name = client_name
             prefs.selected_client_identifier = client_identifier
             db.session.commit()
+            user_cache.invalidate(current_user.id)
 
             return jsonify({
                 'success': True,
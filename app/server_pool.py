@@ -0,0 +1,213 @@
+"""Configured Plex servers and their pooled connections.
+
+A deployment can point at several Plex servers (for example a main server
+and an archive server). Each server gets its own HTTP connection pool, and
+connected ``PlexServer`` objects are reused per token for a short while so a
+request doesn't pay a fresh handshake with every server it touches. At most
+``MAX_CONNECTIONS`` are kept, least recently used first out, and they count
+towards the shared cache memory budget.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+import os
+import threading
+import time
+
+from app.cache_registry import CacheEntry, cache_registry
+from app.library_cache import token_key
+
+logger = logging.getLogger(__name__)
+
+# Connections kept before the least recently used are dropped
+MAX_CONNECTIONS = 256
+
+# A PlexServer object with its parsed server info
+CONNECTION_ENTRY_SIZE = 32 * 1024
+
+
+class ServerConfig:
+    """One configured Plex server"""
+
+    def __init__(self, name, url, primary=False):
+        self.name = name
+        self.url = url.rstrip('/')
+        self.primary = primary
+
+    def __repr__(self):
+        return f'<ServerConfig {self.name} {self.url}>'
+
+
+def parse_server_list(value, default_url):
+    """Parse PLEX_SERVERS, e.g. "main=http://10.0.0.2:32400,archive=http://10.0.0.3:32400"
+
+    Entries without a name are named after their position. The first server
+    is the primary one. Falls back to a single server at ``default_url``.
+    """
+    servers = []
+    for index, entry in enumerate(part.strip() for part in (value or '').split(',')):
+        if not entry:
+            continue
+        name, sep, url = entry.partition('=')
+        if not sep:
+            name, url = ('default' if index == 0 else f'server{index + 1}'), entry
+        servers.append(ServerConfig(name.strip(), url.strip(), primary=not servers))
+    if not servers:
+        servers.append(ServerConfig('default', default_url, primary=True))
+    return servers
+
+
+class ServerPool:
+    """HTTP sessions and live connections for every configured server"""
+
+    def __init__(self):
+        self._servers = None
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._connections = OrderedDict()  # (server name, token key) -> (server, connected at, last used)
+        self._failures = {}
+        self.connection_ttl = 300
+        self.pool_size = 10
+        self.timeout = 30
+        self.deadline = 5
+        self.retry_after = 30
+        cache_registry.register('connections', self._entries, self._evict)
+
+    def init_app(self, app):
+        self._servers = parse_server_list(app.config.get('PLEX_SERVERS'), app.config['PLEX_SERVER_URL'])
+        self.connection_ttl = app.config.get('PLEX_CONNECTION_TTL', self.connection_ttl)
+        self.pool_size = app.config.get('PLEX_POOL_SIZE', self.pool_size)
+        self.timeout = app.config.get('PLEX_TIMEOUT', self.timeout)
+        self.deadline = app.config.get('PLEX_SERVER_DEADLINE', self.deadline)
+
+    @property
+    def servers(self):
+        if self._servers is None:
+            self._servers = parse_server_list(
+                os.environ.get('PLEX_SERVERS'),
+                os.environ.get('PLEX_SERVER_URL', 'http://localhost:32400')
+            )
+        return self._servers
+
+    @property
+    def primary(self):
+        return self.servers[0]
+
+    def get(self, name=None):
+        """Look up a server by name (the primary server when name is empty)"""
+        if not name:
+            return self.primary
+        for config in self.servers:
+            if config.name == name:
+                return config
+        return None
+
+    def session(self, config):
+        """The pooled HTTP session for one server"""
+        with self._lock:
+            session = self._sessions.get(config.name)
+            if session is None:
+                # Imported here so the app starts without loading requests
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[config.name] = session
+            return session
+
+    def connect(self, config, token):
+        """Return a connected PlexServer for a token, reusing a recent connection"""
+        key = (config.name, token_key(token))
+        with self._lock:
+            cached = self._connections.get(key)
+            now = time.time()
+            if cached is not None and now - cached[1] < self.connection_ttl:
+                self._connections[key] = (cached[0], cached[1], now)
+                self._connections.move_to_end(key)
+                cache_registry.hit('connections')
+                return cached[0]
+        cache_registry.miss('connections')
+
+        from plexapi.server import PlexServer
+        try:
+            server = PlexServer(config.url, token, session=self.session(config), timeout=self.timeout)
+        except Exception:
+            self._failures[config.name] = time.time()
+            raise
+
+        self._failures.pop(config.name, None)
+        now = time.time()
+        with self._lock:
+            self._connections[key] = (server, now, now)
+            self._connections.move_to_end(key)
+            for stale in [k for k, (_, connected_at, _) in self._connections.items()
+                          if now - connected_at >= self.connection_ttl]:
+                del self._connections[stale]
+            while len(self._connections) > MAX_CONNECTIONS:
+                self._connections.popitem(last=False)
+        cache_registry.enforce()
+        return server
+
+    def forget(self, config, token):
+        """Drop a cached connection, e.g. after the token stopped working"""
+        with self._lock:
+            self._connections.pop((config.name, token_key(token)), None)
+
+    def _entries(self):
+        with self._lock:
+            return [CacheEntry(key, CONNECTION_ENTRY_SIZE, last_used, cost=0.5)
+                    for key, (_, _, last_used) in self._connections.items()]
+
+    def _evict(self, key):
+        with self._lock:
+            self._connections.pop(key, None)
+
+    def available(self):
+        """Servers that haven't failed recently (all of them if every one has)"""
+        now = time.time()
+        servers = [config for config in self.servers
+                   if now - self._failures.get(config.name, 0) >= self.retry_after]
+        return servers or list(self.servers)
+
+
+server_pool = ServerPool()
+
+# Shared by all requests that fan out to several servers at once
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='plex-server')
+
+
+def run_on_servers(func, servers, deadline=None):
+    """Run ``func(config)`` for each server in parallel and collect results
+
+    Servers that haven't answered by the deadline are left out (their work
+    keeps running in the background and warms the caches for later). If no
+    server has answered by then, waits for the first one so a single slow
+    server still gets a result.
+
+    Returns a list of (config, result) for servers that finished without an
+    exception, in configuration order.
+    """
+    deadline = server_pool.deadline if deadline is None else deadline
+    futures = {_executor.submit(func, config): config for config in servers}
+
+    done, pending = wait(futures, timeout=deadline)
+    while pending and not any(f.exception() is None for f in done):
+        more, pending = wait(pending, return_when=FIRST_COMPLETED)
+        done |= more
+
+    for future in pending:
+        logger.warning("Plex server '%s' missed the %ss deadline; skipping it", futures[future].name, deadline)
+
+    results = []
+    for future in done:
+        config = futures[future]
+        error = future.exception()
+        if error is not None:
+            logger.warning("Plex server '%s' failed: %s", config.name, error)
+            continue
+        results.append((config, future.result()))
+    order = {config.name: index for index, config in enumerate(servers)}
+    results.sort(key=lambda item: order[item[0].name])
+    return results
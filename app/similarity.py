@@ -0,0 +1,90 @@
+"""Cast and crew similarity between movies of a library snapshot."""
+from array import array
+import heapq
+
+from app.library_cache import SnapshotIndex
+
+DIRECTOR_WEIGHT = 1.5
+GENRE_WEIGHT = 0.25
+
+ACTOR = 'a'
+DIRECTOR = 'd'
+GENRE = 'g'
+
+
+def actor_weight(position):
+    """Weight of a role by billing order: the lead counts 1, the tenth-billed 0.25"""
+    return 1.0 / (1.0 + position / 3.0)
+
+
+def _credits(actors, directors, genres):
+    """(kind, name) -> weight for one movie's credits"""
+    weights = {}
+    for position, name in enumerate(actors):
+        key = (ACTOR, name.lower())
+        if key not in weights:
+            weights[key] = actor_weight(position)
+    for name in directors:
+        weights[(DIRECTOR, name.lower())] = DIRECTOR_WEIGHT
+    for name in genres:
+        weights[(GENRE, name.lower())] = GENRE_WEIGHT
+    return weights
+
+
+class CreditIndex(SnapshotIndex):
+    """Per-person postings of the movies of one snapshot
+
+    Each movie is a sparse weighted vector over people (and optionally
+    genres), stored transposed so scoring the library against one movie only
+    walks the postings of that movie's people.
+    """
+
+    index_name = 'credits'
+
+    def __init__(self, snapshot):
+        self.guids = snapshot.guids
+        self.postings = {}
+        for ordinal in range(len(snapshot)):
+            credits = _credits(snapshot.actors[ordinal], snapshot.directors[ordinal], snapshot.genres[ordinal])
+            for key, weight in credits.items():
+                posting = self.postings.get(key)
+                if posting is None:
+                    posting = self.postings[key] = (array('I'), array('f'))
+                posting[0].append(ordinal)
+                posting[1].append(weight)
+
+    def scores(self, movie, include_genres=False):
+        """Similarity of every movie of the snapshot to ``movie``
+
+        ``movie`` may come from another server's snapshot; people are matched
+        by name.
+
+        Returns:
+            dict: ordinal -> score, for movies sharing at least one credit
+        """
+        query = _credits(movie.actors, movie.directors, movie.genres if include_genres else ())
+        scores = {}
+        for key, query_weight in query.items():
+            posting = self.postings.get(key)
+            if posting is None:
+                continue
+            for ordinal, weight in zip(*posting):
+                scores[ordinal] = scores.get(ordinal, 0.0) + query_weight * weight
+        return scores
+
+    def most_similar(self, movie, ordinals, k, include_genres=False, exclude_guid=None, exclude_ordinal=None):
+        """The ``k`` ordinals among ``ordinals`` most similar to ``movie``, best first
+
+        ``movie`` itself is left out: by ``exclude_ordinal`` when it is in this
+        snapshot, and by ``exclude_guid`` for its copies (movies without a
+        GUID have an empty one, which never matches).
+        """
+        scores = self.scores(movie, include_genres)
+        if not scores:
+            return []
+        guids = self.guids
+        candidates = (
+            (scores[i], i) for i in ordinals
+            if i in scores and i != exclude_ordinal and not (exclude_guid and guids[i] == exclude_guid)
+        )
+        return [i for _, i in heapq.nlargest(k, candidates)]
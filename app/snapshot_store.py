@@ -0,0 +1,291 @@
+"""Library sections saved to disk as memory-mapped columnar files.
+
+Every section loaded from Plex is written to
+``<LIBRARY_STORE_DIR>/<machine identifier>/<section key>.<generation>.snap``.
+A file holds a small JSON header followed by 8-byte aligned blocks:
+
+* numeric columns (years, ratings, durations) as fixed-width arrays,
+* text columns (rating keys, GUIDs, titles, summaries, thumbs) as one UTF-8
+  blob plus an offsets array,
+* people columns (actors, directors, genres) as a table of distinct names
+  plus, per movie, a run of ids into that table.
+
+At startup the files are memory-mapped and the snapshot's columns become
+thin views over the mapped buffers: nothing is parsed per row, a value is
+only decoded when it is read, and every worker process shares the same
+pages. Writes go to a temporary file renamed to the next generation; older
+generations are removed afterwards, and a process still mapping one keeps
+reading it safely.
+"""
+from array import array
+from collections.abc import Sequence
+from datetime import datetime
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PMSNAP\x00\x02'
+HEADER = struct.Struct('<8sI')
+ALIGNMENT = 8
+
+NUMBER_COLUMNS = {'years': 'i', 'ratings': 'd', 'durations': 'q'}
+TEXT_COLUMNS = ('rating_keys', 'guids', 'titles', 'summaries', 'thumbs')
+PEOPLE_COLUMNS = ('actors', 'directors', 'genres')
+
+
+def _safe_name(value):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(value))
+
+
+def _encode_time(value):
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    return value
+
+
+def _decode_time(value):
+    if isinstance(value, dict) and 'datetime' in value:
+        return datetime.fromisoformat(value['datetime'])
+    return value
+
+
+class TextColumn(Sequence):
+    """Strings stored as one UTF-8 blob and an offsets array"""
+
+    __slots__ = ('_offsets', '_blob')
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+
+class PeopleColumn(Sequence):
+    """Per-movie tuples of names, stored as runs of ids into a name table"""
+
+    __slots__ = ('_names', '_row_offsets', '_ids', '_decoded')
+
+    def __init__(self, names, row_offsets, ids):
+        self._names = names
+        self._row_offsets = row_offsets
+        self._ids = ids
+        self._decoded = {}
+
+    def __len__(self):
+        return len(self._row_offsets) - 1
+
+    def _name(self, name_id):
+        name = self._decoded.get(name_id)
+        if name is None:
+            name = self._decoded[name_id] = self._names[name_id]
+        return name
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        ids = self._ids[self._row_offsets[index]:self._row_offsets[index + 1]]
+        return tuple(self._name(name_id) for name_id in ids)
+
+
+class _BlockWriter:
+    def __init__(self):
+        self.blocks = {}
+        self.chunks = []
+        self.size = 0
+
+    def add(self, name, data):
+        padding = -self.size % ALIGNMENT
+        if padding:
+            self.chunks.append(b'\0' * padding)
+            self.size += padding
+        self.blocks[name] = [self.size, len(data)]
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def add_text(self, name, values):
+        offsets = array('Q', [0])
+        blob = bytearray()
+        for value in values:
+            blob += (value or '').encode('utf-8')
+            offsets.append(len(blob))
+        self.add(f'{name}.offsets', offsets.tobytes())
+        self.add(f'{name}.blob', bytes(blob))
+
+    def add_people(self, name, rows):
+        table = {}
+        row_offsets = array('Q', [0])
+        ids = array('I')
+        for row in rows:
+            for person in row:
+                ids.append(table.setdefault(person, len(table)))
+            row_offsets.append(len(ids))
+        self.add_text(f'{name}.names', list(table))
+        self.add(f'{name}.rows', row_offsets.tobytes())
+        self.add(f'{name}.ids', ids.tobytes())
+
+
+class SnapshotStore:
+    """Reads and writes saved library sections"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.enabled = True
+
+    def init_app(self, app):
+        self.directory = app.config.get('LIBRARY_STORE_DIR') or os.path.join(app.instance_path, 'library')
+        self.enabled = app.config.get('LIBRARY_STORE', self.enabled)
+
+    def _server_dir(self, machine_identifier):
+        return os.path.join(self.directory, _safe_name(machine_identifier))
+
+    def _generations(self, server_dir, section_key):
+        """[(generation, path)] of the saved files of one section, newest first"""
+        prefix = f'{_safe_name(section_key)}.'
+        found = []
+        for entry in os.scandir(server_dir):
+            name = entry.name
+            if name.startswith(prefix) and name.endswith('.snap'):
+                generation = name[len(prefix):-len('.snap')]
+                if generation.isdigit():
+                    found.append((int(generation), entry.path))
+        return sorted(found, reverse=True)
+
+    def save_section(self, machine_identifier, section):
+        """Write one SectionLibrary as a new generation; returns the number of bytes written"""
+        if not self.enabled:
+            return 0
+        snapshot = section.snapshot
+        writer = _BlockWriter()
+        for name, typecode in NUMBER_COLUMNS.items():
+            writer.add(name, array(typecode, getattr(snapshot, name)).tobytes())
+        for name in TEXT_COLUMNS:
+            writer.add_text(name, getattr(snapshot, name))
+        for name in PEOPLE_COLUMNS:
+            writer.add_people(name, getattr(snapshot, name))
+
+        header = json.dumps({
+            'byteorder': sys.byteorder,
+            'machine_identifier': machine_identifier,
+            'key': section.key,
+            'title': section.title,
+            'updated_at': _encode_time(section.updated_at),
+            'content_changed_at': _encode_time(section.content_changed_at),
+            'load_seconds': section.load_seconds,
+            'built_at': section.built_at,
+            'count': len(snapshot),
+            'unique_guids': snapshot.unique_guids(),
+            'blocks': writer.blocks,
+        }).encode('utf-8')
+
+        server_dir = self._server_dir(machine_identifier)
+        os.makedirs(server_dir, exist_ok=True)
+        previous = self._generations(server_dir, section.key)
+        generation = max(previous[0][0] + 1 if previous else 1, int(time.time() * 1000))
+        path = os.path.join(server_dir, f'{_safe_name(section.key)}.{generation}.snap')
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            f.write(b'\0' * (-(HEADER.size + len(header)) % ALIGNMENT))
+            for chunk in writer.chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+
+        for _, old_path in previous:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass  # Still mapped by a process on a platform that won't delete it
+        return os.path.getsize(path)
+
+    def _map_file(self, path):
+        from app.library_cache import LibrarySnapshot, SectionLibrary
+
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                return None, None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(mapped)
+        magic, header_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            return None, None
+        header = json.loads(bytes(buffer[HEADER.size:HEADER.size + header_size]))
+        if header['byteorder'] != sys.byteorder:
+            return None, None
+        data_start = HEADER.size + header_size
+        data_start += -data_start % ALIGNMENT
+
+        def block(name, typecode=None):
+            offset, size = header['blocks'][name]
+            view = buffer[data_start + offset:data_start + offset + size]
+            return view.cast(typecode) if typecode else view
+
+        def text(name):
+            return TextColumn(block(f'{name}.offsets', 'Q'), block(f'{name}.blob'))
+
+        snapshot = LibrarySnapshot(header['machine_identifier'])
+        for name, typecode in NUMBER_COLUMNS.items():
+            setattr(snapshot, name, block(name, typecode))
+        for name in TEXT_COLUMNS:
+            setattr(snapshot, name, text(name))
+        for name in PEOPLE_COLUMNS:
+            setattr(snapshot, name, PeopleColumn(text(f'{name}.names'), block(f'{name}.rows', 'Q'),
+                                                 block(f'{name}.ids', 'I')))
+        # The rating key lookup is built on first use
+        snapshot.ordinals = None
+        snapshot._unique_guids = header['unique_guids']
+
+        section = SectionLibrary(header['key'], header['title'], snapshot, _decode_time(header['updated_at']),
+                                 _decode_time(header['content_changed_at']), header['load_seconds'])
+        section.built_at = header['built_at']
+        return header['machine_identifier'], section
+
+    def load_all(self):
+        """Map the newest saved generation of every section: {machine: [SectionLibrary]}"""
+        servers = {}
+        if not self.enabled or not self.directory or not os.path.isdir(self.directory):
+            return servers
+        started = time.time()
+        count = 0
+        for server_dir in os.scandir(self.directory):
+            if not server_dir.is_dir():
+                continue
+            keys = {entry.name.split('.', 1)[0] for entry in os.scandir(server_dir.path)
+                    if entry.name.endswith('.snap')}
+            for key in keys:
+                generations = self._generations(server_dir.path, key)
+                if not generations:
+                    continue
+                path = generations[0][1]
+                try:
+                    machine_identifier, section = self._map_file(path)
+                except Exception as e:
+                    logger.warning("Ignoring unreadable saved library %s: %s", path, e)
+                    continue
+                if section is not None:
+                    servers.setdefault(machine_identifier, []).append(section)
+                    count += len(section.snapshot)
+        if servers:
+            logger.info("Mapped %s saved movie(s) from %s in %.3fs", count, self.directory, time.time() - started)
+        return servers
+
+
+snapshot_store = SnapshotStore()
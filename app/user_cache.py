@@ -0,0 +1,81 @@
+"""Per-process cache of logged-in users and their preferences.
+
+Flask-Login resolves the user on every request, and most API routes then
+read ``current_user.preferences``. Both come from one joined query and are
+kept as detached objects for a short while; each request gets its own copy
+through ``session.merge(load=False)``, which attaches the cached state to the
+request's session without touching the database.
+
+Anything that changes a user or their preferences calls ``invalidate()``
+after committing. The TTL bounds staleness across worker processes.
+"""
+import threading
+import time
+
+from sqlalchemy.orm import Session, joinedload
+
+from app import db
+from app.cache_registry import CacheEntry, cache_registry, estimate_size
+from app.models import User
+
+
+def _row_size(instance):
+    # Column values only; the SQLAlchemy instance state points at the whole session
+    if instance is None:
+        return 0
+    return sum(estimate_size(value) for name, value in vars(instance).items() if not name.startswith('_'))
+
+
+class UserCache:
+    """Recently loaded users with their preferences"""
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._users = {}
+        cache_registry.register('users', self._entries, self.invalidate)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+
+    def _load(self, user_id):
+        """Load a user and their preferences with one query, detached from any session"""
+        with Session(db.engine, expire_on_commit=False) as session:
+            user = session.get(User, user_id, options=[joinedload(User.preferences)])
+            if user is not None:
+                session.expunge_all()
+            return user
+
+    def get(self, user_id):
+        """The user attached to the current request's session, or None"""
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            cache_registry.miss('users')
+            user = self._load(user_id)
+            if user is None:
+                self.invalidate(user_id)
+                return None
+            with self._lock:
+                if len(self._users) >= self.max_entries:
+                    self._users.clear()
+                self._users[user_id] = (user, time.time())
+            cache_registry.enforce()
+            entry = (user, None)
+        else:
+            cache_registry.hit('users')
+        return db.session.merge(entry[0], load=False)
+
+    def _entries(self):
+        with self._lock:
+            users = list(self._users.items())
+        return [CacheEntry(user_id, _row_size(user) + _row_size(user.preferences), loaded_at)
+                for user_id, (user, loaded_at) in users]
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+user_cache = UserCache()
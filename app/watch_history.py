@@ -0,0 +1,134 @@
+"""Per-user watch state synced in bulk from the Plex server's watch history.
+
+The server records every play against the account that made it, including
+managed home users that share the owner's token. Syncing that history into
+``WatchedMovie`` rows gives each ``User`` their own watched state at the cost
+of one incremental history fetch, instead of per-title lookups under every
+user's token. Rating keys and account IDs are per server, so rows and sync
+state are stored per server machine identifier.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from app import db
+from app.models import WatchedMovie, WatchHistorySync
+
+logger = logging.getLogger(__name__)
+
+# Re-read a little history before the last sync to cover clock skew with the server
+SYNC_OVERLAP = timedelta(minutes=5)
+
+# How long to wait before looking up an account that couldn't be resolved again
+ACCOUNT_RETRY = timedelta(hours=1)
+
+# The server owner's account ID on their own server
+OWNER_ACCOUNT_ID = 1
+
+# Stay well below SQLite's bound parameter limit in IN (...) lookups
+LOOKUP_CHUNK_SIZE = 500
+
+
+def lookup_chunks(items):
+    """Split a list of lookup values into chunks of at most LOOKUP_CHUNK_SIZE"""
+    for start in range(0, len(items), LOOKUP_CHUNK_SIZE):
+        yield items[start:start + LOOKUP_CHUNK_SIZE]
+
+
+def sync_watch_history(user, plex):
+    """Fetch watch history newer than the user's last sync and store it
+
+    A failed account lookup is remembered and only retried after
+    ACCOUNT_RETRY, so users without an account on the server don't cost a
+    plex.tv round trip on every overlay rebuild.
+
+    Returns the user's WatchHistorySync row if their history is available in
+    the database, otherwise None.
+    """
+    server_id = plex.server.machineIdentifier
+    sync = WatchHistorySync.query.filter_by(user_id=user.id, server_id=server_id).first()
+    if sync is None:
+        sync = WatchHistorySync(user_id=user.id, server_id=server_id)
+        db.session.add(sync)
+
+    if sync.plex_account_id is None:
+        if sync.account_checked_at and datetime.utcnow() - sync.account_checked_at < ACCOUNT_RETRY:
+            return None
+        sync.plex_account_id = plex.get_account_id(user.plex_username)
+        sync.account_checked_at = None if sync.plex_account_id is not None else datetime.utcnow()
+        db.session.commit()
+        if sync.plex_account_id is None:
+            return None
+
+    started_at = datetime.utcnow()
+    since = None
+    if sync.synced_at:
+        since = (sync.synced_at - SYNC_OVERLAP).replace(tzinfo=timezone.utc)
+
+    try:
+        latest = {}
+        for rating_key, viewed_at in plex.get_watch_history(sync.plex_account_id, since):
+            if rating_key not in latest or viewed_at > latest[rating_key]:
+                latest[rating_key] = viewed_at
+
+        for chunk in lookup_chunks(list(latest)):
+            existing = {
+                row.plex_rating_key: row
+                for row in WatchedMovie.query.filter(
+                    WatchedMovie.user_id == user.id,
+                    WatchedMovie.server_id == server_id,
+                    WatchedMovie.plex_rating_key.in_(chunk)
+                )
+            }
+            for rating_key in chunk:
+                row = existing.get(rating_key)
+                if row is None:
+                    db.session.add(WatchedMovie(
+                        user_id=user.id,
+                        server_id=server_id,
+                        plex_rating_key=rating_key,
+                        last_viewed_at=latest[rating_key]
+                    ))
+                elif latest[rating_key] > row.last_viewed_at:
+                    row.last_viewed_at = latest[rating_key]
+
+        sync.synced_at = started_at
+        db.session.commit()
+        if since is None or latest:
+            logger.info("Synced %s watched movie(s) for %s on '%s'", len(latest), user.plex_username, plex.server_name)
+        return sync
+
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Error syncing watch history for %s on '%s': %s", user.plex_username, plex.server_name, e)
+        return sync if sync.synced_at is not None else None
+
+
+def _owns_token(user, sync):
+    """Whether the token's own watched flags are the user's
+
+    Users signed in with their own Plex account have their own token. With a
+    shared configured PLEX_TOKEN, the flags belong to the server owner.
+    """
+    shared_token = current_app.config.get('PLEX_TOKEN')
+    return user.plex_token != shared_token or sync.plex_account_id == OWNER_ACCOUNT_ID
+
+
+def load_watched_states(user, plex):
+    """Return (rating_key, last_viewed_timestamp) pairs for a user's watched movies
+
+    Movies marked as watched by hand have no history entry, so when the
+    token is the user's own its watched flags are merged in. Falls back to
+    the token's own view of the library when the user has no account on the
+    server that history can be attributed to.
+    """
+    sync = sync_watch_history(user, plex)
+    if sync is None:
+        return list(plex.get_watched_states())
+
+    rows = db.session.query(WatchedMovie.plex_rating_key, WatchedMovie.last_viewed_at).filter_by(
+        user_id=user.id, server_id=plex.server.machineIdentifier)
+    states = {rating_key: last_viewed_at.timestamp() for rating_key, last_viewed_at in rows}
+    if _owns_token(user, sync):
+        for rating_key, last_viewed_at in plex.get_watched_states():
+            states.setdefault(rating_key, last_viewed_at)
+    return list(states.items())
@@ -0,0 +1,108 @@
+from flask import g
+import pytest
+
+from tests import fakeplex
+
+
+def reset_state():
+    """Forget everything the process-wide caches remember between tests"""
+    from app.auth_cache import login_cache
+    from app.library_cache import library_cache
+    from app.plex_api import _plexapi_loaded
+    from app.playback import playback_jobs, playback_warmer
+    from app.posters import poster_cache
+    from app.rate_limit import rate_limiter
+    from app.server_pool import server_pool
+    from app.user_cache import user_cache
+
+    library_cache.invalidate()
+    server_pool._connections.clear()
+    server_pool._failures.clear()
+    user_cache._users.clear()
+    login_cache._valid_tokens.clear()
+    login_cache._sign_ins.clear()
+    rate_limiter._buckets.clear()
+    playback_warmer._pending.clear()
+    playback_jobs._jobs.clear()
+    poster_cache._entries = None
+    _plexapi_loaded.clear()
+    fakeplex.Account.reset()
+
+
+@pytest.fixture
+def plex_server():
+    return fakeplex.Server()
+
+
+@pytest.fixture
+def plex_servers():
+    """Fake servers by URL; unknown URLs get the default one, exceptions are raised"""
+    return {}
+
+
+@pytest.fixture
+def plex_server_list():
+    """The PLEX_SERVERS setting; empty for the single default server"""
+    return ''
+
+
+def _connect(plex_server, plex_servers):
+    def connect(url, token, **kwargs):
+        server = plex_servers.get(url, plex_server)
+        if isinstance(server, Exception):
+            raise server
+        return server
+    return connect
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, plex_server, plex_servers, plex_server_list):
+    import plexapi.exceptions
+    import plexapi.myplex
+    import plexapi.server
+
+    monkeypatch.setattr(plexapi.server, 'PlexServer', _connect(plex_server, plex_servers))
+    monkeypatch.setattr(plexapi.myplex, 'MyPlexAccount', fakeplex.Account)
+    monkeypatch.setattr(plexapi.exceptions, 'Unauthorized', fakeplex.Unauthorized)
+    monkeypatch.setenv('DATABASE_URI', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setenv('LIBRARY_STORE_DIR', str(tmp_path / 'library'))
+    monkeypatch.setenv('POSTER_CACHE_DIR', str(tmp_path / 'posters'))
+    monkeypatch.setenv('STATIC_COMPRESSED_DIR', str(tmp_path / 'static-compressed'))
+    monkeypatch.setenv('LIBRARY_REFRESH_INTERVAL', '0')
+    monkeypatch.setenv('PLEX_TOKEN', '')
+    monkeypatch.setenv('PLEX_SERVERS', plex_server_list)
+    monkeypatch.setenv('SECRET_KEY', 'test')
+    for name in ('RATE_LIMIT_RECOMMEND', 'RATE_LIMIT_PLAY', 'RATE_LIMIT_CLIENTS', 'PLEX_CONCURRENCY'):
+        monkeypatch.setenv(name, '0')
+
+    reset_state()
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        yield app
+    reset_state()
+
+
+@pytest.fixture
+def user(app):
+    from app import db
+    from app.models import User, UserPreference
+
+    user = User(plex_username='bob', plex_token='token-bob')
+    db.session.add(user)
+    db.session.add(UserPreference(user=user))
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    """A test client logged in as ``user``"""
+    # Requests share the fixture's app context; load the user afresh for each one like a real request
+    app.teardown_request(lambda exc: g.pop('_login_user', None))
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,225 @@
+"""In-memory stand-ins for the plexapi objects the app talks to."""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+
+class Tag:
+    def __init__(self, tag):
+        self.tag = tag
+
+
+class Movie:
+    def __init__(self, key, title, year=2000, rating=7.5, actors=(), directors=(), genres=(), guid=None,
+                 watched=False, last_viewed_at=None, section=1):
+        self.ratingKey = key
+        self.key = f'/library/metadata/{key}'
+        self.type = 'movie'
+        self.title = title
+        self.year = year
+        self.audienceRating = rating
+        self.rating = rating
+        self.roles = [Tag(a) for a in actors]
+        self.directors = [Tag(d) for d in directors]
+        self.genres = [Tag(g) for g in genres]
+        self.guid = f'plex://movie/{key}' if guid is None else guid
+        self.summary = f'Summary of {title}'
+        self.thumb = f'/library/metadata/{key}/thumb/1'
+        self.duration = 6000000
+        self.isWatched = watched
+        self.lastViewedAt = last_viewed_at
+        self.librarySectionID = section
+
+
+def make_movies(count=30, section=1, offset=0):
+    """Movies with overlapping casts and directors, spread over several decades"""
+    movies = []
+    for i in range(count):
+        key = offset + i + 1
+        movies.append(Movie(
+            key, f'Movie {key}', year=1950 + (key * 3) % 75, rating=(key % 10) + 0.5,
+            actors=[f'Actor {key % 5}', f'Actor {key % 7}', 'Émile Dupont' if key % 4 == 0 else f'Actor {key % 3 + 10}'],
+            directors=[f'Director {key % 4}'], genres=[f'Genre {key % 3}'], section=section,
+        ))
+    return movies
+
+
+class Section:
+    def __init__(self, key, title, movies):
+        self.key = key
+        self.title = title
+        self.type = 'movie'
+        self.movies = movies
+        self.updatedAt = datetime(2024, 1, 1)
+        self.contentChangedAt = 1
+        self.totalSize = len(movies)
+        self.loads = 0
+
+    def all(self, **kwargs):
+        self.loads += 1
+        return list(self.movies)
+
+    def search(self, filters=None, **kwargs):
+        if filters and 'viewCount>>' in filters:
+            return [movie for movie in self.movies if movie.isWatched]
+        return list(self.movies)
+
+
+class ListedSection:
+    """A section as a library listing saw it: its change markers are those of the listing"""
+
+    def __init__(self, section):
+        self._section = section
+        self.updatedAt = section.updatedAt
+        self.contentChangedAt = section.contentChangedAt
+
+    def __getattr__(self, name):
+        return getattr(self._section, name)
+
+
+class Library:
+    def __init__(self, sections):
+        self._sections = sections
+        self._sectionsByID = {}
+
+    def section(self, title):
+        for section in self._sections:
+            if section.title == title:
+                return section
+        raise LookupError(title)
+
+    def sections(self):
+        listed = [ListedSection(section) for section in self._sections]
+        self._sectionsByID = {str(section.key): section for section in listed}
+        return listed
+
+    def sectionByID(self, key):
+        # Like plexapi, answers from the last listing and only lists again for an unknown key
+        if str(key) not in self._sectionsByID:
+            self.sections()
+        try:
+            return self._sectionsByID[str(key)]
+        except KeyError:
+            raise LookupError(key) from None
+
+
+class Client:
+    def __init__(self, title, identifier, product='Plex for Android'):
+        self.title = title
+        self.machineIdentifier = identifier
+        self.product = product
+        self.played = []
+
+    def playMedia(self, movie):
+        self.played.append(movie.ratingKey)
+
+
+class Server:
+    """A Plex server with a 'Movies' section and a watch history per account"""
+
+    def __init__(self, machine='machine-1', sections=None):
+        self.machineIdentifier = machine
+        self.friendlyName = machine
+        self.library = Library(sections or [Section(1, 'Movies', make_movies())])
+        self.accounts = [SimpleNamespace(id=1, name='bob'), SimpleNamespace(id=5, name='kid')]
+        self.plays = {}  # account id -> [(rating key, viewed at)]
+        self.calls = []
+        self.active_clients = []
+
+    def _call(self, name):
+        self.calls.append(name)
+
+    def movies(self):
+        return [movie for section in self.library._sections for movie in section.movies]
+
+    def fetchItem(self, key):
+        wanted = str(key).rsplit('/', 1)[-1]
+        for movie in self.movies():
+            if str(movie.ratingKey) == wanted:
+                return movie
+        raise LookupError(key)
+
+    def clients(self):
+        self._call('clients')
+        return list(self.active_clients)
+
+    def client(self, title):
+        return next((client for client in self.active_clients if client.title == title), None)
+
+    def sessions(self):
+        self._call('sessions')
+        return []
+
+    def systemAccounts(self):
+        self._call('systemAccounts')
+        return list(self.accounts)
+
+    def history(self, mindate=None, accountID=None, **kwargs):
+        self._call(('history', mindate, accountID))
+        entries = []
+        for rating_key, viewed_at in self.plays.get(accountID, []):
+            if mindate is None or viewed_at.replace(tzinfo=timezone.utc) > mindate:
+                entries.append(SimpleNamespace(type='movie', ratingKey=rating_key, viewedAt=viewed_at))
+        return entries
+
+    def play(self, account_id, rating_key, days=0, viewed_at=None):
+        """Record a play in the server's watch history"""
+        viewed_at = viewed_at or datetime(2024, 1, 1) + timedelta(days=days)
+        self.plays.setdefault(account_id, []).append((rating_key, viewed_at))
+
+
+class Device:
+    def __init__(self, name, identifier, product='Plex for Android', client=None):
+        self.name = name
+        self.clientIdentifier = identifier
+        self.product = product
+        self.connections = ['http://10.0.0.9:32500']
+        self.client = client
+
+    def connect(self):
+        if self.client is None:
+            raise ConnectionError(f'{self.name} is not reachable')
+        return self.client
+
+
+class Account:
+    """plex.tv account; ``accounts`` maps tokens to (username, devices)"""
+
+    accounts = {}
+    passwords = {}
+    sign_ins = 0
+
+    def __init__(self, username=None, password=None, token=None):
+        if username is not None:
+            Account.sign_ins += 1
+            if Account.passwords.get(username) != password:
+                raise Unauthorized('Invalid credentials')
+            token = f'token-{username}'
+        if token not in Account.accounts:
+            raise Unauthorized('Invalid token')
+        self.authenticationToken = token
+        self.username, self._devices = Account.accounts[token]
+        self.title = self.username
+        self.email = f'{self.username}@example.com'
+
+    def devices(self):
+        return list(self._devices)
+
+    @classmethod
+    def reset(cls):
+        cls.accounts = {}
+        cls.passwords = {}
+        cls.sign_ins = 0
+
+
+class Unauthorized(Exception):
+    pass
+
+
+def hd_and_4k_server(machine='machine-1'):
+    """A server with a 'Movies' section, a '4K Movies' section holding copies of its first ten films, and 'Kids'"""
+    hd = make_movies(20)
+    uhd = make_movies(10, section=2, offset=100)
+    for copy, original in zip(uhd, hd):
+        copy.guid = original.guid
+    kids = make_movies(5, section=3, offset=200)
+    return Server(machine, [Section(1, 'Movies', hd), Section(2, '4K Movies', uhd), Section(3, 'Kids', kids)])
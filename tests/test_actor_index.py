@@ -0,0 +1,58 @@
+from app import db
+from app.actor_index import ActorIndex, normalize_name, rank_suggestions
+from app.library_cache import LibrarySnapshot
+from app.plex_api import PlexAPI
+from tests import fakeplex
+
+
+def test_normalize_name():
+    assert normalize_name('  Émile   DUPONT ') == 'emile dupont'
+    assert normalize_name(None) == ''
+
+
+def test_match_is_substring_and_accent_insensitive(app):
+    snapshot = LibrarySnapshot.from_movies('machine-1', [
+        fakeplex.Movie(1, 'One', actors=['Émile Dupont', 'Ann Lee']),
+        fakeplex.Movie(2, 'Two', actors=['Emile Zola']),
+        fakeplex.Movie(3, 'Three', actors=['Lee Marvin', 'Ann Lee']),
+    ], PlexAPI('token-bob'))
+    index = ActorIndex(snapshot)
+
+    def names(query):
+        return sorted(index.names[i] for i in index.match(query))
+
+    # Case and accents are ignored
+    assert names('EMILE') == ['Emile Zola', 'Émile Dupont']
+    assert names('lee') == ['Ann Lee', 'Lee Marvin']
+    assert names('ee') == ['Ann Lee', 'Lee Marvin']
+    assert names('xyz') == []
+    assert index.ordinals('ann lee') == {0, 2}
+
+
+def test_rank_suggestions():
+    counts = {'ann lee': 1, 'lee marvin': 2, 'brenda leeds': 5, 'lee': 1}
+    names = {key: key.title() for key in counts}
+
+    ranked = [s['name'] for s in rank_suggestions('Lee', counts, names, 10)]
+
+    assert ranked == ['Lee', 'Lee Marvin', 'Brenda Leeds', 'Ann Lee']
+    assert len(rank_suggestions('lee', counts, names, 2)) == 2
+
+
+def test_actor_suggestions(client):
+    response = client.get('/api/actors?q=emile')
+
+    actors = response.get_json()['actors']
+    assert actors == [{'name': 'Émile Dupont', 'movies': 7}]
+    assert client.get('/api/actors?q=').get_json()['actors'] == []
+    assert client.get('/api/actors?q=actor&limit=x').status_code == 400
+
+
+def test_filter_by_actor(client, user):
+    user.preferences.exclude_watched = False
+    user.preferences.filter_actor = 'dupont'
+    db.session.commit()
+
+    keys = {int(client.get('/api/recommend').get_json()['movie']['rating_key']) for _ in range(20)}
+
+    assert all(key % 4 == 0 for key in keys)
@@ -0,0 +1,21 @@
+def test_bootstrap_returns_page_state(client, plex_server):
+    plex_server.play(1, '7', days=3)
+    plex_server.play(1, '4', days=1)
+
+    data = client.get('/api/bootstrap').get_json()
+
+    assert data['success'] is True
+    assert data['preferences']['exclude_watched'] is not None
+    assert data['selected_client'] is None
+    assert data['sections'] == [{'key': '1', 'title': 'Movies', 'server': 'default', 'selected': True}]
+    assert data['last_watched']['title'] == 'Movie 7'
+    assert 'movie' not in data
+
+
+def test_bootstrap_with_recommendation_loads_library_once(client, plex_server):
+    data = client.get('/api/bootstrap?recommend=1').get_json()
+
+    assert data['recommend_error'] is None
+    assert data['movie']['server'] == 'default'
+    assert plex_server.library.section('Movies').loads == 1
+    assert [call for call in plex_server.calls if call[0] == 'history'] == [('history', None, 1)]
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import PassedMovie, User
+from app.passes import pass_movies
+
+
+def passed_keys(user):
+    return sorted(int(key) for (key,) in db.session.query(PassedMovie.plex_rating_key).filter_by(user_id=user.id))
+
+
+def nineties(plex_server):
+    return sorted(movie.ratingKey for movie in plex_server.movies() if 1990 <= movie.year < 2000)
+
+
+def test_bulk_pass_adds_and_renews(client, user):
+    pass_movies(user.id, None, {'1': 'Movie 1'})
+
+    response = client.post('/api/pass/bulk', json={'movies': [
+        {'rating_key': 1, 'title': 'Movie 1'},
+        {'rating_key': 2, 'title': 'Movie 2'},
+        {'rating_key': 3},
+    ]})
+
+    assert response.get_json() == {'success': True, 'added': 2, 'renewed': 1}
+    assert passed_keys(user) == [1, 2, 3]
+    assert PassedMovie.query.filter_by(plex_rating_key='3').one().movie_title == 'Unknown'
+
+
+def test_bulk_pass_looks_up_titles(client, user):
+    client.post('/api/pass/bulk', json={'rating_keys': [4, 5]})
+
+    titles = sorted(pm.movie_title for pm in PassedMovie.query.filter_by(user_id=user.id))
+    assert titles == ['Movie 4', 'Movie 5']
+
+
+def test_bulk_pass_by_decade(client, plex_server, user):
+    assert nineties(plex_server)
+    response = client.post('/api/pass/bulk', json={'decade': '1990s'})
+
+    assert response.get_json()['added'] == len(nineties(plex_server))
+    assert passed_keys(user) == nineties(plex_server)
+    assert client.post('/api/pass/bulk', json={'decade': 'nineties'}).status_code == 400
+
+
+def test_bulk_unpass(client, plex_server, user):
+    pass_movies(user.id, None, {str(movie.ratingKey): movie.title for movie in plex_server.movies()})
+    old = PassedMovie.query.filter_by(plex_rating_key='30').one()
+    old.expires_at = datetime.utcnow() - timedelta(days=1)
+    db.session.commit()
+
+    def delete(**data):
+        return client.post('/api/passed-movies/delete', json=data).get_json()['deleted']
+
+    assert delete(expired=True) == 1
+    assert delete(rating_keys=['1', '2']) == 2
+    ids = [pm.id for pm in PassedMovie.query.filter(PassedMovie.plex_rating_key.in_(['3', '4']))]
+    assert delete(ids=ids) == 2
+    assert delete(decade='1990s') == len(nineties(plex_server))
+
+    assert passed_keys(user) == [key for key in range(5, 30) if key not in nineties(plex_server)]
+
+
+def test_bulk_unpass_only_touches_own_passes(client, user):
+    other = User(plex_username='eve', plex_token='token-eve')
+    db.session.add(other)
+    db.session.commit()
+    pass_movies(other.id, None, {'1': 'Movie 1'})
+    theirs = PassedMovie.query.filter_by(user_id=other.id).one().id
+
+    response = client.post('/api/passed-movies/delete', json={'ids': [theirs], 'rating_keys': ['1']})
+
+    assert response.get_json()['deleted'] == 0
+    assert passed_keys(other) == [1]
+
+
+def test_bulk_validation(client):
+    assert client.post('/api/pass/bulk', json={}).status_code == 400
+    assert client.post('/api/pass/bulk', json={'server': 'nowhere', 'rating_keys': [1]}).status_code == 400
+    assert client.post('/api/passed-movies/delete', json={}).status_code == 400
+
+
+def test_passes_on_other_servers_are_kept_apart(app, user):
+    pass_movies(user.id, None, {'1': 'Movie 1'})
+
+    added, renewed = pass_movies(user.id, 'archive', {'1': 'Movie 1'})
+
+    assert (added, renewed) == (1, 0)
+    assert PassedMovie.query.filter_by(user_id=user.id).count() == 2
@@ -0,0 +1,77 @@
+import time
+
+from app import server_pool as pool_module
+from app.cache_registry import EVICTION_GRACE, CacheEntry, CacheRegistry, estimate_size
+from app.server_pool import server_pool
+
+
+class DictCache:
+    def __init__(self, registry, name, entries):
+        self.data = dict(entries)
+        registry.register(name, self.entries, self.data.pop)
+
+    def entries(self):
+        return [CacheEntry(key, size, last_used, cost) for key, (size, last_used, cost) in self.data.items()]
+
+
+def test_estimate_size_follows_containers():
+    small = estimate_size([])
+    assert estimate_size(['x' * 1000]) > small + 1000
+    shared = 'y' * 1000
+    # Shared objects are only counted once
+    assert estimate_size([shared, shared]) < estimate_size([shared, 'z' * 1000])
+
+
+def test_evicts_big_idle_cheap_entries_first():
+    registry = CacheRegistry(budget=1500)
+    idle = time.time() - 100
+    a = DictCache(registry, 'a', {'big-idle': (600, idle, 0), 'small-idle': (100, idle, 0)})
+    b = DictCache(registry, 'b', {'costly': (600, idle, 1000), 'in-use': (600, time.time(), 0)})
+
+    assert registry.enforce() == 1
+
+    assert 'big-idle' not in a.data
+    assert set(b.data) == {'costly', 'in-use'}
+    status = registry.status()
+    assert status['caches']['a']['evictions'] == 1
+
+
+def test_recently_used_entries_are_kept():
+    registry = CacheRegistry(budget=100)
+    cache = DictCache(registry, 'a', {'hot': (1000, time.time() - EVICTION_GRACE / 2, 0)})
+
+    assert registry.enforce() == 0
+    assert 'hot' in cache.data
+
+
+def test_connections_are_bounded(app, monkeypatch):
+    monkeypatch.setattr(pool_module, 'MAX_CONNECTIONS', 3)
+    config = server_pool.primary
+    for n in range(5):
+        server_pool.connect(config, f'token-{n}')
+
+    # The oldest connection is reused and so kept
+    first = server_pool.connect(config, 'token-2')
+    server_pool.connect(config, 'token-5')
+
+    assert len(server_pool._connections) == 3
+    assert server_pool.connect(config, 'token-2') is first
+
+
+def test_expired_connections_are_dropped(app):
+    config = server_pool.primary
+    server_pool.connect(config, 'token-old')
+    for key, (server, connected_at, last_used) in server_pool._connections.items():
+        server_pool._connections[key] = (server, connected_at - server_pool.connection_ttl, last_used)
+
+    server_pool.connect(config, 'token-new')
+
+    assert len(server_pool._connections) == 1
+
+
+def test_connections_are_registered(client):
+    client.get('/api/recommend')
+
+    caches = client.get('/api/admin/caches').get_json()['caches']
+    assert caches['connections']['entries'] == 1
+    assert caches['connections']['hits'] >= 1
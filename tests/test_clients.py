@@ -0,0 +1,47 @@
+import json
+
+from tests import fakeplex
+
+
+def parse_events(body):
+    """(event, data) pairs of a server-sent event stream"""
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_dedupes_clients_across_sources(client, plex_server):
+    tv = fakeplex.Client('Living Room', 'tv-1')
+    plex_server.active_clients.append(tv)
+    fakeplex.Account.accounts['token-bob'] = ('bob', [
+        fakeplex.Device('Living Room', 'tv-1', client=tv),
+        fakeplex.Device('Phone', 'phone-1'),
+    ])
+
+    response = client.get('/api/clients/stream')
+
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events(response.get_data(as_text=True))
+    clients = [data['machineIdentifier'] for event, data in events if event == 'client']
+    assert sorted(clients) == ['phone-1', 'tv-1']
+
+    sources = {data['source']: data for event, data in events if event == 'source'}
+    assert sources['server.clients()']['count'] == 1
+    assert sources['account.devices()']['count'] == 2
+    assert sources['sessions()']['count'] == 0
+
+    assert events[-1] == ('summary', {'count': 2, 'sources': list(sources.values())})
+
+
+def test_stream_reports_failed_source(client, plex_server):
+    # No plex.tv account for this token, so account.devices() fails
+    plex_server.active_clients.append(fakeplex.Client('Living Room', 'tv-1'))
+
+    events = parse_events(client.get('/api/clients/stream').get_data(as_text=True))
+
+    sources = {data['source']: data for event, data in events if event == 'source'}
+    assert sources['account.devices()']['error']
+    assert sources['server.clients()']['error'] is None
+    assert events[-1][1]['count'] == 1
@@ -0,0 +1,65 @@
+from app import db
+from app.passes import pass_movies
+from app.similarity import CreditIndex
+
+
+def facets(client, query=''):
+    return client.get(f'/api/facets?{query}').get_json()['facets']
+
+
+def test_counts_match_the_library(client, plex_server):
+    movies = plex_server.movies()
+
+    data = facets(client)
+
+    assert data['total'] == data['any_decade'] == len(movies)
+    assert sum(data['decades'].values()) == len(movies)
+    assert data['decades']['1990s'] == sum(1 for m in movies if 1990 <= m.year < 2000)
+    assert sum(data['ratings'].values()) == len(movies)
+    assert data['ratings']['9'] == sum(1 for m in movies if 9 <= m.rating < 10)
+    assert 'filter_actor' not in data
+
+
+def test_watched_and_passed_movies(client, plex_server, user):
+    plex_server.play(1, '3')
+    pass_movies(user.id, None, {'4': 'Movie 4', '5': 'Movie 5'})
+
+    data = facets(client)
+
+    assert data['total'] == 27
+    assert data['toggles']['exclude_watched'] == {'on': 27, 'off': 28}
+
+
+def test_preview_overrides(client, plex_server):
+    movies = plex_server.movies()
+    dupont = sum(1 for m in movies if m.ratingKey % 4 == 0)
+
+    data = facets(client, 'filter_decade=1990s&filter_actor=dupont')
+
+    nineties = [m for m in movies if 1990 <= m.year < 2000]
+    both = sum(1 for m in nineties if m.ratingKey % 4 == 0)
+    assert both
+    assert data['total'] == both
+    assert data['filter_actor'] == {'on': both, 'off': len(nineties)}
+    assert facets(client, 'filter_actor=dupont')['total'] == dupont
+    # Nothing was saved
+    assert client.get('/api/preferences').get_json()['preferences']['filter_actor'] is None
+
+
+def test_similarity_is_scored_once_per_request(client, plex_server, user, monkeypatch):
+    plex_server.play(1, '9')
+    user.preferences.similar_to_last_watched = True
+    db.session.commit()
+    calls = []
+    most_similar = CreditIndex.most_similar
+
+    def counting(self, movie, ordinals, k, include_genres=False, **kwargs):
+        calls.append(include_genres)
+        return most_similar(self, movie, ordinals, k, include_genres=include_genres, **kwargs)
+
+    monkeypatch.setattr(CreditIndex, 'most_similar', counting)
+
+    assert facets(client)['total'] > 0
+    assert calls == [False]
+    facets(client, 'similarity_genres=1')
+    assert calls == [False, True]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import PassedMovie
+
+
+def revalidate(client, url):
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    return lambda: client.get(url, headers={'If-None-Match': etag})
+
+
+def test_unchanged_resource_is_304(client):
+    again = revalidate(client, '/api/preferences')
+
+    response = again()
+    assert response.status_code == 304
+    assert response.data == b''
+    assert 'no-cache' in response.headers['Cache-Control']
+
+
+def test_preference_change_invalidates_etag(client):
+    again = revalidate(client, '/api/preferences')
+
+    client.post('/api/preferences', json={'exclude_watched': False})
+
+    assert again().status_code == 200
+
+
+def test_pass_invalidates_passed_movies_etag(client):
+    again = revalidate(client, '/api/passed-movies')
+
+    client.post('/api/pass', json={'rating_key': '3', 'title': 'Movie 3'})
+
+    assert again().status_code == 200
+
+
+def test_renewed_pass_invalidates_passed_movies_etag(client, user):
+    client.post('/api/pass', json={'rating_key': '3', 'title': 'Movie 3'})
+    passed = PassedMovie.query.filter_by(user_id=user.id).one()
+    passed.passed_at -= timedelta(days=10)
+    passed.expires_at -= timedelta(days=10)
+    db.session.commit()
+    again = revalidate(client, '/api/passed-movies')
+
+    # Passing again renews the existing row in place
+    client.post('/api/pass', json={'rating_key': '3', 'title': 'Movie 3'})
+
+    response = again()
+    assert response.status_code == 200
+    assert PassedMovie.query.filter_by(user_id=user.id).count() == 1
+    movie = response.get_json()['movies'][0]
+    assert datetime.fromisoformat(movie['passed_at']) > datetime.utcnow() - timedelta(minutes=1)
+
+
+def test_expiry_invalidates_passed_movies_etag(client, user):
+    client.post('/api/pass', json={'rating_key': '3', 'title': 'Movie 3'})
+    again = revalidate(client, '/api/passed-movies')
+
+    passed = PassedMovie.query.filter_by(user_id=user.id).one()
+    passed.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    assert again().status_code == 200
+
+
+def test_json_is_compressed(client):
+    for key in range(20):
+        client.post('/api/pass', json={'rating_key': str(key), 'title': f'Movie {key}'})
+
+    response = client.get('/api/passed-movies', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].startswith('W/')
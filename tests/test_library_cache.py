@@ -0,0 +1,25 @@
+from app.library_cache import library_cache
+from app.plex_api import PlexAPI
+
+
+def test_snapshot_is_shared_by_every_token(app, plex_server):
+    first = PlexAPI('token-a').get_library_snapshot()
+    second = PlexAPI('token-b').get_library_snapshot()
+
+    assert first is second
+    assert len(first) == 30
+    assert plex_server.library.section('Movies').loads == 1
+
+
+def test_watched_overlays_are_per_user(app):
+    plex = PlexAPI('token-a')
+    snapshot = plex.get_library_snapshot()
+    alice = library_cache.get_overlay(snapshot, 'alice', lambda: [('3', 100.0), ('5', 200.0)])
+    carol = library_cache.get_overlay(snapshot, 'carol', lambda: [('7', 50.0)])
+
+    assert alice.watched_count == 2
+    assert carol.watched_count == 1
+    assert snapshot.movie(alice.last_watched_ordinal()).title == 'Movie 5'
+    assert not alice.is_watched(snapshot.ordinal_for('7'))
+    # Built once, then reused until it expires
+    assert library_cache.get_overlay(snapshot, 'alice', lambda: []) is alice
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from app.library_cache import library_cache
+from app.plex_api import PlexAPI
+from tests import fakeplex
+
+
+def wait_for_refresh(server, timeout=5):
+    deadline = time.monotonic() + timeout
+    while server.refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_unchanged_section_is_not_downloaded_again(app, plex_server):
+    plex = PlexAPI('token-bob')
+    snapshot = plex.get_library_snapshot()
+
+    assert library_cache.refresh_server(plex) == []
+
+    assert plex.get_library_snapshot() is snapshot
+    assert plex_server.library.section('Movies').loads == 1
+
+
+def test_changed_section_builds_new_generation(app, plex_server):
+    plex = PlexAPI('token-bob')
+    snapshot = plex.get_library_snapshot()
+    section = plex_server.library.section('Movies')
+    section.movies.append(fakeplex.Movie(99, 'New arrival'))
+    section.contentChangedAt += 1
+
+    assert library_cache.refresh_server(plex) == ['1']
+
+    refreshed = plex.get_library_snapshot()
+    assert refreshed.generation == snapshot.generation + 1
+    assert refreshed.ordinal_for('99') is not None
+    assert snapshot.ordinal_for('99') is None
+
+
+def test_change_is_seen_on_a_pooled_connection(app, plex_server):
+    plex = PlexAPI('token-bob')
+    plex.get_library_snapshot()
+    assert library_cache.refresh_server(plex) == []
+    # The same connection has listed the sections, and plexapi caches that listing
+    assert PlexAPI('token-bob').server is plex.server
+    plex_server.library.section('Movies').contentChangedAt += 1
+
+    assert library_cache.refresh_server(PlexAPI('token-bob')) == ['1']
+    assert plex_server.library.section('Movies').loads == 2
+
+
+def test_stale_snapshot_is_served_while_refreshing(app, plex_server, monkeypatch):
+    plex = PlexAPI('token-bob')
+    snapshot = plex.get_library_snapshot()
+    section = plex_server.library.section('Movies')
+    section.contentChangedAt += 1
+    monkeypatch.setattr(library_cache, 'ttl', 0)
+    answered = threading.Event()
+    refresh_server = library_cache.refresh_server
+
+    def refresh_after_answer(plex, server=None):
+        answered.wait(5)
+        return refresh_server(plex, server)
+
+    monkeypatch.setattr(library_cache, 'refresh_server', refresh_after_answer)
+
+    assert plex.get_library_snapshot() is snapshot
+    answered.set()
+    server = library_cache._servers[plex_server.machineIdentifier]
+    wait_for_refresh(server)
+
+    assert server.snapshot.generation == snapshot.generation + 1
+    assert server.last_sync['changed_sections'] == ['1']
+    assert server.last_sync['error'] is None
+
+
+def test_admin_status_and_refresh(client, plex_server, app):
+    client.get('/api/recommend')
+
+    status = client.get('/api/admin/library').get_json()
+    assert status['servers'][0]['movies'] == 30
+    assert status['servers'][0]['generation'] == 1
+
+    response = client.post('/api/admin/library/refresh')
+    assert response.status_code == 202
+    assert response.get_json()['refreshing'] == ['default']
+    wait_for_refresh(library_cache._servers[plex_server.machineIdentifier])
+
+    app.config['ADMIN_USERS'] = ['someone-else']
+    assert client.get('/api/admin/library').status_code == 403
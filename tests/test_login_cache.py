@@ -0,0 +1,67 @@
+import pytest
+
+from app.auth_cache import login_cache
+from tests import fakeplex
+
+
+@pytest.fixture
+def bob(app):
+    fakeplex.Account.accounts['token-bob'] = ('bob', [])
+    fakeplex.Account.passwords['bob'] = 'secret'
+
+
+def login(client, password):
+    return client.post('/api/auth/login', json={'username': 'bob', 'password': password})
+
+
+def test_sign_in_is_reused(app, bob):
+    client = app.test_client()
+
+    assert login(client, 'secret').status_code == 200
+    assert login(client, 'secret').status_code == 200
+
+    assert fakeplex.Account.sign_ins == 1
+
+
+def test_wrong_password_is_not_cached(app, bob):
+    client = app.test_client()
+    login(client, 'secret')
+
+    assert login(client, 'wrong').status_code == 401
+    assert login(client, 'wrong').status_code == 401
+    assert fakeplex.Account.sign_ins == 3
+
+
+def test_old_password_stops_working_after_change(app, bob):
+    client = app.test_client()
+    login(client, 'secret')
+
+    # The password is changed on plex.tv and used here once
+    fakeplex.Account.passwords['bob'] = 'new secret'
+    assert login(client, 'new secret').status_code == 200
+
+    assert login(client, 'secret').status_code == 401
+    assert login(client, 'new secret').status_code == 200
+    assert len(login_cache._sign_ins) == 1
+
+
+def test_logout_forgets_sign_in(app, bob):
+    client = app.test_client()
+    login(client, 'secret')
+
+    client.post('/api/auth/logout')
+    fakeplex.Account.passwords['bob'] = 'new secret'
+
+    assert login(client, 'secret').status_code == 401
+    assert login_cache._sign_ins == {}
+
+
+def test_token_validation_is_cached(app, monkeypatch):
+    assert login_cache.token_valid('token-env')
+
+    monkeypatch.setattr(login_cache, '_verify', lambda token: pytest.fail('token checked again'))
+    assert login_cache.token_valid('token-env')
+
+    monkeypatch.setattr(login_cache, 'token_ttl', -1)
+    monkeypatch.setattr(login_cache, '_verify', lambda token: False)
+    assert not login_cache.token_valid('token-env')
@@ -0,0 +1,80 @@
+import json
+import logging
+import sys
+
+import pytest
+
+from app.logs import TEXT_FORMAT, JSONFormatter, TextFormatter, event
+
+
+def record(message='client attempt', fields=None, exc_info=None, level=logging.INFO):
+    record = logging.LogRecord('app.plex_api', level, __file__, 1, message, (), exc_info)
+    if fields is not None:
+        record.fields = fields
+    return record
+
+
+def failure():
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        return sys.exc_info()
+
+
+def test_text_formatter_appends_fields():
+    line = TextFormatter(TEXT_FORMAT).format(record(fields={
+        'method': 'server.clients()', 'seconds': 0.12345, 'device': 'Living Room', 'error': '',
+    }))
+
+    assert line.endswith('INFO app.plex_api: client attempt '
+                         'method=server.clients() seconds=0.123 device="Living Room" error=""')
+
+
+def test_text_formatter_puts_fields_before_traceback():
+    lines = TextFormatter(TEXT_FORMAT).format(record(fields={'outcome': 'failed'}, exc_info=failure())).splitlines()
+
+    assert lines[0].endswith('client attempt outcome=failed')
+    assert lines[-1] == 'ValueError: boom'
+
+
+def test_json_formatter():
+    data = json.loads(JSONFormatter().format(record(fields={'outcome': 'found', 'sessions': 2}, exc_info=failure())))
+
+    assert data['level'] == 'INFO'
+    assert data['logger'] == 'app.plex_api'
+    assert data['message'] == 'client attempt'
+    assert (data['outcome'], data['sessions']) == ('found', 2)
+    assert 'ValueError: boom' in data['exception']
+
+
+class Fields:
+    def __str__(self):
+        pytest.fail('formatted a disabled event')
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_disabled_events_cost_nothing():
+    logger = logging.getLogger('app.test')
+    logger.setLevel(logging.INFO)
+    handler = Records()
+    logger.addHandler(handler)
+    try:
+        event(logger, logging.DEBUG, 'client attempt', value=Fields())
+        event(logger, logging.INFO, 'client attempt', outcome='sent')
+    finally:
+        logger.removeHandler(handler)
+
+    assert [r.fields for r in handler.records] == [{'outcome': 'sent'}]
+
+
+def test_log_level_from_config(app):
+    assert logging.getLogger('app').level == logging.INFO
+    assert logging.getLogger('app').propagate is False
@@ -0,0 +1,90 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.migrations import LATEST_VERSION, MIGRATIONS, configure_sqlite, get_schema_version, upgrade_database
+
+# The schema before versioned migrations existed
+OLD_SCHEMA = [
+    '''CREATE TABLE users (
+        id INTEGER PRIMARY KEY, plex_username VARCHAR(100) NOT NULL UNIQUE,
+        plex_token VARCHAR(255) NOT NULL, created_at DATETIME, last_login DATETIME)''',
+    '''CREATE TABLE passed_movies (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        plex_rating_key VARCHAR(100) NOT NULL, movie_title VARCHAR(255) NOT NULL,
+        passed_at DATETIME, expires_at DATETIME NOT NULL)''',
+    '''CREATE TABLE user_preferences (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        exclude_watched BOOLEAN, exclude_same_actors BOOLEAN, exclude_same_director BOOLEAN,
+        filter_decade VARCHAR(10), filter_actor VARCHAR(100),
+        selected_client_name VARCHAR(255), selected_client_identifier VARCHAR(255))''',
+    "INSERT INTO users (id, plex_username, plex_token) VALUES (1, 'bob', 'token-bob')",
+    "INSERT INTO passed_movies (user_id, plex_rating_key, movie_title, expires_at) VALUES (1, '3', 'Movie 3', '2030-01-01')",
+    "INSERT INTO user_preferences (user_id, exclude_watched) VALUES (1, 1)",
+]
+
+
+def columns(engine, table):
+    return {column['name'] for column in inspect(engine).get_columns(table)}
+
+
+def test_numbers_are_ascending():
+    numbers = [number for number, _ in MIGRATIONS]
+    assert numbers == sorted(set(numbers))
+    assert LATEST_VERSION == numbers[-1]
+
+
+def test_new_database_is_stamped(app, tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "new.db"}')
+
+    upgrade_database(engine)
+
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+    assert 'account_checked_at' in columns(engine, 'watch_history_syncs')
+
+
+def test_old_database_is_upgraded_in_place(app, tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+    with engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.execute(text(statement))
+
+    upgrade_database(engine)
+
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+        assert conn.execute(text('SELECT movie_title, server_name FROM passed_movies')).all() == [('Movie 3', None)]
+        assert conn.execute(text('SELECT version FROM user_preferences')).scalar() == 1
+    assert {'library_sections', 'version', 'similar_to_last_watched'} <= columns(engine, 'user_preferences')
+    assert 'server_id' in columns(engine, 'watched_movies')
+    assert {index['name'] for index in inspect(engine).get_indexes('passed_movies')}
+
+
+def test_only_newer_migrations_run(app, tmp_path, monkeypatch):
+    engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+    with engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.execute(text(statement))
+    upgrade_database(engine)
+    with engine.begin() as conn:
+        conn.execute(text('UPDATE schema_version SET version = 6'))
+
+    applied = []
+    monkeypatch.setattr('app.migrations.MIGRATIONS', [
+        (number, lambda conn, number=number, migration=migration: (applied.append(number), migration(conn)))
+        for number, migration in MIGRATIONS
+    ])
+    upgrade_database(engine)
+    upgrade_database(engine)
+
+    # Migrations check for their change first, so re-running one is harmless
+    assert applied == list(range(7, LATEST_VERSION + 1))
+
+
+def test_sqlite_pragmas(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "tuned.db"}')
+    configure_sqlite(engine, busy_timeout=5, synchronous='bogus')
+
+    with engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
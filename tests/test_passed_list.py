@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import PassedMovie
+from app.passes import pass_movies
+
+
+def add_passes(user, titles, server_name=None):
+    pass_movies(user.id, server_name, {str(key): title for key, title in enumerate(titles, start=1)})
+
+
+def all_pages(client, url):
+    ids, cursor = [], None
+    while True:
+        page = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        ids.extend(movie['id'] for movie in page['movies'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids, page
+
+
+def test_pages_cover_every_pass_once(client, user):
+    # One bulk pass gives every row the same passed_at; ids break the tie
+    add_passes(user, [f'Movie {n}' for n in range(25)])
+
+    ids, last_page = all_pages(client, '/api/passed-movies?limit=10')
+
+    assert sorted(ids, reverse=True) == ids
+    assert len(set(ids)) == 25
+    assert last_page['counts'] == {'all': 25, 'active': 25, 'expired': 0}
+
+
+def test_new_passes_do_not_shift_later_pages(client, user):
+    add_passes(user, [f'Movie {n}' for n in range(6)])
+    first = client.get('/api/passed-movies?limit=3').get_json()
+
+    pass_movies(user.id, None, {'100': 'Newer'})
+    second = client.get(f'/api/passed-movies?limit=3&cursor={first["next_cursor"]}').get_json()
+
+    seen = [m['id'] for m in first['movies'] + second['movies']]
+    assert len(set(seen)) == 6
+
+
+def test_search_and_status(client, user):
+    add_passes(user, ['Alien', 'Aliens', '100% Wolf', 'Solaris'])
+    expired = PassedMovie.query.filter_by(movie_title='Aliens').one()
+    expired.expires_at = datetime.utcnow() - timedelta(days=1)
+    db.session.commit()
+
+    def titles(query):
+        return sorted(m['title'] for m in client.get(f'/api/passed-movies?{query}').get_json()['movies'])
+
+    assert titles('q=alien') == ['Alien', 'Aliens']
+    assert titles('q=alien&status=active') == ['Alien']
+    assert titles('status=expired') == ['Aliens']
+    # LIKE wildcards in the search are matched literally
+    assert titles('q=%25') == ['100% Wolf']
+    assert titles('q=_') == []
+
+    counts = client.get('/api/passed-movies?q=alien&status=active').get_json()['counts']
+    assert counts == {'all': 2, 'active': 1, 'expired': 1}
+
+
+def test_bad_arguments(client):
+    assert client.get('/api/passed-movies?status=old').status_code == 400
+    assert client.get('/api/passed-movies?cursor=nonsense').status_code == 400
+    assert client.get('/api/passed-movies?limit=0').status_code == 200
@@ -0,0 +1,168 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from app import db
+from app.playback import playback_jobs, playback_warmer
+from app.rate_limit import rate_limiter
+from tests import fakeplex
+
+
+@pytest.fixture
+def tv(plex_server, user):
+    tv = fakeplex.Client('Living Room', 'tv-1')
+    plex_server.active_clients.append(tv)
+    user.preferences.selected_client_name = tv.title
+    user.preferences.selected_client_identifier = tv.machineIdentifier
+    db.session.commit()
+    return tv
+
+
+def wait_for(job_id, timeout=5):
+    job = playback_jobs._jobs[job_id]
+    deadline = time.monotonic() + timeout
+    while not job.done and time.monotonic() < deadline:
+        job.wait_for_change(job.version, 0.1)
+    return job
+
+
+def test_recommendation_warms_playback(client, plex_server, tv, user):
+    movie = client.get('/api/recommend').get_json()['movie']
+
+    key, _, future = playback_warmer._pending[user.id]
+    assert key == ('default', str(movie['rating_key']), 'tv-1')
+    warm = future.result(timeout=5)
+    assert warm.client is tv
+    assert str(warm.movie.ratingKey) == str(movie['rating_key'])
+
+
+def test_play_uses_warm_handle(client, plex_server, tv, user):
+    movie = client.get('/api/recommend').get_json()['movie']
+    playback_warmer._pending[user.id][2].result(timeout=5)
+    discoveries = plex_server.calls.count('clients')
+
+    response = client.post('/api/play', json={'rating_key': movie['rating_key'], 'server': movie['server']})
+    job = wait_for(response.get_json()['job_id'])
+
+    assert job.status == 'succeeded'
+    assert job.method == 'warm client'
+    assert [str(key) for key in tv.played] == [str(movie['rating_key'])]
+    assert plex_server.calls.count('clients') == discoveries
+
+
+def test_warm_handle_only_for_same_movie(client, plex_server, tv, user):
+    movie = client.get('/api/recommend').get_json()['movie']
+    other = next(m for m in plex_server.movies() if str(m.ratingKey) != str(movie['rating_key']))
+
+    assert playback_warmer.take(user.id, 'default', other.ratingKey, 'tv-1') is None
+    # Taking consumes the handle, even on a mismatch
+    assert playback_warmer.take(user.id, 'default', movie['rating_key'], 'tv-1') is None
+
+
+def test_no_warm_up_without_selected_client(client, user):
+    client.get('/api/recommend')
+
+    assert user.id not in playback_warmer._pending
+
+
+def test_warm_ups_are_reused_or_cancelled(user, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def resolve(*args):
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(playback_warmer, '_executor', ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(playback_warmer, '_resolve', resolve)
+    playback_warmer.warm(user.id, 'token-bob', 'default', '1', 'Living Room', 'tv-1')
+    first = playback_warmer._pending[user.id][2]
+    assert started.wait(5)
+
+    # The same movie reuses the running warm-up
+    playback_warmer.warm(user.id, 'token-bob', 'default', '1', 'Living Room', 'tv-1')
+    assert playback_warmer._pending[user.id][2] is first
+
+    # A newer recommendation cancels the one still queued
+    playback_warmer.warm(user.id, 'token-bob', 'default', '2', 'Living Room', 'tv-1')
+    queued = playback_warmer._pending[user.id][2]
+    playback_warmer.warm(user.id, 'token-bob', 'default', '3', 'Living Room', 'tv-1')
+    assert queued.cancelled()
+    release.set()
+
+
+def test_warm_up_skipped_when_plex_is_busy(plex_server, tv, user, monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_concurrency', 1)
+    monkeypatch.setattr(rate_limiter, '_slots', threading.BoundedSemaphore(1))
+    rate_limiter._slots.acquire()
+
+    playback_warmer.warm(user.id, 'token-bob', 'default', '1', tv.title, tv.machineIdentifier)
+
+    assert playback_warmer._pending[user.id][2].result(timeout=5) is None
+    assert 'clients' not in plex_server.calls
+
+
+def test_play_runs_as_background_job(client, plex_server, tv):
+    response = client.post('/api/play', json={'rating_key': '3'})
+
+    assert response.status_code == 202
+    data = response.get_json()
+    job = wait_for(data['job_id'])
+    assert job.status == 'succeeded'
+    assert [str(key) for key in tv.played] == ['3']
+
+    status = client.get(data['status_url']).get_json()
+    assert status['status'] == 'succeeded'
+    assert status['done'] is True
+    assert status['method'] == 'server.clients()'
+
+
+def test_play_job_reports_failure(client, plex_server, tv):
+    plex_server.active_clients.clear()
+
+    data = client.post('/api/play', json={'rating_key': '3'}).get_json()
+    job = wait_for(data['job_id'])
+
+    assert job.status == 'failed'
+    assert job.error
+    assert client.get(data['status_url']).get_json()['error'] == job.error
+
+
+def test_play_events_stream_until_done(client, tv):
+    data = client.post('/api/play', json={'rating_key': '3'}).get_json()
+    wait_for(data['job_id'])
+
+    body = client.get(data['events_url']).get_data(as_text=True)
+    assert body.startswith('event: done\n')
+    assert '"status": "succeeded"' in body
+
+
+def test_play_again_returns_running_job(client, tv, user, monkeypatch):
+    started = threading.Event()
+    monkeypatch.setattr(tv, 'playMedia', lambda movie: started.wait(5))
+
+    first = client.post('/api/play', json={'rating_key': '3'}).get_json()['job_id']
+    again = client.post('/api/play', json={'rating_key': '3'}).get_json()['job_id']
+    other = client.post('/api/play', json={'rating_key': '4'}).get_json()['job_id']
+    started.set()
+
+    assert again == first
+    assert other != first
+    assert wait_for(first).status == 'succeeded'
+    assert playback_jobs.get(first, user.id + 1) is None
+
+
+def test_play_validation(client):
+    assert client.post('/api/play', json={}).status_code == 400
+    assert client.post('/api/play', json={'rating_key': '3', 'server': 'nowhere'}).status_code == 400
+    assert client.get('/api/play/unknown').status_code == 404
+
+
+def test_too_many_pending_jobs(client, tv, monkeypatch):
+    monkeypatch.setattr(playback_jobs, 'max_pending', 0)
+
+    response = client.post('/api/play', json={'rating_key': '3'})
+
+    assert response.status_code == 503
@@ -0,0 +1,68 @@
+import pytest
+
+from app.plex_api import PlexAPI
+from app.posters import PosterCache, poster_width, thumb_version
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    fetches = []
+
+    def fetch_poster(self, thumb, width, height):
+        fetches.append((thumb, width, height))
+        return b'jpeg:' + thumb.encode('utf-8')
+
+    monkeypatch.setattr(PlexAPI, 'fetch_poster', fetch_poster)
+    return fetches
+
+
+def test_poster_width_snaps_up():
+    assert poster_width('150') == 200
+    assert poster_width('400') == 400
+    assert poster_width('2000') == 600
+    assert poster_width('wide') == 400
+
+
+def test_poster_is_fetched_once(client, fetches):
+    url = f'/poster/3?server=default&v={thumb_version("/library/metadata/3/thumb/1")}&w=200'
+
+    first = client.get(url)
+    second = client.get(url)
+
+    assert first.data == second.data == b'jpeg:/library/metadata/3/thumb/1'
+    assert fetches == [('/library/metadata/3/thumb/1', 200, 300)]
+    assert 'immutable' in first.headers['Cache-Control']
+    assert 'private' in first.headers['Cache-Control']
+
+    revalidated = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_unversioned_poster_is_not_immutable(client, fetches):
+    response = client.get('/poster/3?server=default')
+
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers['Cache-Control']
+    assert 'max-age=3600' in response.headers['Cache-Control']
+
+
+def test_unknown_poster(client, fetches):
+    assert client.get('/poster/3?server=nowhere').status_code == 404
+    assert client.get('/poster/999?server=default').status_code == 404
+    assert fetches == []
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = PosterCache(str(tmp_path), max_bytes=25)
+    cache.put('a', b'x' * 10)
+    cache.put('b', b'x' * 10)
+    assert cache.get('a')
+
+    cache.put('c', b'x' * 10)
+
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['a.jpg', 'c.jpg']
+
+    # A new process picks up the files already on disk
+    assert PosterCache(str(tmp_path), max_bytes=25).get('c')
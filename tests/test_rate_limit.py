@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+from app import db, rate_limit
+from app.playback import playback_jobs
+from app.rate_limit import TokenBucket, rate_limiter
+from tests import fakeplex
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_concurrency', 1)
+    monkeypatch.setattr(rate_limiter, '_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(rate_limiter, 'wait', 0.05)
+
+
+def test_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.reserve(0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve(0) is None
+    assert bucket.retry_after() == pytest.approx(0.5)
+
+    clock.now += 0.25
+    assert bucket.reserve(0.3) == pytest.approx(0.25)
+
+    clock.now += 10
+    assert bucket.full(clock.now)
+    assert bucket.tokens == 3
+
+
+def test_burst_then_429(client, monkeypatch):
+    monkeypatch.setitem(rate_limiter.limits, 'clients', 6)
+    monkeypatch.setattr(rate_limiter, 'burst', 2)
+    monkeypatch.setattr(rate_limiter, 'wait', 0)
+
+    statuses = [client.get('/api/clients').status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+    response = client.get('/api/clients')
+    assert response.headers['Retry-After'] == '10'
+    assert response.get_json()['retry_after'] == 10
+
+
+def test_bootstrap_recommendation_is_limited(client, monkeypatch):
+    monkeypatch.setitem(rate_limiter.limits, 'recommend', 6)
+    monkeypatch.setattr(rate_limiter, 'burst', 1)
+    monkeypatch.setattr(rate_limiter, 'wait', 0)
+
+    assert client.get('/api/bootstrap?recommend=1').status_code == 200
+    assert client.get('/api/bootstrap?recommend=1').status_code == 429
+    assert client.get('/api/recommend').status_code == 429
+    # Loading the page without a recommendation is not limited
+    assert client.get('/api/bootstrap').status_code == 200
+
+
+def test_slots_are_released_after_each_request(client, one_slot):
+    statuses = [client.get('/api/clients').status_code for _ in range(5)]
+
+    assert statuses == [200] * 5
+
+
+def test_stream_holds_slot_until_it_ends(client, one_slot):
+    response = client.get('/api/clients/stream')
+    assert client.get('/api/clients').status_code == 429
+
+    response.get_data()
+    response.close()
+
+    assert client.get('/api/clients').status_code == 200
+
+
+def test_play_holds_slot_until_job_finishes(client, plex_server, user, one_slot, monkeypatch):
+    tv = fakeplex.Client('Living Room', 'tv-1')
+    plex_server.active_clients.append(tv)
+    user.preferences.selected_client_name = tv.title
+    user.preferences.selected_client_identifier = tv.machineIdentifier
+    db.session.commit()
+    playing = threading.Event()
+    monkeypatch.setattr(tv, 'playMedia', lambda movie: playing.wait(5))
+
+    response = client.post('/api/play', json={'rating_key': '3'})
+    assert response.status_code == 202
+    assert client.get('/api/clients').status_code == 429
+
+    playing.set()
+    job = playback_jobs._jobs[response.get_json()['job_id']]
+    while not job.done:
+        job.wait_for_change(job.version, 1)
+
+    assert client.get('/api/clients').status_code == 200
+
+
+def test_repeated_play_does_not_hold_a_second_slot(client, one_slot, monkeypatch):
+    monkeypatch.setattr(playback_jobs, 'max_pending', 0)
+
+    assert client.post('/api/play', json={'rating_key': '3'}).status_code == 503
+    assert client.get('/api/clients').status_code == 200
@@ -0,0 +1,36 @@
+import pytest
+
+from app.plex_api import PlexAPI
+from tests import fakeplex
+
+
+@pytest.fixture
+def plex_server():
+    return fakeplex.hd_and_4k_server()
+
+
+def test_default_is_the_movies_section(app):
+    plex = PlexAPI('token')
+    assert plex.get_default_section_keys() == ['1']
+    assert len(plex.get_library_snapshot()) == 20
+
+
+def test_copies_of_a_film_in_several_sections_are_one_candidate(app):
+    snapshot = PlexAPI('token').get_library_snapshot(['1', '2', '3'])
+
+    assert len(snapshot) == 25
+    assert snapshot.ordinal_for('101') == snapshot.ordinal_for('1')
+    assert len(snapshot.candidates(['2'])) == 10
+    # A 4K-only user gets the 4K copy of a shared film
+    assert snapshot.movie(snapshot.ordinal_for('1'), ['2']).rating_key == '101'
+    assert snapshot.movie(snapshot.ordinal_for('1'), ['1']).rating_key == '1'
+
+
+def test_selected_sections_are_saved_and_listed(client, user):
+    response = client.post('/api/preferences', json={'library_sections': ['2', '3']})
+    assert response.status_code == 200
+
+    sections = client.get('/api/sections').get_json()['sections']
+    assert {section['key']: section['selected'] for section in sections} == {'1': False, '2': True, '3': True}
+    keys = {client.get('/api/recommend').get_json()['movie']['rating_key'] for _ in range(15)}
+    assert keys <= {str(key) for key in range(101, 111)} | {str(key) for key in range(201, 206)}
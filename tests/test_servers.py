@@ -0,0 +1,98 @@
+import pytest
+
+from app.passes import pass_movies
+from app.server_pool import parse_server_list, server_pool
+from tests import fakeplex
+
+
+@pytest.fixture
+def plex_server_list():
+    return 'main=http://main:32400,archive=http://archive:32400,dead=http://dead:32400'
+
+
+@pytest.fixture
+def archive(plex_server):
+    # The archive holds better-rated films plus a copy of one of main's
+    movies = fakeplex.make_movies(3, offset=500)
+    for movie in movies:
+        movie.rating = movie.audienceRating = 9.9
+    original = plex_server.fetchItem(1)
+    original.rating = original.audienceRating = 9.9
+    movies.append(fakeplex.Movie(600, original.title, original.year, 9.9, guid=original.guid))
+    return fakeplex.Server('machine-2', [fakeplex.Section(1, 'Movies', movies)])
+
+
+@pytest.fixture
+def plex_servers(plex_server, archive):
+    return {
+        'http://main:32400': plex_server,
+        'http://archive:32400': archive,
+        'http://dead:32400': ConnectionError('offline'),
+    }
+
+
+def test_parse_server_list():
+    servers = parse_server_list('main=http://10.0.0.2:32400/, http://10.0.0.3:32400', 'http://localhost:32400')
+
+    assert [(s.name, s.url, s.primary) for s in servers] == [
+        ('main', 'http://10.0.0.2:32400', True),
+        ('server2', 'http://10.0.0.3:32400', False),
+    ]
+    assert [(s.name, s.url) for s in parse_server_list('', 'http://localhost:32400')] == [
+        ('default', 'http://localhost:32400')
+    ]
+
+
+def test_recommends_from_merged_pool(client):
+    seen = set()
+    for _ in range(60):
+        movie = client.get('/api/recommend').get_json()['movie']
+        seen.add((movie['server'], str(movie['rating_key'])))
+
+    # One 9-group across both servers; the archive's copy counts once, from main
+    assert seen <= {('main', '1'), ('main', '9'), ('main', '19'), ('main', '29'),
+                    ('archive', '501'), ('archive', '502'), ('archive', '503')}
+    assert {'main', 'archive'} == {server for server, _ in seen}
+
+
+def test_offline_server_is_skipped(client):
+    response = client.get('/api/recommend')
+
+    assert response.status_code == 200
+    assert 'dead' in server_pool._failures
+    assert 'dead' not in [config.name for config in server_pool.available()]
+
+
+def test_pass_is_per_server(client):
+    movie = client.get('/api/recommend').get_json()['movie']
+    client.post('/api/pass', json={'rating_key': movie['rating_key'], 'server': 'archive', 'title': movie['title']})
+
+    passed = client.get('/api/passed-movies').get_json()['movies']
+    assert [(m['rating_key'], m['server']) for m in passed] == [(movie['rating_key'], 'archive')]
+
+    response = client.post('/api/pass', json={'rating_key': '1', 'server': 'nowhere'})
+    assert response.status_code == 400
+
+
+def test_watched_film_is_left_out_on_every_server(client, plex_server):
+    # Main's copy is watched; the archive's copy (600) is the same film
+    plex_server.play(1, '1')
+
+    for _ in range(40):
+        movie = client.get('/api/recommend').get_json()['movie']
+        assert str(movie['rating_key']) not in ('1', '600')
+
+    # 33 films across both servers
+    data = client.get('/api/facets').get_json()['facets']
+    assert data['total'] == 32
+    assert data['toggles']['exclude_watched'] == {'on': 32, 'off': 33}
+
+
+def test_passed_film_is_left_out_on_every_server(client, user):
+    pass_movies(user.id, 'archive', {'600': 'Movie 1'})
+
+    for _ in range(40):
+        movie = client.get('/api/recommend').get_json()['movie']
+        assert str(movie['rating_key']) not in ('1', '600')
+
+    assert client.get('/api/facets').get_json()['facets']['total'] == 32
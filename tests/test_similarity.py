@@ -0,0 +1,54 @@
+from app import db
+from app.library_cache import LibrarySnapshot
+from app.plex_api import PlexAPI
+from app.similarity import CreditIndex, actor_weight
+from tests import fakeplex
+
+
+def snapshot_of(movies):
+    return LibrarySnapshot.from_movies('machine-1', movies, PlexAPI('token-bob'))
+
+
+def test_scores_weigh_directors_and_billing(app):
+    snapshot = snapshot_of([
+        fakeplex.Movie(1, 'Query', actors=['Lead', 'Extra'], directors=['Director']),
+        fakeplex.Movie(2, 'Same director', directors=['Director']),
+        fakeplex.Movie(3, 'Same lead', actors=['Lead']),
+        fakeplex.Movie(4, 'Same extra', actors=['Someone', 'Extra']),
+        fakeplex.Movie(5, 'Unrelated', actors=['Nobody']),
+    ])
+    index = CreditIndex(snapshot)
+
+    scores = index.scores(snapshot.movie(0))
+
+    assert 4 not in scores
+    assert scores[1] > scores[2] > scores[3]
+    assert scores[2] == actor_weight(0) * actor_weight(0)
+    assert index.most_similar(snapshot.movie(0), range(1, 5), 2) == [1, 2]
+
+
+def test_movie_without_guid_is_not_similar_to_itself(app):
+    snapshot = snapshot_of([
+        fakeplex.Movie(1, 'Query', actors=['Lead'], guid=''),
+        fakeplex.Movie(2, 'Other', actors=['Lead'], guid=''),
+    ])
+    movie = snapshot.movie(0)
+
+    similar = CreditIndex(snapshot).most_similar(
+        movie, range(len(snapshot)), 10, exclude_guid=movie.guid, exclude_ordinal=movie.ordinal)
+
+    assert similar == [1]
+
+
+def test_recommendation_excludes_last_watched_without_guid(client, plex_server, user):
+    for movie in plex_server.movies():
+        movie.guid = ''
+    # Movie 9 is in the top rating group along with 19 and 29
+    plex_server.play(1, '9')
+    user.preferences.exclude_watched = False
+    user.preferences.similar_to_last_watched = True
+    db.session.commit()
+
+    keys = {str(client.get('/api/recommend').get_json()['movie']['rating_key']) for _ in range(30)}
+
+    assert keys <= {'19', '29'}
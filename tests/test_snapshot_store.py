@@ -0,0 +1,71 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.library_cache import LibrarySnapshot, SectionLibrary
+from app.plex_api import PlexAPI
+from app.snapshot_store import NUMBER_COLUMNS, PEOPLE_COLUMNS, TEXT_COLUMNS, SnapshotStore
+from tests import fakeplex
+
+COLUMNS = tuple(NUMBER_COLUMNS) + TEXT_COLUMNS + PEOPLE_COLUMNS
+
+
+@pytest.fixture
+def section(app):
+    movies = fakeplex.make_movies(12)
+    movies[0].guid = ''
+    movies[1].title = 'Amélie – 東京'
+    movies[2].roles = []
+    snapshot = LibrarySnapshot.from_movies('machine-1', movies, PlexAPI('token-bob'))
+    return SectionLibrary('1', 'Movies', snapshot, datetime(2024, 5, 1, 12, 30), 42, 1.5)
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return tmp_path / 'store'
+
+
+@pytest.fixture
+def store(directory):
+    return SnapshotStore(str(directory))
+
+
+def test_round_trip(store, section):
+    assert store.save_section('machine-1', section) > 0
+
+    loaded = store.load_all()['machine-1'][0]
+
+    for name in COLUMNS:
+        assert list(getattr(loaded.snapshot, name)) == list(getattr(section.snapshot, name)), name
+    assert (loaded.key, loaded.title, loaded.updated_at, loaded.content_changed_at, loaded.load_seconds) == \
+        ('1', 'Movies', datetime(2024, 5, 1, 12, 30), 42, 1.5)
+    assert loaded.unchanged(SimpleNamespace(updatedAt=datetime(2024, 5, 1, 12, 30), contentChangedAt=42))
+    assert loaded.snapshot.ordinal_for('5') == section.snapshot.ordinal_for('5')
+    assert loaded.snapshot.titles[-1] == section.snapshot.titles[-1]
+    assert loaded.snapshot.actors[2] == ()
+
+
+def test_only_newest_generation_is_kept(store, section, directory):
+    store.save_section('machine-1', section)
+    section.title = 'Films'
+    store.save_section('machine-1', section)
+
+    assert len(list((directory / 'machine-1').iterdir())) == 1
+    assert store.load_all()['machine-1'][0].title == 'Films'
+
+
+def test_unreadable_files_are_ignored(store, section, directory):
+    store.save_section('machine-1', section)
+    (directory / 'machine-1' / '2.1.snap').write_bytes(b'not a snapshot')
+    (directory / 'machine-1' / '3.1.snap').write_bytes(b'')
+
+    assert [s.key for s in store.load_all()['machine-1']] == ['1']
+
+
+def test_disabled_store(store, section, directory):
+    store.enabled = False
+
+    assert store.save_section('machine-1', section) == 0
+    assert store.load_all() == {}
+    assert not directory.exists()
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.cli import STARTUP_PROBE
+from app.plex_api import _plexapi_loaded, plexapi
+from tests import fakeplex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def probe_env(tmp_path):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URI': f'sqlite:///{tmp_path / "startup.db"}',
+        'LIBRARY_STORE_DIR': str(tmp_path / 'library'),
+        'POSTER_CACHE_DIR': str(tmp_path / 'posters'),
+        'STATIC_COMPRESSED_DIR': str(tmp_path / 'static-compressed'),
+        'LIBRARY_REFRESH_INTERVAL': '0',
+        'PLEX_TOKEN': '',
+        'SECRET_KEY': 'test',
+    })
+    return env
+
+
+def test_create_app_does_not_import_plexapi(probe_env):
+    probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=ROOT, env=probe_env,
+                           capture_output=True, text=True, timeout=60)
+
+    assert probe.returncode == 0, probe.stderr
+    line = next(line for line in probe.stdout.splitlines() if line.startswith('startup-time '))
+    result = json.loads(line.split(' ', 1)[1])
+    assert result['plexapi'] is False
+    assert result['requests'] is False
+
+
+def test_plexapi_classes_are_loaded_once(app):
+    assert 'MyPlexAccount' not in _plexapi_loaded
+
+    # conftest swaps in the fake account class
+    assert plexapi('MyPlexAccount') is fakeplex.Account
+    assert _plexapi_loaded['MyPlexAccount'] is fakeplex.Account
+
+
+def test_startup_time_command(app, probe_env, monkeypatch):
+    for name, value in probe_env.items():
+        monkeypatch.setenv(name, value)
+
+    result = app.test_cli_runner().invoke(args=['startup-time', '--runs', '1'])
+
+    assert result.exit_code == 0, result.output
+    assert 'plexapi imported at startup: no' in result.output
+    assert app.test_cli_runner().invoke(args=['startup-time', '--runs', '1', '--budget', '0']).exit_code == 1
@@ -0,0 +1,56 @@
+import pytest
+
+from app import db
+from app.user_cache import user_cache
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    loads = []
+    load = user_cache._load
+
+    def counting_load(user_id):
+        loads.append(user_id)
+        return load(user_id)
+
+    monkeypatch.setattr(user_cache, '_load', counting_load)
+    return loads
+
+
+def test_user_is_loaded_once(client, user, loads):
+    for _ in range(3):
+        assert client.get('/api/preferences').status_code == 200
+
+    assert loads == [user.id]
+
+
+def test_cached_user_is_attached_to_request_session(app, user, loads):
+    first = user_cache.get(user.id)
+    second = user_cache.get(user.id)
+
+    assert first in db.session
+    assert second.preferences.exclude_watched is True
+    assert loads == [user.id]
+
+
+def test_preference_change_invalidates(client, user, loads):
+    client.get('/api/preferences')
+
+    client.post('/api/preferences', json={'exclude_watched': False})
+
+    assert client.get('/api/preferences').get_json()['preferences']['exclude_watched'] is False
+    assert len(loads) == 2
+
+
+def test_entries_expire(app, user, loads, monkeypatch):
+    user_cache.get(user.id)
+    monkeypatch.setattr(user_cache, 'ttl', -1)
+
+    user_cache.get(user.id)
+
+    assert loads == [user.id, user.id]
+
+
+def test_unknown_user(app, loads):
+    assert user_cache.get(12345) is None
+    assert 12345 not in user_cache._users
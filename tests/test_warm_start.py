@@ -0,0 +1,43 @@
+from app.library_cache import library_cache
+
+
+def test_ready_once_a_library_is_loaded(client, app):
+    assert app.test_client().get('/ready').status_code == 503
+
+    client.get('/api/recommend')
+
+    response = app.test_client().get('/ready')
+    assert response.status_code == 200
+    assert response.get_json() == {'ready': True}
+
+
+def test_warm_library_saves_for_next_start(app, plex_server):
+    result = app.test_cli_runner().invoke(args=['warm-library', '--token', 'token-bob'])
+
+    assert result.exit_code == 0, result.output
+    assert 'default: 30 movie(s) in 1 section(s)' in result.output
+    assert 'Warmed 1 of 1 server(s)' in result.output
+
+    # A restarted process answers from the saved library without downloading it
+    library_cache.invalidate()
+    assert not library_cache.ready()
+    library_cache.load_saved()
+    assert library_cache.ready()
+    assert app.test_client().get('/ready').status_code == 200
+    assert plex_server.library.section('Movies').loads == 1
+
+
+def test_warm_library_needs_a_token(app):
+    result = app.test_cli_runner().invoke(args=['warm-library'])
+
+    assert result.exit_code == 2
+    assert 'A Plex token is required' in result.output
+
+
+def test_warm_library_fails_when_no_server_answers(app, plex_servers):
+    plex_servers['http://localhost:32400'] = ConnectionError('offline')
+
+    result = app.test_cli_runner().invoke(args=['warm-library', '--token', 'token-bob'])
+
+    assert result.exit_code == 1
+    assert 'could not connect' in result.output
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import User, UserPreference, WatchHistorySync
+from app.plex_api import PlexAPI
+from app.watch_history import load_watched_states
+
+
+def add_user(username, token):
+    user = User(plex_username=username, plex_token=token)
+    db.session.add(user)
+    db.session.add(UserPreference(user=user))
+    db.session.commit()
+    return user
+
+
+def watched_keys(user):
+    return {rating_key for rating_key, _ in load_watched_states(user, PlexAPI(user.plex_token))}
+
+
+def test_each_account_gets_its_own_history(app, plex_server, user):
+    plex_server.play(1, '3', days=1)
+    plex_server.play(5, '4', days=2)
+    kid = add_user('kid', user.plex_token)
+
+    assert watched_keys(user) == {'3'}
+    assert watched_keys(kid) == {'4'}
+
+
+def test_later_syncs_only_fetch_new_history(app, plex_server, user):
+    plex_server.play(1, '3')
+    watched_keys(user)
+    plex_server.play(1, '6', viewed_at=datetime.utcnow())
+
+    assert watched_keys(user) == {'3', '6'}
+    history_calls = [call for call in plex_server.calls if call[0] == 'history']
+    assert history_calls[0][1] is None
+    assert history_calls[1][1] is not None
+
+
+def test_unresolved_account_is_not_looked_up_on_every_rebuild(app, plex_server):
+    stranger = add_user('stranger', 'token-stranger')
+
+    watched_keys(stranger)
+    watched_keys(stranger)
+    assert plex_server.calls.count('systemAccounts') == 1
+
+    sync = WatchHistorySync.query.filter_by(user_id=stranger.id).one()
+    sync.account_checked_at = datetime.utcnow() - timedelta(hours=2)
+    db.session.commit()
+    watched_keys(stranger)
+    assert plex_server.calls.count('systemAccounts') == 2
+
+
+def test_movies_marked_watched_by_hand_count_as_watched(app, plex_server, user):
+    plex_server.play(1, '3')
+    plex_server.fetchItem('8').isWatched = True
+
+    assert watched_keys(user) == {'3', '8'}
+
+
+def test_shared_token_flags_are_not_given_to_other_accounts(app, plex_server, user):
+    app.config['PLEX_TOKEN'] = user.plex_token
+    plex_server.play(5, '4')
+    plex_server.fetchItem('8').isWatched = True
+    kid = add_user('kid', user.plex_token)
+
+    assert watched_keys(kid) == {'4'}
+    assert watched_keys(user) == {'8'}